@@ -1,10 +1,11 @@
 from rest_framework import serializers
 from .models import *
+from script.serializers import SparseFieldsetMixin, requested
 
 
 
 
-class UserAuthSerializer(serializers.ModelSerializer):
+class UserAuthSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     area_name = serializers.CharField(source='area.area_name', read_only=True)
     password = serializers.CharField(write_only=True, required=False)
     class Meta:
@@ -12,6 +13,15 @@ class UserAuthSerializer(serializers.ModelSerializer):
         fields = ['user_id', 'full_name', 'email', 'phone', 'image', 'shop_name', 'shop_address', 'area','area_name', 'password', 'is_approved', 'is_active', 'is_staff', 'is_superuser', 'date_joined', 'created_on', 'updated_on']
         read_only_fields = ['date_joined', 'created_on', 'updated_on']
 
+    @staticmethod
+    def prepare_queryset(queryset, fields=None):
+        """
+        Join the area read by ``area_name`` unless a sparse selection drops it.
+        """
+        if requested(fields, 'area_name'):
+            queryset = queryset.select_related('area')
+        return queryset
+
     def update(self, instance, validated_data):
         # Handle password separately
         password = validated_data.pop('password', None)
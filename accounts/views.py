@@ -8,10 +8,11 @@ from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from accounts.models import *
-from rest_framework.pagination import PageNumberPagination
+from script.pagination import KeysetPageNumberPagination
+from script.streaming import streaming_json_response
 
 
-class UserPagination(PageNumberPagination):
+class UserPagination(KeysetPageNumberPagination):
     page_size = 10  # default page size
     page_size_query_param = 'page_size'  # let client override page size using ?page_size=
     max_page_size = 1000
@@ -134,20 +135,21 @@ class CustomerView(APIView):
     pagination_class = UserPagination()
 
     def get(self, request, pk=None):
+        fields = UserAuthSerializer.selected_fields(request)
         if pk:
             try:
-                customer = UserAuth.objects.get(pk=pk)
-                serializer = UserAuthSerializer(customer)
+                customer = UserAuthSerializer.prepare_queryset(UserAuth.objects.all(), fields).get(pk=pk)
+                serializer = UserAuthSerializer(customer, context={'fields': fields})
                 return Response({"status": "success", "data": serializer.data}, status=status.HTTP_200_OK)
             except UserAuth.DoesNotExist:
                 return Response({"status": "error", "message": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
             
         
         
-        customers = UserAuth.objects.all().order_by('-date_joined')
+        customers = UserAuthSerializer.prepare_queryset(UserAuth.objects.all().order_by('-date_joined'), fields)
         paginator = self.pagination_class
         paginated_customers = paginator.paginate_queryset(customers, request)
-        serializer = UserAuthSerializer(paginated_customers, many=True)
+        serializer = UserAuthSerializer(paginated_customers, many=True, context={'fields': fields})
         return paginator.get_paginated_response({
             "status": "success",
             "data": serializer.data
@@ -180,7 +182,9 @@ class UserProfileView(APIView):
     def get(self, request, pk=None):
         try:
             user_profile = request.user  # Access the current logged-in user
-            serializer = UserAuthSerializer(user_profile)  # Serialize the user data
+            serializer = UserAuthSerializer(  # Serialize the user data
+                user_profile, context={'fields': UserAuthSerializer.selected_fields(request)}
+            )
             return Response(serializer.data, status=status.HTTP_200_OK)
         except UserAuth.DoesNotExist:
             return Response({'status': 'error',"message": "User profile not found."}, status=status.HTTP_404_NOT_FOUND)
@@ -227,8 +231,7 @@ class AreaViewSet(APIView):
                 return Response({"status": "error", "message": "Area not found"}, status=status.HTTP_404_NOT_FOUND)
 
         areas = Area.objects.all().order_by('-created_on')
-        serializer = AreaSerializer(areas, many=True)
-        return Response({"status": "success", "data": serializer.data}, status=status.HTTP_200_OK)
+        return streaming_json_response(areas, AreaSerializer)
     def post(self, request):
         serializer = AreaSerializer(data=request.data)
         if serializer.is_valid():
@@ -5,6 +5,7 @@ from .models import Notice
 from .serializers import NoticeSerializer
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from script.streaming import streaming_json_response
 
 class NoticeListCreateAPIView(APIView):
     def get(self, request):
@@ -13,8 +14,7 @@ class NoticeListCreateAPIView(APIView):
             notices = Notice.objects.all().order_by('-created_at')
         else:
             notices = Notice.objects.filter(is_active=True).order_by('-created_at')
-        serializer = NoticeSerializer(notices, many=True)
-        return Response({'status': 'success', 'data': serializer.data})
+        return streaming_json_response(notices, NoticeSerializer)
 
     def post(self, request):
         data = request.data.copy()  # Ensure we don't modify the original request data
@@ -2,14 +2,28 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .serializers import *
+from script.pagination import KeysetPageNumberPagination
+from script.streaming import streaming_json_response
+
+
+class NotificationPagination(KeysetPageNumberPagination):
+    page_size = None  # unpaginated unless ?page_size= or ?pagination=cursor is sent
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_page_size = 20
 
 class UserNotificationsView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = NotificationPagination()
 
     def get(self, request):
         notifications = Notification.objects.filter(user=request.user)
-        serializer = NotificationSerializer(notifications, many=True)
-        return Response({"status": "success", "data": serializer.data}, status=200)
+        paginator = self.pagination_class
+        paginated_notifications = paginator.paginate_queryset(notifications, request)
+        if paginated_notifications is not None:
+            serializer = NotificationSerializer(paginated_notifications, many=True)
+            return paginator.get_paginated_response({"status": "success", "data": serializer.data})
+        return streaming_json_response(notifications, NotificationSerializer)
     
 class UserNotificationsMarkAsReadView(APIView):
     permission_classes = [IsAuthenticated]
@@ -34,14 +48,19 @@ class UserNotificationsMarkAllAsReadView(APIView):
 
 class AdminNotificationsView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = NotificationPagination()
 
     def get(self, request):
         try:
             if not request.user.is_superuser:
                 return Response({"status": "error", "message": "Permission denied"}, status=403)
             admin_notifications = AdminNotification.objects.all().order_by('-created_at')
-            serializer = AdminNotificationSerializer(admin_notifications, many=True)
-            return Response({"status": "success", "data": serializer.data}, status=200)
+            paginator = self.pagination_class
+            paginated_notifications = paginator.paginate_queryset(admin_notifications, request)
+            if paginated_notifications is not None:
+                serializer = AdminNotificationSerializer(paginated_notifications, many=True)
+                return paginator.get_paginated_response({"status": "success", "data": serializer.data})
+            return streaming_json_response(admin_notifications, AdminNotificationSerializer)
         except AdminNotification.DoesNotExist:
             return Response({"status": "error", "message": "No notifications found"}, status=404)
         
@@ -0,0 +1,148 @@
+"""
+values()-based read path for ``OrderSerializer``.
+
+``order_rows(queryset)`` yields exactly the dicts ``OrderSerializer``
+produces, built from flat ``values()`` rows: one query per chunk for the
+orders (customer joined in), one for their lines and one for their returns
+(products and companies joined in), grouped by order in a single pass. The
+totals are computed with the same arithmetic as the serializer methods and
+raw columns are formatted by the serializers' own fields; the parity tests
+in ``orders/tests.py`` keep the two paths in step. A sparse
+``context['fields']`` selection is honoured and skips the line queries when
+no line-based field is selected.
+"""
+from products.models import Product
+from script.serializers import file_value, represent
+from script.streaming import chunks
+from .models import OrderItem, ReturnItem
+from .serializers import OrderItemSerializer, OrderSerializer, ReturnItemSerializer
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# ``product_id`` rather than ``product``: selecting a column named like an
+# ``ordering`` entry makes values() order by the column instead of the
+# related model's ordering (OrderItem orders by product name).
+LINE_COLUMNS = (
+    'order_id', 'id', 'product_id', 'product__product_name', 'product__product_image',
+    'product__company_id', 'product__company_id__company_name', 'product__mrp',
+    'product__selling_price', 'product__discount_percent', 'quantity', 'created_on', 'updated_on',
+)
+
+
+def _company_name(row):
+    # CharField(source='product.company_id') renders str(company)
+    return row['product__company_id__company_name'] if row['product__company_id'] is not None else None
+
+
+def _line_builders(serializer, computed):
+    """``[(name, build(row))]`` for the readable fields of a line serializer."""
+    image_field = Product._meta.get_field('product_image')
+    columns = {
+        'product_name': 'product__product_name',
+        'mrp': 'product__mrp',
+        'selling_price': 'product__selling_price',
+        'discount_percent': 'product__discount_percent',
+    }
+    builders = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in computed:
+            build = computed[name]
+        elif name == 'product':
+            build = lambda row: row['product_id']
+        elif name == 'product_image':
+            build = lambda row, field=field: field.to_representation(
+                file_value(image_field, row['product__product_image'])
+            )
+        elif name == 'company_name':
+            build = _company_name
+        else:
+            build = lambda row, field=field, column=columns.get(name, name): represent(field, row[column])
+        builders.append((name, build))
+    return builders
+
+
+def _build(builders, row):
+    return {name: build(row) for name, build in builders}
+
+
+def _group_lines(model, columns, order_ids):
+    lines = {}
+    for row in model.objects.filter(order_id__in=order_ids).values(*columns):
+        lines.setdefault(row['order_id'], []).append(row)
+    return lines
+
+
+def order_rows(queryset, context=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield ``OrderSerializer(order, context=context).data`` for every order
+    of ``queryset``, in the queryset's order.
+    """
+    context = context or {}
+    serializer = OrderSerializer(context=context)
+    fields = serializer.fields
+
+    item_builders = _line_builders(OrderItemSerializer(context=context), {
+        'discount': lambda row: (row['product__mrp'] - row['product__selling_price']) * row['quantity'],
+        'items_total': lambda row: row['unit_price'] * row['quantity'],
+    })
+    return_builders = _line_builders(ReturnItemSerializer(context=context), {
+        'mrp': lambda row: float(row['product__mrp']),
+        'selling_price': lambda row: float(row['product__selling_price']),
+        'discount_percent': lambda row: float(row['product__discount_percent']),
+        'total_return': lambda row: float(row['quantity'] * row['product__selling_price']),
+    })
+
+    def total_amount(row, items, returns):
+        return sum(item['unit_price'] * item['quantity'] for item in items)
+
+    special = {
+        'user_id': (('user_id',), lambda row, items, returns: row['user_id']),
+        'full_name': (
+            ('user_id', 'user_id__full_name'),
+            lambda row, items, returns: row['user_id__full_name'] if row['user_id'] is not None else None,
+        ),
+        'shop_name': (
+            ('user_id', 'user_id__shop_name'),
+            lambda row, items, returns: row['user_id__shop_name'] if row['user_id'] is not None else None,
+        ),
+        'total_amount': ((), total_amount),
+        'final_amount': (
+            ('delivery_charge',),
+            lambda row, items, returns: float(total_amount(row, items, returns)) + float(row['delivery_charge']),
+        ),
+        'total_return_amount': (
+            (),
+            lambda row, items, returns: sum(
+                float(item['quantity']) * float(item['product__selling_price']) for item in returns
+            ),
+        ),
+        'items': ((), lambda row, items, returns: [_build(item_builders, item) for item in items]),
+        'return_items': ((), lambda row, items, returns: [_build(return_builders, item) for item in returns]),
+    }
+
+    columns = {'pk'}
+    builders = []
+    for name, field in fields.items():
+        if field.write_only:
+            continue
+        if name in special:
+            needed, build = special[name]
+            columns.update(needed)
+        else:
+            columns.add(name)
+            build = lambda row, items, returns, name=name, field=field: represent(field, row[name])
+        builders.append((name, build))
+
+    want_items = bool({'items', 'total_amount', 'final_amount'} & set(fields))
+    want_returns = bool({'return_items', 'total_return_amount'} & set(fields))
+    rows = queryset.prefetch_related(None).values(*columns).iterator(chunk_size=chunk_size)
+    for chunk in chunks(rows, chunk_size):
+        order_ids = [row['pk'] for row in chunk]
+        items = _group_lines(OrderItem, LINE_COLUMNS + ('unit_price',), order_ids) if want_items else {}
+        returns = _group_lines(ReturnItem, LINE_COLUMNS + ('reason',), order_ids) if want_returns else {}
+        for row in chunk:
+            order_items, order_returns = items.get(row['pk'], []), returns.get(row['pk'], [])
+            yield {name: build(row, order_items, order_returns) for name, build in builders}
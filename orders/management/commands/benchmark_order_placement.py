@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+
+from accounts.models import UserAuth
+from orders.placement import place_order
+from products.models import Product, StockMovement
+from products.sequences import next_skus
+
+
+class Command(BaseCommand):
+    help = (
+        "Place orders from several threads at once against a shared set of products and report "
+        "throughput, latency and whether the stock counters match the ledger. Runs in a throwaway "
+        "test database created next to the configured one (dropped afterwards), so live data and "
+        "the sync tombstones are not touched. The configured MySQL (InnoDB) backend queues "
+        "concurrent orders on row locks; SQLite locks the whole database and rejects most of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent clients.")
+        parser.add_argument('--orders', type=int, default=50, help="Orders placed by each client.")
+        parser.add_argument('--lines', type=int, default=10, help="Lines per order.")
+        parser.add_argument('--products', type=int, default=100, help="Size of the shared product pool.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        lines = min(options['lines'], options['products'])
+        user, products = self.generate(options['products'])
+        initial_stock = dict(Product.objects.filter(pk__in=products).values_list('pk', 'stock_quantity'))
+        latencies, failures, invoices = [], [], []
+        lock = threading.Lock()
+
+        def client(index):
+            rng = random.Random(options['seed'] + index)
+            try:
+                for _ in range(options['orders']):
+                    basket = [
+                        {'product': product_id, 'quantity': rng.randint(1, 5)}
+                        for product_id in rng.sample(products, lines)
+                    ]
+                    start = time.perf_counter()
+                    try:
+                        order = place_order(basket, user_id=user, delivery_charge=0)
+                    except DatabaseError as exc:
+                        with lock:
+                            failures.append(exc)
+                        continue
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        invoices.append(order.invoice_number)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        self.report(latencies, failures, wall, lines)
+        self.verify(products, initial_stock, invoices)
+
+    def generate(self, count):
+        user = UserAuth.objects.create_user(
+            phone=f'019{random.randint(0, 10 ** 8 - 1):08d}', password=None, full_name='Order Benchmark',
+            email=f'order-benchmark-{time.time_ns()}@example.com',
+        )
+        skus = next_skus(count)
+        Product.objects.bulk_create([
+            Product(product_name=f'Order Benchmark {sku}', sku=sku, mrp=10, selling_price=9, stock_quantity=10 ** 6)
+            for sku in skus
+        ])
+        # bulk_create does not set the ids on MySQL; read them back.
+        return user, list(Product.objects.filter(sku__in=skus).order_by('pk').values_list('pk', flat=True))
+
+    def report(self, latencies, failures, wall, lines):
+        placed = len(latencies)
+        if not placed:
+            self.stderr.write(f"No order was placed ({len(failures)} failures).")
+            return
+        latencies = sorted(latencies)
+        p50 = latencies[placed // 2]
+        p95 = latencies[min(placed - 1, int(placed * 0.95))]
+        self.stdout.write(
+            f"{placed} orders of {lines} lines in {wall:.2f}s: {placed / wall:.1f} orders/s, "
+            f"latency p50 {p50 * 1000:.1f}ms p95 {p95 * 1000:.1f}ms, {len(failures)} failures"
+        )
+        for exc in failures[:5]:
+            self.stderr.write(f"  {type(exc).__name__}: {exc}")
+
+    def verify(self, products, initial_stock, invoices):
+        sold = dict(
+            StockMovement.objects.filter(reference__in=invoices, kind=StockMovement.SALE)
+            .values_list('product_id').annotate(total=Sum('quantity'))
+        )
+        current = dict(Product.objects.filter(pk__in=products).values_list('pk', 'stock_quantity'))
+        lost = [pk for pk in products if current[pk] != initial_stock[pk] + sold.get(pk, 0)]
+        if lost:
+            self.stderr.write(f"Stock does not match the ledger for {len(lost)} products")
+        else:
+            self.stdout.write(self.style.SUCCESS("Stock counters match the ledger for every product."))
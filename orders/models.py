@@ -2,8 +2,7 @@ from django.db import models
 from django.utils import timezone
 from accounts.models import UserAuth  # Import User model from accounts app
 from products.models import Product  # Import Product model from products app
-import datetime
-import random
+from products.sequences import next_invoice_number
 
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -36,20 +35,14 @@ class Order(models.Model):
 
     def generate_invoice_number(self):
         """
-        Generates a unique invoice number based on the current date and a random number.
+        Next invoice number of the order's day, from the block sequence allocator.
         """
-        date_part = datetime.datetime.now().strftime("%Y%m%d")
-        random_part = random.randint(1000, 9999)
-        return f"INV-{date_part}-{random_part}"
+        return next_invoice_number(timezone.localdate(self.order_date))
 
     def save(self, *args, **kwargs):
         # Generate a unique invoice number if it doesn't exist
         if not self.invoice_number:
-            while True:
-                new_invoice_number = self.generate_invoice_number()
-                if not Order.objects.filter(invoice_number=new_invoice_number).exists():
-                    self.invoice_number = new_invoice_number
-                    break
+            self.invoice_number = self.generate_invoice_number()
 
         super().save(*args, **kwargs)
 
@@ -0,0 +1,77 @@
+"""
+Order placement engine.
+
+``place_order`` writes an order and its lines with a fixed number of
+queries, whatever the size of the basket, in one transaction:
+
+1. lock every product of the basket in one ``SELECT ... FOR UPDATE`` ordered
+   by id (a single lock order, so concurrent baskets sharing products queue
+   instead of deadlocking);
+2. price every line from that locked snapshot and insert the order once,
+   with its total already computed;
+3. ``bulk_create`` the lines (``OrderItem.save()`` would reload the product
+   per line to set ``unit_price``);
+4. record the sales in the stock ledger, which decrements the stock of all
+   products with one ``UPDATE ... SET stock_quantity = stock_quantity + CASE
+   ... END``.
+
+The row locks are held only for the few statements between the lock and the
+commit.
+"""
+from django.db import transaction
+from rest_framework import serializers
+
+from products.models import Product, StockMovement
+from products.stock import record_movements
+from .models import Order, OrderItem
+
+
+def missing_product_errors(lines, existing):
+    """
+    Per-line errors (``{}`` for good lines) for lines whose product is not
+    in ``existing``, or None if every product exists.
+    """
+    message = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+    errors = [
+        {} if line['product'] in existing else {'product': [message.format(pk_value=line['product'])]}
+        for line in lines
+    ]
+    return errors if any(errors) else None
+
+
+def place_order(lines, **order_fields):
+    """
+    Create an ``Order`` from ``order_fields`` with one line per
+    ``{'product': product_id, 'quantity': n}`` of ``lines``, priced at the
+    products' current selling price; returns the order.
+    """
+    default_quantity = OrderItem._meta.get_field('quantity').default
+    lines = [{'product': line['product'], 'quantity': line.get('quantity', default_quantity)} for line in lines]
+    with transaction.atomic():
+        products = Product.objects.select_for_update().filter(
+            pk__in={line['product'] for line in lines}
+        ).order_by('pk').only('pk', 'selling_price')
+        prices = {product.pk: product.selling_price for product in products}
+        errors = missing_product_errors(lines, prices)
+        if errors:
+            # A product was deleted after the basket was validated
+            raise serializers.ValidationError({'items': errors})
+
+        order = Order(**order_fields)
+        order.total_amount = sum(prices[line['product']] * line['quantity'] for line in lines)
+        order.save()
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=line['product'], quantity=line['quantity'], unit_price=prices[line['product']])
+            for line in lines
+        ])
+        record_movements([
+            StockMovement(
+                product_id=line['product'],
+                kind=StockMovement.SALE,
+                quantity=-line['quantity'],
+                reference=order.invoice_number,
+            )
+            for line in lines
+        ])
+    return order
@@ -2,7 +2,10 @@ from rest_framework import serializers
 from .models import *
 from products.models import Product
 from django.utils import timezone
+from django.db.models import Prefetch
 from accounts.models import UserAuth
+from script.serializers import SparseFieldsetMixin, requested
+from .placement import missing_product_errors, place_order
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.product_name', read_only=True)
@@ -18,6 +21,13 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id','product', 'product_name','product_image','company_name', 'quantity', 'mrp','selling_price', 'discount_percent','discount', 'items_total','created_on', 'updated_on']
         # fields = '__all__'
 
+    @staticmethod
+    def prepare_queryset(queryset):
+        """
+        Eager-load the product (and its company) read by the product fields.
+        """
+        return queryset.select_related('product__company_id')
+
     def validate_quantity(self, value):
         if value == 0:
             raise serializers.ValidationError("Quantity must be greater than zero.")
@@ -34,6 +44,26 @@ class OrderItemSerializer(serializers.ModelSerializer):
         """
         return (obj.product.mrp - obj.product.selling_price) * obj.quantity
     
+class ProductIdField(serializers.PrimaryKeyRelatedField):
+    """
+    Takes a product id without loading the product; the order placement
+    engine checks all the ids of a basket in one query instead.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class OrderLineSerializer(OrderItemSerializer):
+    """``OrderItemSerializer`` for lines nested in ``OrderSerializer``."""
+    product = ProductIdField(queryset=Product.objects.all())
+
+
 class ReturnItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source="product.product_name", read_only=True)
     product_image = serializers.ImageField(source='product.product_image', read_only=True, use_url=True)
@@ -52,6 +82,10 @@ class ReturnItemSerializer(serializers.ModelSerializer):
             "total_return",
         ]
 
+    @staticmethod
+    def prepare_queryset(queryset):
+        return queryset.select_related('product__company_id')
+
     def get_mrp(self, obj):
         return float(obj.product.mrp) if obj.product else 0.0
 
@@ -65,9 +99,9 @@ class ReturnItemSerializer(serializers.ModelSerializer):
         return float(obj.quantity * obj.product.selling_price) if obj.product else 0.0
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     delivery_charge = serializers.FloatField()  # ensure number
-    items = OrderItemSerializer(many=True)
+    items = OrderLineSerializer(many=True)
     return_items = ReturnItemSerializer(many=True, read_only=True)
     total_return_amount = serializers.SerializerMethodField()  # NEW field
     total_amount = serializers.SerializerMethodField()
@@ -86,6 +120,25 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
 
 
+    @staticmethod
+    def prepare_queryset(queryset, fields=None):
+        """
+        Eager-load the customer, the order lines and their products so a page
+        of orders serializes with a constant number of queries. With a sparse
+        ``fields`` selection only the relations those fields read are loaded.
+        """
+        if requested(fields, 'full_name', 'shop_name'):
+            queryset = queryset.select_related('user_id')
+        if requested(fields, 'items', 'total_amount', 'final_amount'):
+            queryset = queryset.prefetch_related(
+                Prefetch('items', queryset=OrderItemSerializer.prepare_queryset(OrderItem.objects.all())),
+            )
+        if requested(fields, 'return_items', 'total_return_amount'):
+            queryset = queryset.prefetch_related(
+                Prefetch('return_items', queryset=ReturnItemSerializer.prepare_queryset(ReturnItem.objects.all())),
+            )
+        return queryset
+
     # --------------------
     # Calculate total amount from order items
     # --------------------
@@ -105,6 +158,16 @@ class OrderSerializer(serializers.ModelSerializer):
     def get_shop_name(self, obj):
         return obj.user_id.shop_name if obj.user_id else None
 
+    def validate_items(self, items):
+        """Check that every product of the basket exists, in one query."""
+        existing = set(Product.objects.filter(
+            pk__in={item['product'] for item in items}
+        ).values_list('pk', flat=True))
+        errors = missing_product_errors(items, existing)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return items
+
     # --------------------
     # Create order with items
     # --------------------
@@ -116,29 +179,9 @@ class OrderSerializer(serializers.ModelSerializer):
         if user and hasattr(user, 'shop_address'):
             validated_data['shipping_address'] = user.shop_address
 
-        # Temporarily create order
-        order = Order.objects.create(**validated_data)
-
-        # Create order items and calculate total
-        total_amount = 0
-        for item_data in items_data:
-            product = Product.objects.select_for_update().get(pk=item_data['product'].pk)
-            quantity = item_data['quantity']
-
-            # if product.stock_quantity < quantity:
-            #     raise serializers.ValidationError({
-            #         'product': f"Not enough stock for {product.product_name}."
-            #     })
-
-            product.stock_quantity -= quantity
-            product.save()
-
-            order_item = OrderItem.objects.create(order=order, **item_data)
-            total_amount += order_item.items_total()
-
-        order.total_amount = total_amount
-        order.save()
-        return order
+        order = place_order(items_data, **validated_data)
+        # Reload with the relations the response reads, in a constant number of queries
+        return OrderSerializer.prepare_queryset(Order.objects.all()).get(pk=order.pk)
     
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', None)
@@ -155,7 +198,9 @@ class OrderSerializer(serializers.ModelSerializer):
             # Create new items from incoming data
             total_amount = 0
             for item_data in items_data:
-                order_item = OrderItem.objects.create(order=order, **item_data)
+                order_item = OrderItem.objects.create(
+                    order=order, product_id=item_data['product'], quantity=item_data.get('quantity', 1)
+                )
                 total_amount += order_item.items_total()
 
             # Update total_amount and save order
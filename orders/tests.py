@@ -1,3 +1,191 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.models import UserAuth
+from products.models import Company, Product, StockMovement
+from .fastpath import order_rows
+from .models import Order, OrderItem, ReturnItem
+from .serializers import OrderSerializer
+
+
+class OrderQueryCountTests(TestCase):
+    """
+    Order listings must not issue per-order or per-line queries.
+    """
+
+    def setUp(self):
+        self.user = UserAuth.objects.create_user(
+            phone='01700000000', password='secret', full_name='Tester', email='tester@example.com',
+            is_superuser=True,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        company = Company.objects.create(company_name='Square Pharma')
+        self.products = [
+            Product.objects.create(product_name=f'Napa {i}', mrp=10, selling_price=9, company_id=company)
+            for i in range(3)
+        ]
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(user_id=self.user)
+            for product in self.products:
+                OrderItem.objects.create(order=order, product=product, quantity=2)
+            ReturnItem.objects.create(order=order, product=self.products[0], quantity=1)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.add_orders(2)
+        few = self.count_queries(url)
+        self.add_orders(10)
+        many = self.count_queries(url)
+        self.assertEqual(few, many, url)
+
+    def test_order_list(self):
+        self.assertConstantQueries('/orders/orders/?page_size=500')
+
+    def test_pending_orders(self):
+        self.assertConstantQueries('/orders/pending_order/')
+
+    def test_order_items(self):
+        self.assertConstantQueries('/orders/order_items/')
+
+    def test_order_export(self):
+        self.assertConstantQueries('/orders/orders/?export=all')
+
+    def test_sparse_order_list(self):
+        self.add_orders(2)
+        full = self.count_queries('/orders/orders/')
+        url = '/orders/orders/?fields=invoice_number,order_status,order_date,total_amount'
+        sparse = self.count_queries(url)
+        self.assertLess(sparse, full)
+        response = self.client.get(url)
+        order = response.data['results']['data'][0]
+        self.assertEqual(set(order), {'invoice_number', 'order_status', 'order_date', 'total_amount'})
+        self.assertEqual(order['total_amount'], 54)
+
+    def test_order_export_streams_every_order(self):
+        self.add_orders(3)
+        response = self.client.get('/orders/orders/?export=all')
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(body['status'], 'success')
+        self.assertEqual(len(body['data']), 3)
+        self.assertEqual(len(body['data'][0]['items']), 3)
+
+
+class OrderStockTests(TestCase):
+
+    def setUp(self):
+        self.user = UserAuth.objects.create_user(
+            phone='01700000000', password='secret', full_name='Tester', email='tester@example.com',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(product_name=f'Napa {i}', mrp=10, selling_price=9, stock_quantity=20)
+            for i in range(2)
+        ]
+
+    def test_order_decrements_stock_through_ledger(self):
+        response = self.client.post('/orders/orders/', {
+            'user_id': self.user.pk,
+            'delivery_charge': 0,
+            'items': [
+                {'product': self.products[0].pk, 'quantity': 3},
+                {'product': self.products[1].pk, 'quantity': 5},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get()
+        self.assertEqual(
+            sorted(Product.objects.values_list('stock_quantity', flat=True)), [15, 17]
+        )
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(kind=StockMovement.SALE).values_list('quantity', 'reference')),
+            [(-5, order.invoice_number), (-3, order.invoice_number)],
+        )
+
+
+    def place(self, lines):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/orders/orders/', {
+                'user_id': self.user.pk,
+                'delivery_charge': 0,
+                'items': [{'product': product.pk, 'quantity': quantity} for product, quantity in lines],
+            }, format='json')
+        return response, len(ctx.captured_queries)
+
+    def test_placement_query_count_does_not_grow_with_lines(self):
+        more = [Product.objects.create(product_name=f'Ace {i}', mrp=5, selling_price=4) for i in range(20)]
+        self.place([(self.products[0], 1)])  # warm up the invoice number block
+        response, few = self.place([(self.products[0], 1), (self.products[1], 1)])
+        self.assertEqual(response.status_code, 201)
+        response, many = self.place([(product, 2) for product in more])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(few, many)
+
+        order = Order.objects.get(pk=response.data['data']['order_id'])
+        self.assertEqual(order.total_amount, 160)
+        self.assertEqual(set(order.items.values_list('unit_price', flat=True)), {4})
+        self.assertEqual(len(response.data['data']['items']), 20)
+
+    def test_unknown_product_is_reported_per_line(self):
+        missing = Product(pk=999999)
+        response, _ = self.place([(self.products[0], 1), (missing, 1)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors']['items'][0], {})
+        self.assertIn('product', response.data['errors']['items'][1])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 20)
+
+
+class OrderFastPathTests(TestCase):
+    """
+    ``order_rows`` must produce exactly what ``OrderSerializer`` does.
+    """
+
+    def setUp(self):
+        user = UserAuth.objects.create_user(
+            phone='01700000000', password='secret', full_name='Tester', email='tester@example.com',
+            shop_name='Tester Pharmacy',
+        )
+        company = Company.objects.create(company_name='Square Pharma')
+        napa = Product.objects.create(
+            product_name='Napa', mrp=10, selling_price=9, company_id=company, product_image='product_images/napa.jpg',
+        )
+        ace = Product.objects.create(product_name='Ace', mrp=Decimal('10.50'), selling_price=Decimal('9.25'))
+        order = Order.objects.create(user_id=user, shipping_address='Dhaka', delivery_charge=Decimal('60.5'))
+        OrderItem.objects.create(order=order, product=napa, quantity=2)
+        OrderItem.objects.create(order=order, product=ace, quantity=3)
+        ReturnItem.objects.create(order=order, product=ace, quantity=1, reason='Damaged')
+        Order.objects.create(user_id=user)  # no lines
+
+    def assertParity(self, context):
+        queryset = Order.objects.all()
+        expected = OrderSerializer(OrderSerializer.prepare_queryset(queryset), many=True, context=context).data
+        actual = list(order_rows(queryset, context, chunk_size=1))
+        self.assertEqual(json.dumps(expected, cls=JSONEncoder), json.dumps(actual, cls=JSONEncoder))
+
+    def test_parity(self):
+        self.assertParity({})
+
+    def test_parity_with_request(self):
+        self.assertParity({'request': RequestFactory().get('/')})
+
+    def test_parity_with_sparse_fields(self):
+        self.assertParity({'fields': {'invoice_number', 'order_status', 'order_date', 'total_amount'}})
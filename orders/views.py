@@ -5,13 +5,15 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from script.pagination import KeysetPageNumberPagination
+from script.streaming import streaming_json_response, streaming_json_rows_response
+from .fastpath import order_rows
 from settings.models import SiteInfoModel
 from notification.models import *
 from django.utils.dateparse import parse_datetime
 
 
-class OrderPagination(PageNumberPagination):
+class OrderPagination(KeysetPageNumberPagination):
     page_size = 10  # default page size
     page_size_query_param = 'page_size'  # let client override page size using ?page_size=
     max_page_size = 500
@@ -19,34 +21,36 @@ class OrderPagination(PageNumberPagination):
 class OrderViewSet(APIView):
     permission_classes = [IsAuthenticated]
     pagination_class = OrderPagination()
+    export_chunk_size = 500
 
     def get(self, request, pk=None):
         user = request.user
         from_datetime = request.query_params.get('from_datetime')
         to_datetime = request.query_params.get('to_datetime')
         area = request.query_params.get('area')
+        fields = OrderSerializer.selected_fields(request)
         if from_datetime and to_datetime and area:
             # Parse ISO 8601 datetime strings
             from_dt = parse_datetime(from_datetime)
             to_dt = parse_datetime(to_datetime)
 
             # Filter orders by datetime and area
-            orders = Order.objects.filter(
+            orders = OrderSerializer.prepare_queryset(Order.objects.filter(
                 order_date__range=(from_dt, to_dt),
                 user_id__area_id=area
-            )
+            ), fields)
             # Apply pagination
             paginator = self.pagination_class
             paginated_orders = paginator.paginate_queryset(orders, request)
-            serializer = OrderSerializer(paginated_orders, many=True)
+            serializer = OrderSerializer(paginated_orders, many=True, context={'fields': fields})
             return paginator.get_paginated_response({
                 "status": "success",
                 "data": serializer.data
             })
         if pk:
             try:
-                order = Order.objects.get(pk=pk)
-                serializer = OrderSerializer(order)
+                order = OrderSerializer.prepare_queryset(Order.objects.all(), fields).get(pk=pk)
+                serializer = OrderSerializer(order, context={'fields': fields})
                 return Response({"status": "success", "data": serializer.data}, status=status.HTTP_200_OK)
             except Order.DoesNotExist:
                 return Response({"status": "error", "message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -54,10 +58,19 @@ class OrderViewSet(APIView):
             orders = Order.objects.all().order_by('-created_on')
         else:
             orders = Order.objects.filter(user_id=user).order_by('-created_on')
+        orders = OrderSerializer.prepare_queryset(orders, fields)
+
+        # Full export for the admin dashboard: stream every order in chunks
+        if user.is_superuser and request.query_params.get('export') == 'all':
+            return streaming_json_rows_response(
+                order_rows(orders, {'fields': fields}, chunk_size=self.export_chunk_size),
+                chunk_size=self.export_chunk_size,
+            )
+
         # Apply pagination
         paginator = self.pagination_class
         paginated_orders = paginator.paginate_queryset(orders, request)
-        serializer = OrderSerializer(orders, many=True)
+        serializer = OrderSerializer(paginated_orders, many=True, context={'fields': fields})
         return paginator.get_paginated_response({
             "status": "success",
             "data": serializer.data
@@ -130,6 +143,7 @@ class PendingOrderViewSet(APIView):
         else:
             orders = Order.objects.filter(order_status='pending',user_id=user).order_by('-created_on')
             pending_orders = Order.objects.filter(order_status='pending',user_id=user).order_by('-created_on').count()
+        orders = OrderSerializer.prepare_queryset(orders)
         serializer = OrderSerializer(orders, many=True)
         return Response({"status": "success",'total':pending_orders, "data": serializer.data}, status=status.HTTP_200_OK)
 
@@ -141,7 +155,7 @@ class OrderItemViewSet(APIView):
         user = request.user
         if pk:
             try:
-                order_item = OrderItem.objects.get(pk=pk)
+                order_item = OrderItemSerializer.prepare_queryset(OrderItem.objects.all()).get(pk=pk)
                 serializer = OrderItemSerializer(order_item)
                 return Response({"status": "success", "data": serializer.data}, status=status.HTTP_200_OK)
             except OrderItem.DoesNotExist:
@@ -149,11 +163,9 @@ class OrderItemViewSet(APIView):
         if user.is_superuser:
             order_items = OrderItem.objects.all().order_by('-created_on')
         else:
-            order_items = OrderItem.objects.filter(user_id=user).order_by('-created_on')
-
-        
-        serializer = OrderItemSerializer(order_items, many=True)
-        return Response({"status": "success", "data": serializer.data}, status=status.HTTP_200_OK)
+            order_items = OrderItem.objects.filter(order__user_id=user).order_by('-created_on')
+        order_items = OrderItemSerializer.prepare_queryset(order_items)
+        return streaming_json_response(order_items, OrderItemSerializer)
 
     def post(self, request):
         serializer = OrderItemSerializer(data=request.data)
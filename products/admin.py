@@ -1,16 +1,46 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+from .importer import ProductImporter
 from .models import *
+from .stock import record_movements, save_without_stock, set_stock
 # Register your models here.
 admin.site.register(Company)
 admin.site.register(BannerImages)
 admin.site.register(GenericName)
 admin.site.register(TempProduct)
 
+
+@admin.register(StockBatch)
+class StockBatchAdmin(admin.ModelAdmin):
+    list_display = ['batch_id', 'user_id', 'status', 'line_count', 'total_value', 'created_on', 'confirmed_on']
+    list_filter = ['status']
+    readonly_fields = ['line_count', 'total_value', 'confirmed_on']
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['product', 'kind', 'quantity', 'reference', 'created_on', 'created_by']
+    list_filter = ['kind']
+    search_fields = ['product__product_name', 'reference']
+    raw_id_fields = ['product']
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'description', 'created_on']
     search_fields = ['name']
 
+class ProductImportForm(forms.Form):
+    csv_file = forms.FileField(label="CSV file")
+    create_missing = forms.BooleanField(
+        required=False, initial=True, label="Create missing companies, generic names and categories"
+    )
+    dry_run = forms.BooleanField(required=False, label="Only validate the file")
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['product_name', 'get_categories', 'company_id','quantity_per_box', 'mrp', 'stock_quantity', 'is_active']
@@ -20,3 +50,56 @@ class ProductAdmin(admin.ModelAdmin):
     def get_categories(self, obj):
         return ", ".join([category.name for category in obj.category_id.all()])
     get_categories.short_description = 'Categories'  # Sets the column header in the admin list view
+
+    def save_model(self, request, obj, form, change):
+        # Stock edits go through the ledger (the change view is already atomic)
+        if change and 'stock_quantity' in form.changed_data:
+            set_stock(obj, obj.stock_quantity, reference='Admin edit', created_by=str(request.user))
+        if change:
+            save_without_stock(obj)
+        else:
+            super().save_model(request, obj, form, change)
+            record_movements([StockMovement(
+                product=obj, kind=StockMovement.ADJUSTMENT, quantity=obj.stock_quantity,
+                reference='Opening stock', created_by=str(request.user),
+            )], apply=False)
+
+    def get_urls(self):
+        urls = [
+            path('import-csv/', self.admin_site.admin_view(self.import_csv), name='products_product_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_csv(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        errors = []
+        if request.method == 'POST':
+            form = ProductImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                importer = ProductImporter(
+                    create_missing=form.cleaned_data['create_missing'],
+                    dry_run=form.cleaned_data['dry_run'],
+                    user=request.user,
+                )
+                lines = io.TextIOWrapper(form.cleaned_data['csv_file'].file, encoding='utf-8-sig', newline='')
+                try:
+                    importer.run(lines)
+                except (UnicodeDecodeError, ValueError) as e:
+                    form.add_error('csv_file', str(e))
+                else:
+                    prefix = "[dry run] " if importer.dry_run else ""
+                    level = messages.WARNING if importer.errors else messages.SUCCESS
+                    self.message_user(request, prefix + importer.summary(), level)
+                    errors = sorted(importer.errors)
+        else:
+            form = ProductImportForm()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Import products",
+            'form': form,
+            'errors': errors[:500],
+            'error_count': len(errors),
+        }
+        return TemplateResponse(request, 'admin/products/product/import_csv.html', context)
@@ -0,0 +1,141 @@
+"""
+Stock receipt batches: staged ``TempProduct`` lines under a ``StockBatch``
+header whose line count, total value and status are kept up to date here.
+
+``confirm_batch`` applies a whole receipt in one transaction with a fixed
+number of queries, whatever its size:
+
+1. lock the header and the batch's pending lines, so a retried or concurrent
+   confirm waits and then finds nothing left to apply (confirming twice is a
+   no-op);
+2. lock the affected products in one ``SELECT ... FOR UPDATE`` ordered by id,
+   a single lock order so two batches sharing products cannot deadlock;
+3. write the new prices with ``bulk_update``;
+4. record the receipts in the stock ledger, which adds the quantities with
+   one ``UPDATE ... SET stock_quantity = stock_quantity + CASE ... END``;
+5. mark the lines and the header confirmed with one ``UPDATE`` each.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Product, StockBatch, StockMovement, TempProduct
+from .snapshot import schedule_snapshot
+from .stock import record_movements
+
+
+PRICE_FIELDS = ['cost_price', 'selling_price', 'discount_percent', 'updated_on']
+
+
+def open_batch(user):
+    """``user``'s open batch, created if they have none."""
+    batch = StockBatch.objects.filter(user_id=user, status=StockBatch.OPEN).order_by('created_on').first()
+    if batch is None:
+        batch = StockBatch.objects.create(user_id=user)
+    return batch
+
+
+def count_lines(batch_id, line_count, total_value):
+    """Add (or, with negative values, remove) staged lines to a header's totals."""
+    StockBatch.objects.filter(pk=batch_id).update(
+        line_count=F('line_count') + line_count,
+        total_value=F('total_value') + total_value,
+        updated_on=timezone.now(),
+    )
+
+
+def stage_lines(user, lines):
+    """
+    Stage ``TempProduct`` lines (dicts of field values, ``product_id`` given
+    as an id) in ``user``'s open batch with one ``bulk_create``; returns the
+    created lines.
+    """
+    with transaction.atomic():
+        batch = open_batch(user)
+        temps = []
+        for values in lines:
+            values = dict(values)
+            temp = TempProduct(batch_id=batch.pk, user_id=user, product_id_id=values.pop('product_id'), **values)
+            temp.update_total_amount()  # bulk_create skips save()
+            temps.append(temp)
+        TempProduct.objects.bulk_create(temps)
+        if temps[0].pk is None:
+            # The backend (MySQL) does not return bulk-inserted ids; ours are
+            # the batch's newest lines.
+            ids = TempProduct.objects.filter(batch_id=batch.pk).order_by('-id').values_list('id', flat=True)
+            for temp, pk in zip(temps, reversed(list(ids[:len(temps)]))):
+                temp.pk = pk
+        count_lines(batch.pk, len(temps), sum(temp.total_amount for temp in temps))
+    return temps
+
+
+def stage_line(user, product, **values):
+    """
+    Stage one ``TempProduct`` line for ``product`` in ``user``'s open batch.
+    """
+    with transaction.atomic():
+        batch = open_batch(user)
+        line = TempProduct.objects.create(batch_id=batch.pk, user_id=user, product_id=product, **values)
+        count_lines(batch.pk, 1, line.total_amount)
+    return line
+
+
+def cancel_batch(batch_id, user):
+    """
+    Remove the pending lines of ``user``'s batch; returns how many were removed.
+    """
+    with transaction.atomic():
+        pending = TempProduct.objects.filter(batch_id=batch_id, user_id=user, is_confirmed=False)
+        total_value = pending.aggregate(total=Sum('total_amount'))['total'] or 0
+        deleted_count, _ = pending.delete()
+        if deleted_count:
+            count_lines(batch_id, -deleted_count, -total_value)
+            StockBatch.objects.filter(pk=batch_id, status=StockBatch.OPEN).update(status=StockBatch.CANCELLED)
+    return deleted_count
+
+
+def confirm_batch(batch_id, user):
+    """
+    Apply the pending lines of ``user``'s batch ``batch_id``; returns the
+    number of lines applied (0 if none were pending).
+    """
+    with transaction.atomic():
+        # The header lock serializes confirms of the same batch
+        list(StockBatch.objects.select_for_update().filter(pk=batch_id, user_id=user).values_list('pk'))
+        lines = list(
+            TempProduct.objects.select_for_update()
+            .filter(batch_id=batch_id, user_id=user, is_confirmed=False)
+            .order_by('id')
+            .values('id', 'product_id', 'new_stock_quantity', 'new_cost_price', 'new_selling_price')
+        )
+        if not lines:
+            return 0
+
+        products = Product.objects.select_for_update().filter(
+            pk__in={line['product_id'] for line in lines}
+        ).order_by('pk').only('pk', 'mrp', 'cost_price', 'selling_price', 'discount_percent')
+        products = {product.pk: product for product in products}
+
+        now = timezone.now()
+        movements = []
+        for line in lines:
+            # Lines are in staging order, so the last price staged for a product wins
+            product = products[line['product_id']]
+            product.cost_price = line['new_cost_price']
+            product.selling_price = line['new_selling_price']
+            product.update_discount_percent()
+            product.updated_on = now
+            movements.append(StockMovement(
+                product_id=product.pk,
+                kind=StockMovement.RECEIPT,
+                quantity=line['new_stock_quantity'],
+                reference=str(batch_id),
+                created_by=str(user),
+            ))
+
+        Product.objects.bulk_update(products.values(), PRICE_FIELDS)
+        record_movements(movements)
+        TempProduct.objects.filter(pk__in=[line['id'] for line in lines]).update(is_confirmed=True)
+        StockBatch.objects.filter(pk=batch_id).update(status=StockBatch.CONFIRMED, confirmed_on=now, updated_on=now)
+        schedule_snapshot()
+    return len(lines)
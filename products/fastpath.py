@@ -0,0 +1,97 @@
+"""
+values()-based read path for ``ProductSerializer``.
+
+``product_rows(queryset)`` yields exactly the dicts ``ProductSerializer``
+produces for the same queryset, built from flat ``values()`` rows instead of
+model instances: one query per chunk for the products (company and generic
+name joined in) and one for their categories, grouped in a single pass. Raw
+columns are still formatted by the serializer's own fields, so dates, floats
+and image URLs cannot drift; the parity tests in ``products/tests.py`` keep
+the two paths in step. A sparse ``context['fields']`` selection is honoured.
+"""
+from django.db.models.fields.related import RelatedField as ModelRelatedField
+from rest_framework.relations import RelatedField
+
+from script.serializers import file_value, represent
+from script.streaming import chunks
+from .images import variant_urls
+from .models import Category, Product
+from .serializers import ProductSerializer
+
+
+DEFAULT_CHUNK_SIZE = 2000
+
+SKIP = object()  # the serializer leaves the key out (e.g. company_name without a company)
+
+
+def _category_map(product_ids, want_names):
+    """``{product_id: [(category_id, name), ...]}`` in prefetch (name) order."""
+    columns = ('products', 'category_id', 'name') if want_names else ('products', 'category_id')
+    categories = {}
+    for row in Category.objects.filter(products__in=product_ids).values_list(*columns):
+        categories.setdefault(row[0], []).append(row[1:])
+    return categories
+
+
+def product_rows(queryset, context=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield ``ProductSerializer(product, context=context).data`` for every
+    product of ``queryset``, in the queryset's order.
+    """
+    serializer = ProductSerializer(context=context or {})
+    fields = serializer.fields
+    request = serializer.context.get('request')
+    image_field = Product._meta.get_field('product_image')
+
+    special = {
+        'generic_name': (
+            ('generic_name', 'generic_name__name'),
+            lambda row, categories: row['generic_name__name'] if row['generic_name'] is not None else None,
+        ),
+        'company_name': (
+            ('company_id', 'company_id__company_name'),
+            lambda row, categories: SKIP if row['company_id'] is None else row['company_id__company_name'],
+        ),
+        'product_image_variants': (
+            ('product_image',),
+            lambda row, categories: variant_urls(file_value(image_field, row['product_image']), request),
+        ),
+        'category_id': ((), lambda row, categories: [category[0] for category in categories]),
+        'category_name': ((), lambda row, categories: [category[1] for category in categories]),
+    }
+
+    columns = {'pk'}
+    builders = []
+    for name, field in fields.items():
+        if field.write_only:
+            continue
+        if name in special:
+            needed, build = special[name]
+            columns.update(needed)
+            builders.append((name, build))
+            continue
+        columns.add(name)
+        model_field = Product._meta.get_field(name)
+        if isinstance(field, RelatedField) or isinstance(model_field, ModelRelatedField):
+            build = lambda row, categories, name=name: row[name]
+        elif name == 'product_image':
+            build = lambda row, categories, field=field: field.to_representation(
+                file_value(image_field, row['product_image'])
+            )
+        else:
+            build = lambda row, categories, name=name, field=field: represent(field, row[name])
+        builders.append((name, build))
+
+    want_categories = 'category_id' in fields or 'category_name' in fields
+    want_names = 'category_name' in fields
+    rows = queryset.prefetch_related(None).values(*columns).iterator(chunk_size=chunk_size)
+    for chunk in chunks(rows, chunk_size):
+        categories = _category_map([row['pk'] for row in chunk], want_names) if want_categories else {}
+        for row in chunk:
+            product_categories = categories.get(row['pk'], [])
+            data = {}
+            for name, build in builders:
+                value = build(row, product_categories)
+                if value is not SKIP:
+                    data[name] = value
+            yield data
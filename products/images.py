@@ -0,0 +1,171 @@
+"""
+Resized image variants for product images, company logos and banners.
+
+Every uploaded image gets ``thumb``, ``medium`` and ``large`` copies (by
+longest side, never upscaled) written next to the media tree under
+``variants/``, e.g. ``product_images/napa.png`` ->
+``variants/product_images/napa_thumb.webp``. Variant names are derived from
+the original name; serializers expose a variant URL only once its file
+exists and the original URL until then. Variants are written through a
+plain ``FileSystemStorage`` so the content-addressed default storage does
+not rename them. They are generated after the upload is committed, by a
+single background worker with a bounded queue (inline when
+``IMAGE_VARIANTS_ASYNC`` is False); images the worker missed or failed on
+are backfilled with ``manage.py generate_image_variants``.
+"""
+import logging
+import posixpath
+import queue
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = {
+    'thumb': 160,
+    'medium': 480,
+    'large': 1080,
+}
+VARIANT_ROOT = 'variants'
+VARIANT_QUEUE_SIZE = 500  # pending images; further uploads wait for the backfill command
+
+FORMATS = {
+    'WEBP': ('webp', {'quality': 80, 'method': 4}),
+    'JPEG': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+variant_storage = FileSystemStorage()
+
+
+def variant_format():
+    return getattr(settings, 'IMAGE_VARIANT_FORMAT', 'WEBP').upper()
+
+
+def variant_name(name, variant):
+    """Storage name of ``variant`` for the original image ``name``."""
+    extension = FORMATS[variant_format()][0]
+    stem = posixpath.splitext(name)[0]
+    return posixpath.join(VARIANT_ROOT, f'{stem}_{variant}.{extension}')
+
+
+def variant_urls(field_file, request=None):
+    """
+    ``{variant: url}`` for an image field value, or None when it is empty.
+    Variants that were not generated (yet) get the original image's URL.
+    """
+    if not field_file:
+        return None
+    urls = {}
+    for variant in VARIANT_SIZES:
+        name = variant_name(field_file.name, variant)
+        url = variant_storage.url(name) if variant_storage.exists(name) else field_file.url
+        urls[variant] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def variants_exist(field_file):
+    return all(variant_storage.exists(variant_name(field_file.name, variant)) for variant in VARIANT_SIZES)
+
+
+def render_variant(image, size, image_format):
+    image = image.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **FORMATS[image_format][1])
+    return buffer.getvalue()
+
+
+def generate_variants(field_file, force=False):
+    """
+    Write every missing variant of ``field_file``; returns the names written.
+    """
+    if not field_file:
+        return []
+    storage = variant_storage
+    image_format = variant_format()
+    pending = {
+        variant: variant_name(field_file.name, variant)
+        for variant in VARIANT_SIZES
+    }
+    if not force:
+        pending = {v: name for v, name in pending.items() if not storage.exists(name)}
+    if not pending:
+        return []
+
+    with field_file.storage.open(field_file.name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+
+    written = []
+    for variant, name in pending.items():
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(render_variant(image, VARIANT_SIZES[variant], image_format)))
+        written.append(name)
+    return written
+
+
+def _generate_safely(field_file):
+    try:
+        generate_variants(field_file)
+    except Exception:
+        logger.exception('Could not generate image variants for %s', field_file.name)
+
+
+class VariantWorker:
+    """One background thread generating variants from a bounded queue."""
+
+    def __init__(self, maxsize=VARIANT_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, field_file):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        try:
+            self.queue.put_nowait(field_file)
+        except queue.Full:
+            logger.warning('Image variant queue is full; skipping %s', field_file.name)
+
+    def _run(self):
+        while True:
+            field_file = self.queue.get()
+            try:
+                _generate_safely(field_file)
+            finally:
+                self.queue.task_done()
+
+
+variant_worker = VariantWorker()
+
+
+def schedule_variants(field_file):
+    """
+    Generate the missing variants of ``field_file`` once the current
+    transaction commits.
+    """
+    if not field_file or variants_exist(field_file):
+        return
+
+    def run():
+        if getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+            variant_worker.submit(field_file)
+        else:
+            _generate_safely(field_file)
+
+    transaction.on_commit(run)
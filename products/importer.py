@@ -0,0 +1,437 @@
+"""
+Bulk product import from CSV price lists.
+
+Rows are streamed from the file and written in chunks: ``Company``,
+``GenericName`` and ``Category`` names are resolved through in-memory maps
+(missing ones are created in bulk), new SKUs come from one block of the SKU
+sequence per chunk, ``discount_percent`` is computed in Python and each chunk is
+written with ``bulk_create``/``bulk_update`` inside its own transaction, so a
+20k-line distributor list costs a few hundred queries instead of one
+``Product.save()`` per line.
+
+A row updates an existing product when its ``sku`` matches one, or when a
+product with the same name already exists for the same company; otherwise a
+new product is created. Stock changes are recorded in the stock ledger. Invalid
+rows are skipped and reported with their line number. Used by ``manage.py import_products`` and the product admin upload.
+
+Expected columns (header names are case-insensitive)::
+
+    product_name, generic_name, company, categories, mrp, selling_price,
+    cost_price, stock_quantity, quantity_per_box, product_description,
+    sku, is_active
+
+``categories`` holds several names separated by ``;`` or ``|``.
+"""
+import csv
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .listing import category_listing
+from .models import Category, Company, GenericName, Product, StockMovement
+from .search import search_engine
+from .snapshot import schedule_snapshot
+from .sequences import next_skus
+from .stock import record_movements
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+COLUMN_ALIASES = {
+    'name': 'product_name',
+    'product': 'product_name',
+    'generic': 'generic_name',
+    'company_name': 'company',
+    'category': 'categories',
+    'description': 'product_description',
+    'stock': 'stock_quantity',
+    'price': 'selling_price',
+}
+CATEGORY_SEPARATOR = re.compile(r'[;|]')
+MAX_PRICE = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'active'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'inactive'}
+
+UPDATE_FIELDS = [
+    'product_name', 'generic_name', 'company_id', 'product_description', 'quantity_per_box',
+    'discount_percent', 'cost_price', 'mrp', 'selling_price', 'is_active',
+    'updated_by', 'updated_on',
+]
+
+
+class RowError(ValueError):
+    pass
+
+
+def discount_percent(mrp, selling_price):
+    """Same rule as ``Product.save()``."""
+    if mrp and selling_price and mrp > 0:
+        return round(((mrp - selling_price) / mrp) * 100)
+    return 0
+
+
+def parse_price(value, column, required=False):
+    value = (value or '').strip()
+    if not value:
+        if required:
+            raise RowError(f"{column} is required.")
+        return None
+    try:
+        price = Decimal(value.replace(',', '')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(f"{column} must be a number, got '{value}'.")
+    if price < 0 or price > MAX_PRICE:
+        raise RowError(f"{column} must be between 0 and {MAX_PRICE}.")
+    return price
+
+
+def parse_count(value, column):
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        count = int(Decimal(value))
+    except (InvalidOperation, ValueError):
+        raise RowError(f"{column} must be a whole number, got '{value}'.")
+    if count < 0:
+        raise RowError(f"{column} cannot be negative.")
+    return count
+
+
+def check_length(value, model, field, column):
+    """Longer names would make the chunk's ``bulk_create`` fail, not just the row."""
+    if len(value) > model._meta.get_field(field).max_length:
+        raise RowError(f"{column} '{value[:20]}...' is too long.")
+    return value
+
+
+def parse_bool(value, column):
+    value = (value or '').strip().lower()
+    if not value:
+        return None
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f"{column} must be yes/no, got '{value}'.")
+
+
+class NameMap:
+    """
+    Case-insensitive ``name -> pk`` map for a lookup model; names missing from
+    the database are collected and created in one ``bulk_create``.
+    """
+
+    def __init__(self, model, name_field, create_missing=True):
+        self.model = model
+        self.name_field = name_field
+        self.create_missing = create_missing
+        self.ids = {
+            name.casefold(): pk
+            for pk, name in model.objects.values_list('pk', name_field).iterator()
+        }
+        self.created = 0
+
+    def resolve(self, names):
+        missing = {}
+        for name in names:
+            if name.casefold() not in self.ids:
+                missing.setdefault(name.casefold(), name)
+        if missing and self.create_missing:
+            self.model.objects.bulk_create(
+                [self.model(**{self.name_field: name}) for name in missing.values()],
+                ignore_conflicts=True,
+            )
+            # Re-read: ignore_conflicts does not return primary keys.
+            lookup = {f'{self.name_field}__in': list(missing.values())}
+            for pk, name in self.model.objects.filter(**lookup).values_list('pk', self.name_field):
+                self.ids[name.casefold()] = pk
+            self.created += len(missing)
+
+    def get(self, name):
+        return self.ids.get(name.casefold())
+
+
+class ProductImporter:
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, create_missing=True, dry_run=False, user=None):
+        self.chunk_size = chunk_size
+        self.create_missing = create_missing and not dry_run
+        self.dry_run = dry_run
+        self.user = user
+        self.created = 0
+        self.updated = 0
+        self.errors = []  # [(line number, product name, message)]
+
+    @property
+    def skipped(self):
+        return len(self.errors)
+
+    def run(self, lines):
+        """
+        Import the CSV text ``lines`` (a text file object or any iterable of lines).
+        """
+        reader = csv.DictReader(lines)
+        if not reader.fieldnames:
+            raise ValueError("The CSV file is empty.")
+        columns = [self.column_name(name) for name in reader.fieldnames]
+        if 'product_name' not in columns or 'mrp' not in columns:
+            raise ValueError("The CSV file needs at least product_name and mrp columns.")
+
+        self.companies = NameMap(Company, 'company_name', self.create_missing)
+        self.generics = NameMap(GenericName, 'name', self.create_missing)
+        self.categories = NameMap(Category, 'name', self.create_missing)
+        self.seen_skus = set()
+        self.seen_keys = set()  # (name, company) of every row written so far
+        self.touched = set()  # pks of products updated so far
+
+        chunk = []
+        for raw in reader:
+            row = {column: (raw.get(name) or '').strip() for column, name in zip(columns, reader.fieldnames)}
+            if not any(row.values()):
+                continue
+            try:
+                chunk.append(self.parse_row(reader.line_num, row))
+            except RowError as e:
+                self.errors.append((reader.line_num, row.get('product_name', ''), str(e)))
+            if len(chunk) >= self.chunk_size:
+                self.write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.write_chunk(chunk)
+
+        if not self.dry_run and (self.created or self.updated):
+            # bulk_create/bulk_update do not send post_save, so the in-memory
+            # indexes of this worker are rebuilt once at the end.
+            if search_engine.is_built():
+                search_engine.rebuild()
+            if category_listing.is_built():
+                category_listing.rebuild()
+            schedule_snapshot()
+        return self
+
+    @staticmethod
+    def column_name(name):
+        name = (name or '').strip().lower().replace(' ', '_')
+        return COLUMN_ALIASES.get(name, name)
+
+    def parse_row(self, line, row):
+        name = row.get('product_name', '')
+        if not name:
+            raise RowError("product_name is required.")
+        if len(name) > Product._meta.get_field('product_name').max_length:
+            raise RowError("product_name is too long.")
+        mrp = parse_price(row.get('mrp'), 'mrp', required=True)
+        if mrp == 0:
+            raise RowError("mrp must be greater than 0.")
+        selling_price = parse_price(row.get('selling_price'), 'selling_price')
+        if selling_price is None:
+            selling_price = mrp
+        if selling_price > mrp:
+            raise RowError("selling_price cannot be greater than mrp.")
+
+        company = check_length(row.get('company', ''), Company, 'company_name', 'company')
+        generic_name = check_length(row.get('generic_name', ''), GenericName, 'name', 'generic_name')
+        categories = [
+            check_length(c.strip(), Category, 'name', 'categories')
+            for c in CATEGORY_SEPARATOR.split(row.get('categories', '')) if c.strip()
+        ]
+
+        sku = row.get('sku', '').upper()
+        if sku:
+            if sku in self.seen_skus:
+                raise RowError(f"SKU {sku} appears more than once in the file.")
+            self.seen_skus.add(sku)
+
+        return {
+            'line': line,
+            'product_name': name,
+            'sku': sku,
+            'company': company,
+            'generic_name': generic_name,
+            'categories': categories,
+            'mrp': mrp,
+            'selling_price': selling_price,
+            'cost_price': parse_price(row.get('cost_price'), 'cost_price'),
+            'stock_quantity': parse_count(row.get('stock_quantity'), 'stock_quantity'),
+            'quantity_per_box': parse_count(row.get('quantity_per_box'), 'quantity_per_box'),
+            'product_description': row.get('product_description') or None,
+            'is_active': parse_bool(row.get('is_active'), 'is_active'),
+        }
+
+    def resolve_names(self, rows):
+        self.companies.resolve({row['company'] for row in rows if row['company']})
+        self.generics.resolve({row['generic_name'] for row in rows if row['generic_name']})
+        self.categories.resolve({name for row in rows for name in row['categories']})
+
+        resolved = []
+        for row in rows:
+            try:
+                row['company_id'] = self.lookup(self.companies, row['company'], 'Company')
+                row['generic_id'] = self.lookup(self.generics, row['generic_name'], 'Generic name')
+                row['category_ids'] = [self.lookup(self.categories, c, 'Category') for c in row['categories']]
+                key = (row['product_name'].lower(), row['company_id'])
+                if key in self.seen_keys:
+                    raise RowError("The same product and company appear more than once in the file.")
+            except RowError as e:
+                self.errors.append((row['line'], row['product_name'], str(e)))
+                continue
+            self.seen_keys.add(key)
+            resolved.append(row)
+        return resolved
+
+    def lookup(self, names, name, label):
+        if not name:
+            return None
+        pk = names.get(name)
+        if pk is None and not self.dry_run:
+            raise RowError(f"{label} '{name}' does not exist.")
+        return pk
+
+    def match_existing(self, rows):
+        """``{id(row): Product}`` for rows that update an existing product."""
+        skus = {row['sku'] for row in rows if row['sku']}
+        names = {row['product_name'].lower() for row in rows}
+        candidates = Product.objects.annotate(name_key=Lower('product_name')).filter(
+            Q(sku__in=skus) | Q(name_key__in=names)
+        )
+        by_sku = {}
+        by_name = {}
+        for product in candidates:
+            by_sku[product.sku] = product
+            by_name.setdefault((product.name_key, product.company_id_id), product)
+
+        matches = {}
+        for row in rows:
+            product = by_sku.get(row['sku']) if row['sku'] else None
+            if product is None:
+                product = by_name.get((row['product_name'].lower(), row['company_id']))
+            if product is None:
+                continue
+            if product.pk in self.touched:
+                self.errors.append((row['line'], row['product_name'], "Matches a product already updated by an earlier row."))
+                matches[id(row)] = None
+                continue
+            self.touched.add(product.pk)
+            matches[id(row)] = product
+        return matches
+
+    def apply(self, product, row):
+        product.product_name = row['product_name']
+        product.company_id_id = row['company_id']
+        product.generic_name_id = row['generic_id']
+        product.mrp = row['mrp']
+        product.selling_price = row['selling_price']
+        product.discount_percent = discount_percent(row['mrp'], row['selling_price'])
+        if row['cost_price'] is not None:
+            product.cost_price = row['cost_price']
+        if row['stock_quantity'] is not None:
+            product.stock_quantity = row['stock_quantity']
+        if row['quantity_per_box'] is not None:
+            product.quantity_per_box = row['quantity_per_box']
+        if row['product_description'] is not None:
+            product.product_description = row['product_description']
+        if row['is_active'] is not None:
+            product.is_active = row['is_active']
+        if self.user is not None:
+            product.updated_by = str(self.user)
+        # bulk_update() skips auto_now fields.
+        product.updated_on = timezone.now()
+        return product
+
+    def write_chunk(self, rows):
+        rows = self.resolve_names(rows)
+        if not rows:
+            return
+        matches = self.match_existing(rows)
+
+        new_products, new_rows, changed = [], [], []
+        for row in rows:
+            if id(row) in matches:
+                product = matches[id(row)]
+                if product is None:
+                    continue
+                if row['sku']:
+                    # Matched by name: the row's SKU is not taken (it would have matched).
+                    product.sku = row['sku']
+                changed.append((product, row))
+                continue
+            product = Product(sku=row['sku'], product_image='')
+            if self.user is not None:
+                product.created_by = str(self.user)
+            new_products.append(self.apply(product, row))
+            new_rows.append(row)
+
+        if self.dry_run:
+            self.created += len(new_products)
+            self.updated += len(changed)
+            return
+
+        # One block reservation covers every new product without a SKU.
+        unnumbered = [product for product in new_products if not product.sku]
+        for product, sku in zip(unnumbered, next_skus(len(unnumbered))):
+            product.sku = sku
+
+        Link = Product.category_id.through
+        created_by = str(self.user) if self.user is not None else None
+        with transaction.atomic():
+            Product.objects.bulk_create(new_products)
+            # Only some backends return the new ids from a bulk insert; the
+            # SKUs are allocated above, so look the ids up by SKU.
+            new_pks = dict(
+                Product.objects.filter(sku__in=[product.sku for product in new_products]).values_list('sku', 'pk')
+            )
+            for product in new_products:
+                product.pk = new_pks[product.sku]
+            # Stock of existing products changes through the ledger, as the
+            # difference to the locked current value.
+            restocked = {product.pk: row['stock_quantity'] for product, row in changed if row['stock_quantity'] is not None}
+            current = dict(Product.objects.select_for_update().filter(pk__in=restocked).values_list('pk', 'stock_quantity'))
+            for product, row in changed:
+                self.apply(product, row)
+            Product.objects.bulk_update([product for product, _ in changed], UPDATE_FIELDS + ['sku'])
+            record_movements([
+                StockMovement(
+                    product=product, kind=StockMovement.ADJUSTMENT, quantity=product.stock_quantity,
+                    reference='CSV import', created_by=created_by,
+                )
+                for product in new_products
+            ], apply=False)
+            record_movements([
+                StockMovement(
+                    product_id=product_id, kind=StockMovement.ADJUSTMENT, quantity=quantity - current[product_id],
+                    reference='CSV import', created_by=created_by,
+                )
+                for product_id, quantity in restocked.items()
+            ])
+
+            # Categories in the file replace the product's categories; rows
+            # without a categories column value keep the existing ones.
+            relinked = [(product, row) for product, row in changed if row['category_ids']]
+            Link.objects.filter(product_id__in=[product.pk for product, _ in relinked]).delete()
+            Link.objects.bulk_create(
+                [
+                    Link(product_id=product.pk, category_id=category_id)
+                    for product, row in list(zip(new_products, new_rows)) + relinked
+                    for category_id in set(row['category_ids'])
+                ],
+                ignore_conflicts=True,
+            )
+        self.created += len(new_products)
+        self.updated += len(changed)
+
+    def write_error_report(self, stream):
+        writer = csv.writer(stream)
+        writer.writerow(['line', 'product_name', 'error'])
+        writer.writerows(sorted(self.errors))
+
+    def summary(self):
+        return (
+            f"{self.created} products created, {self.updated} updated, {self.skipped} rows skipped "
+            f"({self.companies.created} companies, {self.generics.created} generic names and "
+            f"{self.categories.created} categories created)."
+        )
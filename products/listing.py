@@ -0,0 +1,247 @@
+"""
+Materialized category -> product listing for the home screen.
+
+Keeps, per category, the ids of its active products in ``product_name``
+order, plus the category display order, so ``CategoryWiseProductView`` can
+serve a capped preview per category and page through a single category
+without prefetching the whole catalog. Maintained from ``Product``,
+``Category`` and ``Product.category_id`` m2m signals (see
+``products/signals.py``) and rebuilt every ``CATEGORY_LISTING_TTL`` seconds
+to pick up writes made by other workers. As with the search index
+(``products/search.py``), a rebuild reads the database into a new listing
+while readers keep using the current one, replays the signal updates made
+meanwhile and then swaps it in.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+
+
+# Categories shown first on the home screen, in this order; the rest follow by name.
+PREFERRED_CATEGORY_ORDER = ["Tablet", "Capsule"]
+
+
+def category_sort_key(name):
+    if name in PREFERRED_CATEGORY_ORDER:
+        return (PREFERRED_CATEGORY_ORDER.index(name), name)
+    return (len(PREFERRED_CATEGORY_ORDER), name)
+
+
+def product_sort_key(product_id, name):
+    return ((name or "").casefold(), product_id)
+
+
+class CategoryListing:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()  # one rebuild at a time
+        self.built_at = None
+        self.pending = None  # [(method, args)] of updates made while a rebuild reads the database
+        self._reset()
+
+    def _reset(self):
+        self.categories = {}  # category_id -> name
+        self.category_order = []  # category ids in display order
+        self.active_products = {}  # product_id -> sort key, active products only
+        self.product_categories = defaultdict(set)  # product_id -> {category_id}, all products
+        self.listings = defaultdict(list)  # category_id -> sorted [sort key]
+
+    @property
+    def ttl(self):
+        return getattr(settings, "CATEGORY_LISTING_TTL", 300)
+
+    def is_built(self):
+        return self.built_at is not None
+
+    def ensure_built(self):
+        if self.built_at is None:
+            with self.build_lock:
+                if self.built_at is None:
+                    self._rebuild()
+        elif time.monotonic() - self.built_at > self.ttl and self.build_lock.acquire(blocking=False):
+            # Stale: refresh it, unless another thread already is (readers
+            # use the current listing meanwhile).
+            try:
+                self._rebuild()
+            finally:
+                self.build_lock.release()
+
+    def rebuild(self):
+        with self.build_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        with self.lock:
+            self.pending = []
+        try:
+            staged = CategoryListing()
+            staged._load()
+        finally:
+            with self.lock:
+                pending, self.pending = self.pending, None
+        with self.lock:
+            staged.built_at = time.monotonic()
+            for method, args in pending:
+                getattr(staged, method)(*args)
+            vars(self).update(
+                (name, value) for name, value in vars(staged).items()
+                if name not in ("lock", "build_lock", "pending")
+            )
+
+    def _load(self):
+        from .models import Category, Product
+
+        for category_id, name in Category.objects.values_list("category_id", "name"):
+            self.categories[category_id] = name
+        self._sort_categories()
+        for product_id, name in Product.objects.filter(is_active=True).values_list("product_id", "product_name"):
+            self.active_products[product_id] = product_sort_key(product_id, name)
+        links = Product.category_id.through.objects.values_list("product_id", "category_id")
+        for product_id, category_id in links.iterator(chunk_size=5000):
+            self.product_categories[product_id].add(category_id)
+            key = self.active_products.get(product_id)
+            if key is not None:
+                self.listings[category_id].append(key)
+        for keys in self.listings.values():
+            keys.sort()
+
+    def _sort_categories(self):
+        self.category_order = sorted(self.categories, key=lambda cid: category_sort_key(self.categories[cid]))
+
+    # ------------------------------------------------------------------
+    # Incremental updates (called from signals)
+    # ------------------------------------------------------------------
+    def _record(self, method, *args):
+        """
+        Queue an update for the listing being rebuilt, if any; returns
+        whether there is a current listing to patch as well.
+        """
+        if self.pending is not None:
+            self.pending.append((method, args))
+        return self.is_built()
+
+    def _unlist(self, product_id, category_ids):
+        key = self.active_products.get(product_id)
+        if key is None:
+            return
+        for category_id in category_ids:
+            keys = self.listings.get(category_id)
+            if not keys:
+                continue
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+
+    def _list(self, product_id, category_ids):
+        key = self.active_products.get(product_id)
+        if key is None:
+            return
+        for category_id in category_ids:
+            insort(self.listings[category_id], key)
+
+    def index_product(self, product):
+        with self.lock:
+            if not self._record("index_product", product):
+                return
+            category_ids = self.product_categories.get(product.pk, set())
+            self._unlist(product.pk, category_ids)
+            self.active_products.pop(product.pk, None)
+            if product.is_active:
+                self.active_products[product.pk] = product_sort_key(product.pk, product.product_name)
+                self._list(product.pk, category_ids)
+
+    def remove_product(self, product_id):
+        with self.lock:
+            if not self._record("remove_product", product_id):
+                return
+            self._unlist(product_id, self.product_categories.pop(product_id, set()))
+            self.active_products.pop(product_id, None)
+
+    def link(self, product_id, category_ids):
+        with self.lock:
+            if not self._record("link", product_id, category_ids):
+                return
+            new_ids = set(category_ids) - self.product_categories[product_id]
+            self.product_categories[product_id] |= new_ids
+            self._list(product_id, new_ids)
+
+    def unlink(self, product_id, category_ids=None):
+        """Drop ``product_id`` from ``category_ids``, or from every category if None."""
+        with self.lock:
+            if not self._record("unlink", product_id, category_ids):
+                return
+            current = self.product_categories[product_id]
+            removed = current if category_ids is None else current & set(category_ids)
+            self._unlist(product_id, removed)
+            self.product_categories[product_id] = current - removed
+
+    def clear_category(self, category_id):
+        with self.lock:
+            if not self._record("clear_category", category_id):
+                return
+            self._clear_category(category_id)
+
+    def _clear_category(self, category_id):
+        self.listings.pop(category_id, None)
+        for category_ids in self.product_categories.values():
+            category_ids.discard(category_id)
+
+    def index_category(self, category):
+        with self.lock:
+            if not self._record("index_category", category):
+                return
+            self.categories[category.pk] = category.name
+            self._sort_categories()
+
+    def remove_category(self, category_id):
+        with self.lock:
+            if not self._record("remove_category", category_id):
+                return
+            self._clear_category(category_id)
+            self.categories.pop(category_id, None)
+            self._sort_categories()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def has_category(self, category_id):
+        self.ensure_built()
+        return category_id in self.categories
+
+    def category_name(self, category_id):
+        self.ensure_built()
+        return self.categories.get(category_id)
+
+    def product_ids(self, category_id):
+        """
+        Ids of the active products in ``category_id``, in ``product_name`` order.
+        """
+        self.ensure_built()
+        with self.lock:
+            return [product_id for _, product_id in self.listings.get(category_id, [])]
+
+    def previews(self, limit):
+        """
+        ``(category_id, name, total, first ``limit`` product ids)`` for every
+        non-empty category, in display order.
+        """
+        self.ensure_built()
+        with self.lock:
+            result = []
+            for category_id in self.category_order:
+                keys = self.listings.get(category_id)
+                if keys:
+                    result.append((
+                        category_id,
+                        self.categories[category_id],
+                        len(keys),
+                        [product_id for _, product_id in keys[:limit]],
+                    ))
+            return result
+
+
+category_listing = CategoryListing()
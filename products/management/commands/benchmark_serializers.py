@@ -0,0 +1,103 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.models import UserAuth
+from orders.fastpath import order_rows
+from orders.models import Order, OrderItem, ReturnItem
+from orders.serializers import OrderSerializer
+from products.fastpath import product_rows
+from products.models import Category, Company, GenericName, Product
+from products.sequences import next_skus
+from products.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ProductSerializer/OrderSerializer with the values() fast path on generated "
+        "products and orders. The data is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help="Number of products to generate.")
+        parser.add_argument('--orders', type=int, default=10000, help="Number of orders to generate.")
+        parser.add_argument('--lines', type=int, default=3, help="Order lines per order.")
+        parser.add_argument('--repeat', type=int, default=3, help="Best of this many runs is reported.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.generate(options['products'], options['orders'], options['lines'])
+            self.compare(
+                'products', Product.objects.order_by('pk'),
+                lambda qs: ProductSerializer(ProductSerializer.prepare_queryset(qs), many=True).data,
+                lambda qs: list(product_rows(qs)),
+                options['repeat'],
+            )
+            self.compare(
+                'orders', Order.objects.order_by('pk'),
+                lambda qs: OrderSerializer(OrderSerializer.prepare_queryset(qs), many=True).data,
+                lambda qs: list(order_rows(qs)),
+                options['repeat'],
+            )
+            transaction.set_rollback(True)
+
+    def generate(self, product_count, order_count, lines):
+        company = Company.objects.create(company_name='Benchmark Company')
+        generic = GenericName.objects.create(name='Benchmark Generic')
+        categories = [Category.objects.create(name=f'Benchmark Category {i}') for i in range(3)]
+        skus = next_skus(product_count)
+        Product.objects.bulk_create([
+            Product(
+                product_name=f'Benchmark {i}', sku=skus[i], mrp=10, selling_price=9, discount_percent=10,
+                company_id=company, generic_name=generic, product_image=f'product_images/benchmark-{i}.jpg',
+            )
+            for i in range(product_count)
+        ], batch_size=1000)
+        # bulk_create does not set the ids on MySQL; read them back.
+        product_ids = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'pk'))
+        product_ids = [product_ids[sku] for sku in skus]
+        Through = Product.category_id.through
+        Through.objects.bulk_create([
+            Through(product_id=product_id, category_id=categories[i % 3].pk)
+            for i, product_id in enumerate(product_ids)
+        ], batch_size=1000)
+
+        user = UserAuth.objects.create_user(
+            phone='01999999999', password=None, full_name='Benchmark', email='benchmark@example.com',
+        )
+        Order.objects.bulk_create([
+            Order(user_id=user, invoice_number=f'BENCH-{i}') for i in range(order_count)
+        ], batch_size=1000)
+        order_ids = list(Order.objects.filter(user_id=user).order_by('pk').values_list('pk', flat=True))
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order_id, product_id=product_ids[(i + line) % product_count], quantity=line + 1, unit_price=9)
+            for i, order_id in enumerate(order_ids) for line in range(lines)
+        ], batch_size=1000)
+        ReturnItem.objects.bulk_create([
+            ReturnItem(order_id=order_id, product_id=product_ids[i % product_count], quantity=1)
+            for i, order_id in enumerate(order_ids) if i % 5 == 0
+        ], batch_size=1000)
+
+    def compare(self, label, queryset, drf, fast, repeat):
+        drf_time, expected = self.best_of(repeat, drf, queryset)
+        fast_time, actual = self.best_of(repeat, fast, queryset)
+        same = json.dumps(expected, cls=JSONEncoder) == json.dumps(actual, cls=JSONEncoder)
+        self.stdout.write(
+            f"{label}: {len(actual)} rows, serializer {drf_time:.2f}s, values() {fast_time:.2f}s "
+            f"({drf_time / fast_time:.1f}x faster), identical output: {same}"
+        )
+        if not same:
+            self.stderr.write(f"{label}: the fast path output differs from the serializer")
+
+    @staticmethod
+    def best_of(repeat, serialize, queryset):
+        best, data = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = serialize(queryset.all())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, data
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from products.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Build the gzip catalog snapshot served to new installs (skipped when the catalog is unchanged)."
+
+    def handle(self, *args, **options):
+        pointer = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Catalog snapshot {pointer['version']} ({pointer['size'] / 1024:.1f} KiB): {pointer['name']}"
+        ))
@@ -0,0 +1,126 @@
+import os
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models.fields.files import FieldFile
+
+from products.images import VARIANT_SIZES, generate_variants, variant_name, variant_storage
+from script.storage import BLOB_ROOT, ContentAddressedStorage, is_blob_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Move legacy media files into the content-addressed blob store, point rows at the "
+        "shared blobs, delete the replaced files and garbage-collect unreferenced blobs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing.")
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help="Only collect blobs older than this many seconds (protects in-flight uploads).",
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            self.stderr.write("The default storage is not ContentAddressedStorage; nothing to do.")
+            return
+        self.dry_run = options['dry_run']
+        fields = list(self.file_fields())
+        moved = self.move_legacy_files(fields)
+        collected = self.collect_garbage(fields, options['min_age'])
+        prefix = "[dry run] " if self.dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{moved['files']} legacy files moved into {moved['blobs']} blobs "
+            f"({moved['rows']} rows updated, {moved['missing']} missing files), "
+            f"{collected['blobs']} unreferenced blobs collected, "
+            f"{(moved['bytes'] + collected['bytes']) / 1024:.1f} KiB reclaimed."
+        ))
+
+    @staticmethod
+    def file_fields():
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                    yield model, field
+
+    def move_legacy_files(self, fields):
+        storage = default_storage
+        protected = {field.default for _, field in fields if isinstance(field.default, str)}
+        renamed = {}  # legacy name -> blob name (None if the file is missing)
+        source_fields = {}  # legacy name -> a field referencing it
+        stats = {'files': 0, 'blobs': 0, 'rows': 0, 'missing': 0, 'bytes': 0}
+        blobs = set()
+
+        for model, field in fields:
+            rows = model.objects.exclude(**{field.attname: ''}).exclude(**{f'{field.attname}__isnull': True})
+            for pk, name in rows.values_list('pk', field.attname).iterator():
+                if is_blob_name(name):
+                    continue
+                if name not in renamed:
+                    if not storage.exists(name):
+                        renamed[name] = None
+                        stats['missing'] += 1
+                        self.stderr.write(f"{model.__name__} {pk}: missing file {name}")
+                        continue
+                    if self.dry_run:
+                        renamed[name] = name
+                    else:
+                        with storage.open(name, 'rb') as source:
+                            renamed[name] = storage.save(name, source)
+                    stats['files'] += 1
+                    source_fields[name] = field
+                    blobs.add(renamed[name])
+                if renamed[name] is None:
+                    continue
+                if not self.dry_run:
+                    model.objects.filter(pk=pk).update(**{field.attname: renamed[name]})
+                stats['rows'] += 1
+
+        stats['blobs'] = len(blobs) if not self.dry_run else stats['files']
+        for legacy, blob in renamed.items():
+            if blob is None or legacy in protected:
+                continue
+            stats['bytes'] += storage.size(legacy)
+            if self.dry_run:
+                continue
+            if any(variant_storage.exists(variant_name(legacy, v)) for v in VARIANT_SIZES):
+                # Keep serving variants: render them for the blob, drop the old ones.
+                generate_variants(FieldFile(None, source_fields[legacy], blob))
+                self.delete_variants(legacy)
+            storage.delete(legacy)
+        return stats
+
+    def collect_garbage(self, fields, min_age):
+        storage = default_storage
+        referenced = set()
+        for model, field in fields:
+            referenced.update(
+                model.objects.exclude(**{field.attname: ''}).values_list(field.attname, flat=True).iterator()
+            )
+
+        stats = {'blobs': 0, 'bytes': 0}
+        root = storage.path(BLOB_ROOT)
+        cutoff = time.time() - min_age
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                if name in referenced or os.path.getmtime(path) > cutoff:
+                    continue
+                stats['blobs'] += 1
+                stats['bytes'] += os.path.getsize(path)
+                if not self.dry_run:
+                    os.remove(path)
+                    self.delete_variants(name)
+        return stats
+
+    @staticmethod
+    def delete_variants(name):
+        for variant in VARIANT_SIZES:
+            variant_file = variant_name(name, variant)
+            if variant_storage.exists(variant_file):
+                variant_storage.delete(variant_file)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from products.images import generate_variants
+from products.models import BannerImages, Company, Product
+
+
+class Command(BaseCommand):
+    help = "Generate thumb/medium/large variants for product images, company logos and banners."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that already exist.")
+
+    def handle(self, *args, **options):
+        sources = [
+            (Product, 'product_image'),
+            (Company, 'logo'),
+            (BannerImages, 'image'),
+        ]
+        written = failed = 0
+        for model, field in sources:
+            images = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).only('pk', field)
+            for obj in images.iterator():
+                field_file = getattr(obj, field)
+                try:
+                    written += len(generate_variants(field_file, force=options['force']))
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {obj.pk}: {field_file.name}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"{written} variants written, {failed} images failed."))
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import DEFAULT_CHUNK_SIZE, ProductImporter
+
+
+class Command(BaseCommand):
+    help = "Create or update products from a CSV price list (see products/importer.py for the columns)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help="Path to the CSV file, or - for stdin.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows written per transaction.")
+        parser.add_argument('--errors', help="Write the rows that were skipped, with the reason, to this CSV file.")
+        parser.add_argument(
+            '--no-create', action='store_true',
+            help="Reject rows naming an unknown company, generic name or category instead of creating it.",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without writing anything.")
+
+    def handle(self, *args, **options):
+        importer = ProductImporter(
+            chunk_size=max(options['chunk_size'], 1),
+            create_missing=not options['no_create'],
+            dry_run=options['dry_run'],
+        )
+        try:
+            if options['csv_file'] == '-':
+                importer.run(sys.stdin)
+            else:
+                with open(options['csv_file'], newline='', encoding='utf-8-sig') as f:
+                    importer.run(f)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as f:
+                importer.write_error_report(f)
+        elif importer.errors:
+            for line, name, message in sorted(importer.errors):
+                self.stderr.write(f"line {line} ({name}): {message}")
+
+        prefix = "[dry run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(prefix + importer.summary()))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Tombstone
+from products.sync import tombstones_kept_since
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete catalog tombstones older than CATALOG_TOMBSTONE_DAYS. Clients that last synced before "
+        "then get a full sync, so the pruned tombstones are no longer needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many tombstones would be deleted.")
+
+    def handle(self, *args, **options):
+        expired = Tombstone.objects.filter(deleted_on__lt=tombstones_kept_since())
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} tombstones would be deleted.")
+            return
+        deleted, _ = expired.delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones."))
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product, StockMovement
+from products.stock import record_movements, stock_at
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Product.stock_quantity with the stock ledger and report the products whose stock "
+        "differs. Nothing is changed unless --apply (overwrite the counters with the ledger) or "
+        "--record-drift (record the differences in the ledger) is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help="Overwrite the counters with the ledger stock.")
+        parser.add_argument(
+            '--record-drift', action='store_true',
+            help="Record the differences as adjustments so the ledger matches the counters.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Products locked and fixed per transaction.")
+
+    def handle(self, *args, **options):
+        if options['apply'] and options['record_drift']:
+            raise CommandError("--apply and --record-drift cannot be combined.")
+        chunk_size = max(options['chunk_size'], 1)
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+
+        checked = drifted = 0
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            with transaction.atomic():
+                # Lock the counters so orders cannot move them while they are compared.
+                counters = dict(
+                    Product.objects.select_for_update().filter(pk__in=chunk).values_list('pk', 'stock_quantity')
+                )
+                ledger = stock_at(product_ids=chunk)
+                drift = {
+                    product_id: counter - ledger.get(product_id, 0)
+                    for product_id, counter in counters.items()
+                    if counter != ledger.get(product_id, 0)
+                }
+                checked += len(counters)
+                drifted += len(drift)
+                for product_id, difference in drift.items():
+                    self.stdout.write(
+                        f"Product {product_id}: counter {counters[product_id]}, "
+                        f"ledger {ledger.get(product_id, 0)} ({difference:+d})"
+                    )
+                if not drift:
+                    continue
+                if options['record_drift']:
+                    record_movements([
+                        StockMovement(
+                            product_id=product_id, kind=StockMovement.ADJUSTMENT,
+                            quantity=difference, reference='Ledger reconciliation',
+                        )
+                        for product_id, difference in drift.items()
+                    ], apply=False)
+                elif options['apply']:
+                    now = timezone.now()
+                    Product.objects.bulk_update(
+                        [
+                            Product(pk=product_id, stock_quantity=ledger.get(product_id, 0), updated_on=now)
+                            for product_id in drift
+                        ],
+                        ['stock_quantity', 'updated_on'],
+                    )
+
+        if options['apply']:
+            action = "rebuilt from the ledger"
+        elif options['record_drift']:
+            action = "reconciled into the ledger"
+        else:
+            action = "differ from the ledger (run with --apply to rebuild them)"
+        self.stdout.write(self.style.SUCCESS(f"{checked} products checked, {drifted} {action}."))
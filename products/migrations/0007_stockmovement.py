@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_sequence_tempproduct_mrp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('movement_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('sale', 'Order sale'), ('return', 'Return'), ('receipt', 'Batch receipt'), ('adjustment', 'Manual adjustment')], max_length=10)),
+                ('quantity', models.IntegerField()),
+                ('reference', models.CharField(blank=True, default='', max_length=100)),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.CharField(blank=True, max_length=100, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['created_on', 'movement_id'],
+                'indexes': [models.Index(fields=['product', 'created_on'], name='products_st_product_033d70_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('product', 'Product'), ('category', 'Category'), ('company', 'Company'), ('generic_name', 'Generic Name')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_on', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:25
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_batch_headers(apps, schema_editor):
+    """One header per existing batch_id, with its owner, status and totals."""
+    TempProduct = apps.get_model('products', 'TempProduct')
+    StockBatch = apps.get_model('products', 'StockBatch')
+    batches = TempProduct.objects.order_by().values('batch_id').annotate(
+        owner=models.Min('user_id'),
+        lines=models.Count('id'),
+        pending=models.Count('id', filter=models.Q(is_confirmed=False)),
+        total=models.Sum('total_amount'),
+        first_created=models.Min('created_on'),
+    )
+    StockBatch.objects.bulk_create([
+        StockBatch(
+            batch_id=batch['batch_id'],
+            user_id_id=batch['owner'],
+            status='open' if batch['pending'] else 'confirmed',
+            line_count=batch['lines'],
+            total_value=batch['total'] or 0,
+            created_on=batch['first_created'],
+        )
+        for batch in batches
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBatch',
+            fields=[
+                ('batch_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled')], default='open', max_length=10)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('total_value', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('confirmed_on', models.DateTimeField(blank=True, null=True)),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Batches',
+                'ordering': ['-created_on'],
+                'indexes': [models.Index(fields=['user_id', 'status'], name='products_st_user_id_5c7005_idx'), models.Index(fields=['status', '-created_on'], name='products_st_status_5bc3ff_idx'), models.Index(fields=['-created_on'], name='products_st_created_74f60f_idx')],
+            },
+        ),
+        migrations.RunPython(create_batch_headers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def open_stock_ledger(apps, schema_editor):
+    """
+    One opening adjustment per product for the stock it had before the
+    ledger existed, dated before the product's first recorded movement.
+    """
+    Product = apps.get_model('products', 'Product')
+    StockMovement = apps.get_model('products', 'StockMovement')
+    recorded = {
+        row['product_id']: row
+        for row in StockMovement.objects.order_by().values('product_id').annotate(
+            total=models.Sum('quantity'), first=models.Min('created_on'),
+        )
+    }
+    now = timezone.now()
+    openings = []
+    for product_id, stock in Product.objects.order_by('pk').values_list('pk', 'stock_quantity').iterator():
+        ledger = recorded.get(product_id)
+        total = ledger['total'] if ledger else 0
+        if stock != total:
+            openings.append(StockMovement(
+                product_id=product_id, kind='adjustment', quantity=stock - total, reference='Opening balance',
+                created_on=ledger['first'] - timedelta(microseconds=1) if ledger else now,
+            ))
+    StockMovement.objects.bulk_create(openings, batch_size=1000)
+
+
+def remove_opening_stock(apps, schema_editor):
+    StockMovement = apps.get_model('products', 'StockMovement')
+    StockMovement.objects.filter(kind='adjustment', reference='Opening balance').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_stockbatch'),
+    ]
+
+    operations = [
+        migrations.RunPython(open_stock_ledger, remove_opening_stock),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 from accounts.models import UserAuth
-import uuid
+from .sequences import next_sku
 class Company(models.Model):
     company_id = models.BigAutoField(primary_key=True)
     company_name = models.CharField(max_length=255, unique=True)
@@ -9,7 +10,7 @@ class Company(models.Model):
     is_active = models.BooleanField(default=True)
     created_on = models.DateTimeField(auto_now_add=True)
     created_by = models.CharField(max_length=100, blank=True, null=True)
-    updated_on = models.DateTimeField(auto_now=True)
+    updated_on = models.DateTimeField(auto_now=True, db_index=True)
     updated_by = models.CharField(max_length=100, blank=True, null=True)
 
     def __str__(self):
@@ -22,7 +23,7 @@ class Category(models.Model):
     description = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_on = models.DateTimeField(auto_now_add=True)
-    updated_on = models.DateTimeField(auto_now=True)
+    updated_on = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -38,7 +39,7 @@ class GenericName(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     created_on = models.DateTimeField(auto_now_add=True)
-    updated_on = models.DateTimeField(auto_now=True)
+    updated_on = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = "Generic Name"
@@ -76,7 +77,7 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     created_on = models.DateTimeField(auto_now_add=True)
     created_by = models.CharField(max_length=100, blank=True, null=True)
-    updated_on = models.DateTimeField(auto_now=True)
+    updated_on = models.DateTimeField(auto_now=True, db_index=True)  # Delta sync (products/sync.py) filters on it
     updated_by = models.CharField(max_length=100, blank=True, null=True)
 
     class Meta:
@@ -87,26 +88,87 @@ class Product(models.Model):
         return self.product_name
     
     def save(self, *args, **kwargs):
-        if not self.sku:  # Check if the SKU is empty
-            self.sku = self.generate_unique_sku()
-        super().save(*args, **kwargs)
-
-    
-
-    def save(self, *args, **kwargs):
-    # Generate SKU if not present
+        # Generate SKU if not present
         if not self.sku:
-            new_sku = str(uuid.uuid4()).split('-')[0].upper()  # Generate a short unique string
-            if not Product.objects.filter(sku=new_sku).exists():
-                self.sku = new_sku
+            self.sku = next_sku()
 
-        # Auto-calculate discount percentage
+        self.update_discount_percent()
+        super().save(*args, **kwargs)
+
+    def update_discount_percent(self):
+        """Auto-calculate the discount percentage from mrp and selling price."""
         if self.mrp and self.selling_price and self.mrp > 0:
             self.discount_percent = round(((self.mrp - self.selling_price) / self.mrp) * 100)
 
-        super().save(*args, **kwargs)
 
 
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger: one row per change of ``Product.stock_quantity``.
+    Written with ``products.stock.record_movements``, which keeps the product
+    counter in step within the same transaction.
+    """
+    SALE = 'sale'
+    RETURN = 'return'
+    RECEIPT = 'receipt'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = (
+        (SALE, 'Order sale'),
+        (RETURN, 'Return'),
+        (RECEIPT, 'Batch receipt'),
+        (ADJUSTMENT, 'Manual adjustment'),
+    )
+
+    movement_id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.IntegerField()  # Signed: positive adds stock, negative removes it
+    reference = models.CharField(max_length=100, blank=True, default='')  # Invoice number, batch id, ...
+    created_on = models.DateTimeField(default=timezone.now)
+    created_by = models.CharField(max_length=100, blank=True, null=True)
+
+    class Meta:
+        verbose_name_plural = "Stock Movements"
+        ordering = ['created_on', 'movement_id']
+        indexes = [models.Index(fields=['product', 'created_on'])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} x {self.product_id}"
+
+
+class Tombstone(models.Model):
+    """
+    Deleted catalog row, kept so the sync endpoint can tell clients to drop it.
+    """
+    PRODUCT = 'product'
+    CATEGORY = 'category'
+    COMPANY = 'company'
+    GENERIC_NAME = 'generic_name'
+    MODEL_CHOICES = (
+        (PRODUCT, 'Product'),
+        (CATEGORY, 'Category'),
+        (COMPANY, 'Company'),
+        (GENERIC_NAME, 'Generic Name'),
+    )
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_on = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.object_id}"
+
+
+class Sequence(models.Model):
+    """
+    Next free value of a named counter; see ``products/sequences.py``.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
 
 class BannerImages(models.Model):
     banner_id = models.AutoField(primary_key=True)
@@ -118,6 +180,44 @@ class BannerImages(models.Model):
         return str(self.name)
 
 
+class StockBatch(models.Model):
+    """
+    Header of a stock receipt batch: one row per ``batch_id`` of the staged
+    ``TempProduct`` lines, with the line count and total value kept up to
+    date by ``products/batches.py`` as lines are staged, confirmed or
+    cancelled.
+    """
+    OPEN = 'open'
+    CONFIRMED = 'confirmed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = (
+        (OPEN, 'Open'),
+        (CONFIRMED, 'Confirmed'),
+        (CANCELLED, 'Cancelled'),
+    )
+
+    batch_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_id = models.ForeignKey(UserAuth, on_delete=models.CASCADE, related_name='stock_batches')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+    line_count = models.PositiveIntegerField(default=0)
+    total_value = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    created_on = models.DateTimeField(default=timezone.now)
+    updated_on = models.DateTimeField(auto_now=True)
+    confirmed_on = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name_plural = "Stock Batches"
+        ordering = ['-created_on']
+        indexes = [
+            models.Index(fields=['user_id', 'status']),
+            models.Index(fields=['status', '-created_on']),
+            models.Index(fields=['-created_on']),
+        ]
+
+    def __str__(self):
+        return str(self.batch_id)
+
+
 class TempProduct(models.Model):
     batch_id = models.UUIDField(editable=False, db_index=True)
     user_id = models.ForeignKey(UserAuth, on_delete=models.CASCADE)  # Track which admin is editing
@@ -138,7 +238,10 @@ class TempProduct(models.Model):
         ordering = ['product_id']
 
     def save(self, *args, **kwargs):
-        # Auto-calculate total cost
+        self.update_total_amount()
+        super().save(*args, **kwargs)
+
+    def update_total_amount(self):
+        """Auto-calculate the total cost of the line."""
         if self.new_cost_price and self.new_stock_quantity > 0:
-            self.total_amount = self.new_cost_price * self.new_stock_quantity
-        super().save(*args, **kwargs)
\ No newline at end of file
+            self.total_amount = self.new_cost_price * self.new_stock_quantity
\ No newline at end of file
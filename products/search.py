@@ -0,0 +1,623 @@
+"""
+In-process n-gram search index for the product catalog.
+
+Every worker keeps a trigram inverted index over ``Product.product_name``,
+``GenericName.name`` and ``Company.company_name`` so the search endpoints
+can answer substring queries without running ``icontains`` table scans
+(queries shorter than a trigram use postings of their own length),
+sorted prefix arrays over product and generic names for typeahead, and
+BK-trees over the same names for typo-tolerant matching.
+The index is built lazily on first use, patched from model signals (see
+``products/signals.py``) and fully rebuilt every
+``PRODUCT_SEARCH_INDEX_TTL`` seconds to pick up writes made by other
+workers or by ``bulk_create``/``update`` calls that bypass signals. Rebuilds
+read the database into a new index while searches keep using the current
+one; signal updates arriving meanwhile are replayed onto the new index
+before it is swapped in.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+
+
+NGRAM_SIZE = 3
+
+
+def normalize(text):
+    return " ".join((text or "").casefold().split())
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def short_grams(text, n=NGRAM_SIZE):
+    """Every substring of ``text`` shorter than ``n``."""
+    return {gram for size in range(1, n) for gram in ngrams(text, size)}
+
+
+class NgramIndex:
+    """
+    Inverted index of n-grams to document ids for a single text column.
+    """
+
+    def __init__(self, n=NGRAM_SIZE):
+        self.n = n
+        self.docs = {}  # doc_id -> normalized text
+        self.names = {}  # doc_id -> original text
+        self.postings = defaultdict(set)  # ngram -> {doc_id}
+        self.short_postings = defaultdict(set)  # substring shorter than n -> {doc_id}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id, text):
+        self.remove(doc_id)
+        self.names[doc_id] = text
+        text = normalize(text)
+        self.docs[doc_id] = text
+        for gram in ngrams(text, self.n):
+            self.postings[gram].add(doc_id)
+        for gram in short_grams(text, self.n):
+            self.short_postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        text = self.docs.pop(doc_id, None)
+        if text is None:
+            return
+        self.names.pop(doc_id, None)
+        for postings, grams in ((self.postings, ngrams(text, self.n)), (self.short_postings, short_grams(text, self.n))):
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is not None:
+                    posting.discard(doc_id)
+                    if not posting:
+                        del postings[gram]
+
+    def candidates(self, query):
+        """
+        Ids whose text may contain ``query``; every candidate still has to be
+        verified because n-gram overlap does not imply adjacency.
+        """
+        if len(query) < self.n:
+            # Shorter than one n-gram: the docs containing it exactly.
+            return self.short_postings.get(query, set())
+        grams = ngrams(query, self.n)
+        postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def rank(self, doc_id, query):
+        """
+        Sort key for a matching document: exact match, then prefix match,
+        then word-prefix match, then plain substring; ties break on the text.
+        """
+        text = self.docs[doc_id]
+        if text == query:
+            tier = 0
+        elif text.startswith(query):
+            tier = 1
+        elif (" " + query) in text:
+            tier = 2
+        else:
+            tier = 3
+        return (tier, text, doc_id)
+
+    def search(self, query, prefix_only=False):
+        """
+        Return ids whose text contains ``query`` (case-insensitive), best first.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        if prefix_only:
+            matches = [d for d in self.candidates(query) if self.docs[d].startswith(query)]
+        else:
+            matches = [d for d in self.candidates(query) if query in self.docs[d]]
+        return sorted(matches, key=lambda d: self.rank(d, query))
+
+
+class PrefixIndex:
+    """
+    Sorted array of ``(normalized name, id)`` pairs answering top-k prefix
+    completions with ``bisect`` in O(log n + k).
+    """
+
+    def __init__(self):
+        self.keys = []  # sorted [(normalized, doc_id)]
+        self.docs = {}  # doc_id -> (normalized, display name)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def load(self, items):
+        """Bulk load ``(doc_id, name)`` pairs, replacing the current contents."""
+        self.docs = {doc_id: (normalize(name), name) for doc_id, name in items}
+        self.keys = sorted((key, doc_id) for doc_id, (key, _) in self.docs.items())
+
+    def add(self, doc_id, name):
+        self.remove(doc_id)
+        key = normalize(name)
+        self.docs[doc_id] = (key, name)
+        insort(self.keys, (key, doc_id))
+
+    def remove(self, doc_id):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        i = bisect_left(self.keys, (entry[0], doc_id))
+        if i < len(self.keys) and self.keys[i] == (entry[0], doc_id):
+            del self.keys[i]
+
+    def complete(self, prefix, limit=10):
+        """
+        Return up to ``limit`` ``(doc_id, name)`` pairs whose name starts with
+        ``prefix``, alphabetically, skipping duplicate names.
+        """
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+        results, seen = [], set()
+        i = bisect_left(self.keys, (prefix,))
+        while i < len(self.keys) and len(results) < limit:
+            key, doc_id = self.keys[i]
+            if not key.startswith(prefix):
+                break
+            if key not in seen:
+                seen.add(key)
+                results.append((doc_id, self.docs[doc_id][1]))
+            i += 1
+        return results
+
+
+def compile_pattern(text):
+    """Precompute the per-character bitmasks used by :func:`pattern_distance`."""
+    masks = {}
+    for i, char in enumerate(text):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks, len(text)
+
+
+def pattern_distance(pattern, text):
+    """
+    Levenshtein distance between a compiled pattern and ``text`` using
+    Myers' bit-parallel algorithm: one pass over ``text``, a handful of
+    integer operations per character.
+    """
+    masks, m = pattern
+    if m == 0:
+        return len(text)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    for char in text:
+        eq = masks.get(char, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+
+def edit_distance(a, b):
+    return pattern_distance(compile_pattern(a), b)
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of terms under edit distance. Each node carries the
+    ids of the documents containing its term; removing a document only empties
+    that set, the node itself stays until the next rebuild.
+    """
+
+    def __init__(self):
+        self.root = None  # [term, {doc_id}, {distance: child}]
+
+    def add(self, term, doc_id):
+        if self.root is None:
+            self.root = [term, {doc_id}, {}]
+            return
+        pattern = compile_pattern(term)
+        node = self.root
+        while True:
+            distance = pattern_distance(pattern, node[0])
+            if distance == 0:
+                node[1].add(doc_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [term, {doc_id}, {}]
+                return
+            node = child
+
+    def discard(self, term, doc_id):
+        pattern = compile_pattern(term)
+        node = self.root
+        while node is not None:
+            distance = pattern_distance(pattern, node[0])
+            if distance == 0:
+                node[1].discard(doc_id)
+                return
+            node = node[2].get(distance)
+
+    def search(self, term, max_distance):
+        """Yield ``(distance, doc_ids)`` for every term within ``max_distance``."""
+        if self.root is None:
+            return
+        pattern = compile_pattern(term)
+        stack = [self.root]
+        while stack:
+            node_term, doc_ids, children = stack.pop()
+            distance = pattern_distance(pattern, node_term)
+            if distance <= max_distance and doc_ids:
+                yield distance, doc_ids
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in children.items() if low <= d <= high)
+
+
+class FuzzyIndex:
+    """
+    Typo-tolerant lookup over one name column: every name is indexed as a
+    whole and word by word, so "paracetmol" finds "Paracetamol 500mg".
+    """
+    MIN_WORD_LENGTH = 3
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.terms = {}  # doc_id -> {term}
+
+    def _terms(self, text):
+        text = normalize(text)
+        terms = {word for word in text.split() if len(word) >= self.MIN_WORD_LENGTH}
+        if text:
+            terms.add(text)
+        return terms
+
+    def add(self, doc_id, text):
+        self.remove(doc_id)
+        terms = self._terms(text)
+        self.terms[doc_id] = terms
+        for term in terms:
+            self.tree.add(term, doc_id)
+
+    def remove(self, doc_id):
+        for term in self.terms.pop(doc_id, ()):
+            self.tree.discard(term, doc_id)
+
+    def search(self, query, max_distance):
+        """
+        Return ``{doc_id: distance}`` for documents with a term within
+        ``max_distance`` edits of ``query``.
+        """
+        query = normalize(query)
+        if not query:
+            return {}
+        best = {}
+        for distance, doc_ids in self.tree.search(query, max_distance):
+            for doc_id in doc_ids:
+                if distance < best.get(doc_id, max_distance + 1):
+                    best[doc_id] = distance
+        return best
+
+
+def default_max_distance(query):
+    """Edit budget scaled to the query: short drug names tolerate fewer typos."""
+    length = len(normalize(query))
+    if length <= 3:
+        return 0
+    if length <= 5:
+        return 1
+    return 2
+
+
+class CatalogSearchEngine:
+    """
+    Search indexes for products, generic names and companies, plus the
+    product -> company/generic mapping needed to resolve parent matches to
+    product ids without going back to the database.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()  # one rebuild at a time
+        self.built_at = None
+        self.pending = None  # [(method, args)] of updates made while a rebuild reads the database
+        self._reset()
+
+    def _reset(self):
+        self.products = NgramIndex()
+        self.generics = NgramIndex()
+        self.companies = NgramIndex()
+        self.product_prefixes = PrefixIndex()
+        self.generic_prefixes = PrefixIndex()
+        # BK-trees are the most expensive structure to build, so they are
+        # filled on the first fuzzy search rather than on every rebuild.
+        self.product_fuzzy = None
+        self.generic_fuzzy = None
+        self.active_products = set()
+        self.product_company = {}
+        self.product_generic = {}
+        self.company_products = defaultdict(set)
+        self.generic_products = defaultdict(set)
+
+    @property
+    def ttl(self):
+        return getattr(settings, "PRODUCT_SEARCH_INDEX_TTL", 300)
+
+    def is_built(self):
+        return self.built_at is not None
+
+    def ensure_built(self):
+        if self.built_at is None:
+            with self.build_lock:
+                if self.built_at is None:
+                    self._rebuild()
+        elif time.monotonic() - self.built_at > self.ttl and self.build_lock.acquire(blocking=False):
+            # Stale: refresh it, unless another thread already is (searches
+            # use the current index meanwhile).
+            try:
+                self._rebuild()
+            finally:
+                self.build_lock.release()
+
+    def rebuild(self):
+        with self.build_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        with self.lock:
+            self.pending = []
+        try:
+            staged = CatalogSearchEngine()
+            staged._load()
+        finally:
+            with self.lock:
+                pending, self.pending = self.pending, None
+        with self.lock:
+            staged.built_at = time.monotonic()
+            for method, args in pending:
+                getattr(staged, method)(*args)
+            vars(self).update(
+                (name, value) for name, value in vars(staged).items()
+                if name not in ("lock", "build_lock", "pending")
+            )
+
+    def _load(self):
+        from .models import Company, GenericName, Product
+
+        for company_id, name in Company.objects.values_list("company_id", "company_name").iterator():
+            self.companies.add(company_id, name)
+        for generic_id, name in GenericName.objects.values_list("generic_id", "name").iterator():
+            self.generics.add(generic_id, name)
+        self.generic_prefixes.load(self.generic_names())
+        rows = Product.objects.values_list(
+            "product_id", "product_name", "company_id", "generic_name", "is_active"
+        ).iterator(chunk_size=2000)
+        for product_id, name, company_id, generic_id, is_active in rows:
+            self._add_product(product_id, name, company_id, generic_id, is_active, patch_prefixes=False)
+        self.product_prefixes.load(
+            (pid, self.products.names[pid]) for pid in self.active_products
+        )
+
+    # ------------------------------------------------------------------
+    # Incremental updates (called from signals)
+    # ------------------------------------------------------------------
+    def _record(self, method, *args):
+        """
+        Queue an update for the index being rebuilt, if any; returns whether
+        there is a current index to patch as well.
+        """
+        if self.pending is not None:
+            self.pending.append((method, args))
+        return self.is_built()
+
+    def _add_product(self, product_id, name, company_id, generic_id, is_active, patch_prefixes=True):
+        self.products.add(product_id, name)
+        if self.product_fuzzy is not None:
+            self.product_fuzzy.add(product_id, name)
+        if is_active:
+            self.active_products.add(product_id)
+            if patch_prefixes:
+                self.product_prefixes.add(product_id, name)
+        else:
+            self.active_products.discard(product_id)
+        self.product_company[product_id] = company_id
+        self.product_generic[product_id] = generic_id
+        if company_id is not None:
+            self.company_products[company_id].add(product_id)
+        if generic_id is not None:
+            self.generic_products[generic_id].add(product_id)
+
+    def index_product(self, product):
+        with self.lock:
+            if not self._record("index_product", product):
+                return
+            self._remove_product(product.pk)
+            self._add_product(
+                product.pk, product.product_name, product.company_id_id,
+                product.generic_name_id, product.is_active,
+            )
+
+    def _remove_product(self, product_id):
+        self.products.remove(product_id)
+        if self.product_fuzzy is not None:
+            self.product_fuzzy.remove(product_id)
+        self.product_prefixes.remove(product_id)
+        self.active_products.discard(product_id)
+        company_id = self.product_company.pop(product_id, None)
+        if company_id is not None:
+            self.company_products[company_id].discard(product_id)
+        generic_id = self.product_generic.pop(product_id, None)
+        if generic_id is not None:
+            self.generic_products[generic_id].discard(product_id)
+
+    def remove_product(self, product_id):
+        with self.lock:
+            if not self._record("remove_product", product_id):
+                return
+            self._remove_product(product_id)
+
+    def index_company(self, company):
+        with self.lock:
+            if not self._record("index_company", company):
+                return
+            self.companies.add(company.pk, company.company_name)
+
+    def remove_company(self, company_id):
+        with self.lock:
+            if not self._record("remove_company", company_id):
+                return
+            self.companies.remove(company_id)
+            # Products fall back to company_id=NULL (on_delete=SET_NULL).
+            for product_id in self.company_products.pop(company_id, set()):
+                self.product_company[product_id] = None
+
+    def index_generic(self, generic):
+        with self.lock:
+            if not self._record("index_generic", generic):
+                return
+            self.generics.add(generic.pk, generic.name)
+            self.generic_prefixes.add(generic.pk, generic.name)
+            if self.generic_fuzzy is not None:
+                self.generic_fuzzy.add(generic.pk, generic.name)
+
+    def remove_generic(self, generic_id):
+        with self.lock:
+            if not self._record("remove_generic", generic_id):
+                return
+            self.generics.remove(generic_id)
+            self.generic_prefixes.remove(generic_id)
+            if self.generic_fuzzy is not None:
+                self.generic_fuzzy.remove(generic_id)
+            for product_id in self.generic_products.pop(generic_id, set()):
+                self.product_generic[product_id] = None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def search_products(self, query, active_only=True, prefix_only=False):
+        """
+        Ranked product ids whose name contains ``query``.
+        """
+        self.ensure_built()
+        with self.lock:
+            ids = self.products.search(query, prefix_only=prefix_only)
+            if active_only:
+                ids = [pid for pid in ids if pid in self.active_products]
+            return ids
+
+    def fuzzy_search_products(self, query, max_distance=None, active_only=True):
+        """
+        Product ids whose name, or whose generic name, is within
+        ``max_distance`` edits of ``query``; nearest first, then by name.
+        """
+        if max_distance is None:
+            max_distance = default_max_distance(query)
+        self.ensure_built()
+        with self.lock:
+            if self.product_fuzzy is None:
+                self.product_fuzzy = FuzzyIndex()
+                for product_id, name in self.products.names.items():
+                    self.product_fuzzy.add(product_id, name)
+                self.generic_fuzzy = FuzzyIndex()
+                for generic_id, name in self.generics.names.items():
+                    self.generic_fuzzy.add(generic_id, name)
+            distances = self.product_fuzzy.search(query, max_distance)
+            for generic_id, distance in self.generic_fuzzy.search(query, max_distance).items():
+                for product_id in self.generic_products.get(generic_id, ()):
+                    if distance < distances.get(product_id, max_distance + 1):
+                        distances[product_id] = distance
+            ids = distances
+            if active_only:
+                ids = [pid for pid in distances if pid in self.active_products]
+            return sorted(ids, key=lambda pid: (distances[pid], self.products.docs.get(pid, ""), pid))
+
+    def search_companies(self, names):
+        """
+        Ids of companies whose name contains any of ``names``.
+        """
+        self.ensure_built()
+        with self.lock:
+            return _union_in_order(self.companies.search(name) for name in names)
+
+    def search_generics(self, names):
+        """
+        Ids of generic names that contain any of ``names``.
+        """
+        self.ensure_built()
+        with self.lock:
+            return _union_in_order(self.generics.search(name) for name in names)
+
+    def complete_products(self, prefix, limit=10):
+        """
+        Top ``limit`` active product names starting with ``prefix``.
+        """
+        self.ensure_built()
+        with self.lock:
+            return self.product_prefixes.complete(prefix, limit)
+
+    def complete_generics(self, prefix, limit=10):
+        """
+        Top ``limit`` generic names starting with ``prefix``.
+        """
+        self.ensure_built()
+        with self.lock:
+            return self.generic_prefixes.complete(prefix, limit)
+
+    def generic_names(self):
+        return ((gid, self.generics.names[gid]) for gid in self.generics.docs)
+
+    def products_for_companies(self, company_ids, active_only=True):
+        return self._children(self.company_products, company_ids, active_only)
+
+    def products_for_generics(self, generic_ids, active_only=True):
+        return self._children(self.generic_products, generic_ids, active_only)
+
+    def _children(self, mapping, parent_ids, active_only):
+        with self.lock:
+            ids = set()
+            for parent_id in parent_ids:
+                ids |= mapping.get(parent_id, set())
+            if active_only:
+                ids &= self.active_products
+            # Match the Product default ordering (product_name).
+            return sorted(ids, key=lambda pid: (self.products.docs.get(pid, ""), pid))
+
+
+def _union_in_order(id_lists):
+    seen = {}
+    for ids in id_lists:
+        for doc_id in ids:
+            seen.setdefault(doc_id, None)
+    return list(seen)
+
+
+def products_in_order(product_ids, queryset=None):
+    """
+    Fetch ``product_ids`` in one query and return them in the given order.
+    """
+    from .models import Product
+    from .serializers import ProductSerializer
+
+    if queryset is None:
+        queryset = Product.objects.all()
+    by_id = ProductSerializer.prepare_queryset(queryset).in_bulk(list(product_ids))
+    return [by_id[pid] for pid in product_ids if pid in by_id]
+
+
+search_engine = CatalogSearchEngine()
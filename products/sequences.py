@@ -0,0 +1,149 @@
+"""
+Block sequence allocator for invoice numbers and SKUs.
+
+Each worker reserves a block of numbers from the ``Sequence`` table with a
+single ``UPDATE ... SET next_value = next_value + n`` (the row lock makes the
+reservation atomic across workers) and hands them out from memory, so
+generating a number costs no query for most inserts and never needs an
+``exists()`` retry loop. Numbers are increasing per worker; numbers left in a
+block when a worker exits are skipped, so sequences may have gaps.
+
+A block reserved inside a transaction is only shared with other threads once
+that transaction commits: if it rolls back, the reservation is rolled back
+with it and the block is dropped instead of being handed out twice.
+"""
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+DEFAULT_BLOCK_SIZE = 50
+
+
+class SequenceAllocator:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.blocks = {}  # name -> [[next, end), ...] committed blocks, lowest first
+        self.local = threading.local()  # pending: name -> (block, publish callback)
+
+    @property
+    def block_size(self):
+        return getattr(settings, 'SEQUENCE_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+
+    def next_value(self, name):
+        return self.next_values(name, 1)[0]
+
+    def next_values(self, name, count):
+        """
+        ``count`` increasing, never reused values of the sequence ``name``.
+        """
+        values = []
+        with self.lock:
+            blocks = self.blocks.get(name, [])
+            while blocks and len(values) < count:
+                values += self._take(blocks[0], count - len(values))
+                if blocks[0][0] >= blocks[0][1]:
+                    blocks.pop(0)
+        pending = self._pending(name)
+        if pending is not None and len(values) < count:
+            values += self._take(pending[0], count - len(values))
+        if len(values) < count:
+            missing = count - len(values)
+            start = self.reserve(name, max(self.block_size, missing))
+            block = [start, start + max(self.block_size, missing)]
+            values += self._take(block, missing)
+            if block[0] < block[1]:
+                self._keep(name, block)
+        return values
+
+    @staticmethod
+    def _take(block, count):
+        start = block[0]
+        block[0] = min(block[0] + count, block[1])
+        return list(range(start, block[0]))
+
+    def _keep(self, name, block):
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            self._publish(name, block)
+            return
+        # Keep the rest of the block to this thread until the reservation commits.
+        publish = partial(self._publish, name, block)
+        self._pending_blocks()[name] = (block, publish)
+        transaction.on_commit(publish)
+
+    def _publish(self, name, block):
+        pending = self._pending_blocks()
+        if name in pending and pending[name][0] is block:
+            del pending[name]
+        if block[0] < block[1]:
+            with self.lock:
+                blocks = self.blocks.setdefault(name, [])
+                blocks.append(block)
+                blocks.sort()
+
+    def _pending_blocks(self):
+        if not hasattr(self.local, 'pending'):
+            self.local.pending = {}
+        return self.local.pending
+
+    def _pending(self, name):
+        pending = self._pending_blocks().get(name)
+        if pending is None:
+            return None
+        # The on_commit callback disappears when its transaction (or savepoint)
+        # rolls back; the reservation went with it, so the block is invalid.
+        connection = transaction.get_connection()
+        if any(func is pending[1] for _, func, _ in connection.run_on_commit):
+            return pending
+        del self._pending_blocks()[name]
+        return None
+
+    @staticmethod
+    def reserve(name, size):
+        """
+        Reserve ``size`` values of ``name`` in the database; returns the first.
+        """
+        from .models import Sequence
+
+        with transaction.atomic():
+            updated = Sequence.objects.filter(name=name).update(next_value=F('next_value') + size)
+            if not updated:
+                Sequence.objects.get_or_create(name=name)
+                Sequence.objects.filter(name=name).update(next_value=F('next_value') + size)
+            return Sequence.objects.filter(name=name).values_list('next_value', flat=True).get() - size
+
+    def reset(self):
+        """Forget every cached block (used by tests)."""
+        with self.lock:
+            self.blocks.clear()
+        self._pending_blocks().clear()
+
+
+sequences = SequenceAllocator()
+
+
+def next_invoice_number(date=None):
+    """
+    ``INV-YYYYMMDD-NNNNN``, numbered per day. Five digits keep these distinct
+    from the older four-digit random invoice numbers.
+    """
+    date = date or timezone.localdate()
+    return f"INV-{date:%Y%m%d}-{sequences.next_value(f'invoice-{date:%Y%m%d}'):05d}"
+
+
+def next_skus(count):
+    """
+    ``count`` new SKUs. The ``P`` prefix keeps them distinct from the older
+    random hexadecimal SKUs.
+    """
+    return [f"P{value:07d}" for value in sequences.next_values('sku', count)]
+
+
+def next_sku():
+    return next_skus(1)[0]
@@ -1,7 +1,11 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import *
+from .images import variant_urls
+from .stock import record_movements, save_without_stock, set_stock
+from script.serializers import SparseFieldsetMixin, requested
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     generic_name = serializers.PrimaryKeyRelatedField(
         queryset=GenericName.objects.all()
     )
@@ -11,36 +15,86 @@ class ProductSerializer(serializers.ModelSerializer):
     discount_percent = serializers.FloatField()
     category_name = serializers.SerializerMethodField()
     company_name = serializers.ReadOnlyField(source='company_id.company_name')
+    product_image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
-            'product_id', 'product_name','generic_name', 'product_description', 'product_image',
+            'product_id', 'product_name','generic_name', 'product_description', 'product_image', 'product_image_variants',
             'sku','quantity_per_box', 'company_id','company_name', 'category_id', 'category_name', 'stock_quantity','cost_price',
             'mrp','selling_price', 'discount_percent', 'out_of_stock', 'is_active', 'created_on', 'updated_on'
         ]
 
 
+    @staticmethod
+    def prepare_queryset(queryset, fields=None):
+        """
+        Eager-load the relations this serializer reads so serializing N
+        products costs a constant number of queries. With a sparse
+        ``fields`` selection only the relations those fields read are loaded.
+        """
+        if requested(fields, 'company_name'):
+            queryset = queryset.select_related('company_id')
+        if requested(fields, 'generic_name'):
+            queryset = queryset.select_related('generic_name')
+        if requested(fields, 'category_id', 'category_name'):
+            queryset = queryset.prefetch_related('category_id')
+        return queryset
+
     def discount_percent(self, obj):
         return obj.discountPercentage()
 
+    def get_product_image_variants(self, obj):
+        return variant_urls(obj.product_image, self.context.get('request'))
+
     def get_category_name(self, obj):
         """
         Returns a list of category names associated with the product.
         """
         return [category.name for category in obj.category_id.all()]
-        
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            product = super().create(validated_data)
+            # Opening stock goes into the ledger; the row already holds it
+            record_movements([StockMovement(
+                product=product, kind=StockMovement.ADJUSTMENT,
+                quantity=product.stock_quantity, reference='Opening stock',
+            )], apply=False)
+        return product
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            if 'stock_quantity' in validated_data:
+                set_stock(instance, validated_data.pop('stock_quantity'), reference='Product update')
+            many_to_many = {
+                name: validated_data.pop(name) for name in list(validated_data)
+                if instance._meta.get_field(name).many_to_many
+            }
+            for name, value in validated_data.items():
+                setattr(instance, name, value)
+            # Stock only changes through the ledger (set_stock above)
+            save_without_stock(instance)
+            for name, value in many_to_many.items():
+                getattr(instance, name).set(value)
+        return instance
+
     def to_representation(self, instance):
         """Show generic_name as its `name` instead of ID"""
         rep = super().to_representation(instance)
-        if instance.generic_name:
+        if 'generic_name' in rep and instance.generic_name:
             rep['generic_name'] = instance.generic_name.name  # ✅ use GenericName.name
         return rep
     
 class CompanySerializer(serializers.ModelSerializer):
+    logo_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Product.company_id.field.related_model
-        fields = ['company_id', 'company_name', 'logo','is_active', 'created_on', 'updated_on']
+        fields = ['company_id', 'company_name', 'logo', 'logo_variants', 'is_active', 'created_on', 'updated_on']
+
+    def get_logo_variants(self, obj):
+        return variant_urls(obj.logo, self.context.get('request'))
 
 class ProductNameSerializer(serializers.ModelSerializer):
     class Meta:
@@ -62,10 +116,35 @@ class ProductNameListSerializer(serializers.ModelSerializer):
         model = GenericName
         fields = ['name']  # only include name
 class BannerImageSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = BannerImages
         fields = '__all__'
 
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image, self.context.get('request'))
+
+
+
+class StockBatchSerializer(serializers.ModelSerializer):
+    owner_name = serializers.ReadOnlyField(source='user_id.full_name')
+
+    class Meta:
+        model = StockBatch
+        fields = [
+            'batch_id', 'user_id', 'owner_name', 'status', 'line_count', 'total_value',
+            'created_on', 'updated_on', 'confirmed_on',
+        ]
+
+
+class StagedLineSerializer(serializers.Serializer):
+    """One line of a multi-line ``AddProductToBatch`` request."""
+    product_id = serializers.IntegerField()
+    new_stock_quantity = serializers.IntegerField(min_value=0, default=0)
+    new_cost_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
+    mrp = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
+    new_selling_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
 
 
 class GetTempProductBatchSerializer(serializers.ModelSerializer):
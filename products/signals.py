@@ -0,0 +1,158 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .images import schedule_variants
+from .listing import category_listing
+from .models import BannerImages, Category, Company, GenericName, Product, Tombstone
+from .search import search_engine
+from .snapshot import STOCK_FIELDS, schedule_snapshot
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search_engine.index_product(instance)
+    category_listing.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search_engine.remove_product(instance.pk)
+    category_listing.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Company)
+def index_company(sender, instance, **kwargs):
+    search_engine.index_company(instance)
+
+
+@receiver(post_delete, sender=Company)
+def unindex_company(sender, instance, **kwargs):
+    search_engine.remove_company(instance.pk)
+
+
+@receiver(post_save, sender=GenericName)
+def index_generic(sender, instance, **kwargs):
+    search_engine.index_generic(instance)
+
+
+@receiver(post_delete, sender=GenericName)
+def unindex_generic(sender, instance, **kwargs):
+    search_engine.remove_generic(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, **kwargs):
+    category_listing.index_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    category_listing.remove_category(instance.pk)
+
+
+def touch_products(products):
+    """Bump ``updated_on`` of products whose payload changed without a save()."""
+    products.update(updated_on=timezone.now())
+
+
+@receiver(m2m_changed, sender=Product.category_id.through)
+def touch_linked_products(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove') and pk_set:
+        product_ids = pk_set if reverse else [instance.pk]
+        touch_products(Product.objects.filter(pk__in=product_ids))
+    elif action == 'pre_clear':
+        touch_products(instance.products.all() if reverse else Product.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_delete, sender=Category)
+def touch_category_products(sender, instance, **kwargs):
+    touch_products(instance.products.all())
+
+
+@receiver(pre_delete, sender=Company)
+def touch_company_products(sender, instance, **kwargs):
+    touch_products(Product.objects.filter(company_id=instance))
+
+
+@receiver(pre_delete, sender=GenericName)
+def touch_generic_products(sender, instance, **kwargs):
+    touch_products(Product.objects.filter(generic_name=instance))
+
+
+TOMBSTONE_MODELS = {
+    Product: Tombstone.PRODUCT,
+    Category: Tombstone.CATEGORY,
+    Company: Tombstone.COMPANY,
+    GenericName: Tombstone.GENERIC_NAME,
+}
+
+
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(model=TOMBSTONE_MODELS[sender], object_id=instance.pk)
+
+
+for model in TOMBSTONE_MODELS:
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'tombstone_{model.__name__}')
+
+
+def catalog_changed(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= STOCK_FIELDS:
+        return  # stock reaches clients through the delta sync
+    schedule_snapshot()
+
+
+for model in (Product, Category, Company, GenericName):
+    post_save.connect(catalog_changed, sender=model, dispatch_uid=f'snapshot_save_{model.__name__}')
+    post_delete.connect(catalog_changed, sender=model, dispatch_uid=f'snapshot_delete_{model.__name__}')
+m2m_changed.connect(catalog_changed, sender=Product.category_id.through, dispatch_uid='snapshot_categories')
+
+
+@receiver(m2m_changed, sender=Product.category_id.through)
+def sync_category_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # product.category_id.add/remove/clear(...)
+        if action == 'post_add':
+            category_listing.link(instance.pk, pk_set)
+        elif action == 'post_remove':
+            category_listing.unlink(instance.pk, pk_set)
+        elif action == 'post_clear':
+            category_listing.unlink(instance.pk)
+    else:
+        # category.products.add/remove/clear(...)
+        if action == 'post_add':
+            for product_id in pk_set:
+                category_listing.link(product_id, [instance.pk])
+        elif action == 'post_remove':
+            for product_id in pk_set:
+                category_listing.unlink(product_id, [instance.pk])
+        elif action == 'post_clear':
+            category_listing.clear_category(instance.pk)
+
+
+IMAGE_FIELDS = {
+    Product: 'product_image',
+    Company: 'logo',
+    BannerImages: 'image',
+}
+
+
+def remember_image(sender, instance, **kwargs):
+    # The raw column value; absent (None) when the field was deferred
+    value = instance.__dict__.get(IMAGE_FIELDS[sender])
+    instance._stored_image = getattr(value, 'name', value)
+
+
+def image_variants(sender, instance, created, update_fields=None, **kwargs):
+    field_name = IMAGE_FIELDS[sender]
+    if update_fields is not None and field_name not in update_fields:
+        return
+    field_file = getattr(instance, field_name)
+    if created or field_file.name != getattr(instance, '_stored_image', None):
+        schedule_variants(field_file)
+    instance._stored_image = field_file.name
+
+
+for model in IMAGE_FIELDS:
+    post_init.connect(remember_image, sender=model, dispatch_uid=f'stored_image_{model.__name__}')
+    post_save.connect(image_variants, sender=model, dispatch_uid=f'image_variants_{model.__name__}')
@@ -0,0 +1,205 @@
+"""
+Prebuilt, gzip-compressed catalog snapshot for first installs and offline mode.
+
+The snapshot is the full-catalog payload of the delta sync (active products,
+categories, companies and generic names plus the sync ``cursor``) written once
+to ``MEDIA_ROOT/catalog/catalog-<version>.json.gz``, where ``version`` is the
+SHA-256 of the catalog data. ``catalog/latest.json`` points at the current
+file; the API serves it with the version as a strong ETag, so unchanged
+catalogs cost clients a 304 and new installs never run ``ProductSerializer``
+over the whole catalog.
+
+Stock moves with every order, so it is left out of the version (with the
+``updated_on`` it bumps) and stock changes do not schedule a rebuild: a
+rebuild that only finds new stock keeps the current file, whose stock is as
+of its ``cursor``, and clients get later stock from the delta sync they run
+from that cursor. Otherwise the ETag would change with nearly every rebuild.
+
+Catalog changes schedule a rebuild on commit; changes arriving within
+``CATALOG_SNAPSHOT_DELAY`` seconds (default 60) of the first one are
+coalesced into a single rebuild, which runs in a background timer unless
+``CATALOG_SNAPSHOT_ASYNC`` is False. A rebuild that produces the same data
+keeps the current file. ``manage.py build_catalog_snapshot`` rebuilds it on
+demand (run it on deploy); until a snapshot exists the API answers 503 and
+starts a build in the background rather than building it in the request.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ROOT = 'catalog'
+POINTER_NAME = posixpath.join(SNAPSHOT_ROOT, 'latest.json')
+KEEP_SNAPSHOTS = 2  # the current file and the one before it, for in-flight downloads
+# Product fields left out of the snapshot version
+STOCK_FIELDS = frozenset({'stock_quantity', 'out_of_stock', 'updated_on'})
+
+snapshot_storage = FileSystemStorage()
+
+
+def snapshot_name(version):
+    return posixpath.join(SNAPSHOT_ROOT, f'catalog-{version}.json.gz')
+
+
+def _dumps(value):
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def current_snapshot():
+    """
+    The pointer of the current snapshot (``version``, ``name``, ``cursor``,
+    ``generated_on``, ``size``), or None if none was built yet.
+    """
+    try:
+        with snapshot_storage.open(POINTER_NAME, 'rb') as f:
+            pointer = json.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+    if not snapshot_storage.exists(pointer['name']):
+        return None
+    return pointer
+
+
+def build_snapshot():
+    """
+    Write the snapshot if the catalog changed; returns the current pointer.
+    """
+    from .sync import catalog_changes
+
+    cursor, data, _ = catalog_changes()
+    body = _dumps(data)
+    catalog = dict(data, products=[
+        {name: value for name, value in product.items() if name not in STOCK_FIELDS}
+        for product in data['products']
+    ])
+    version = hashlib.sha256(_dumps(catalog).encode('utf-8')).hexdigest()[:32]
+
+    pointer = current_snapshot()
+    if pointer is not None and pointer['version'] == version:
+        return pointer
+
+    document = '{"version":%s,"cursor":%s,"generated_on":%s,"data":%s}' % (
+        _dumps(version), _dumps(cursor), _dumps(timezone.now()), body,
+    )
+    # mtime=0 keeps the compressed bytes a function of the content only.
+    compressed = gzip.compress(document.encode('utf-8'), compresslevel=9, mtime=0)
+    name = snapshot_name(version)
+    if not snapshot_storage.exists(name):
+        snapshot_storage.save(name, ContentFile(compressed))
+
+    pointer = {
+        'version': version,
+        'name': name,
+        'cursor': cursor.isoformat(),
+        'generated_on': timezone.now().isoformat(),
+        'size': len(compressed),
+    }
+    _write_pointer(pointer)
+    _prune(keep=name)
+    return pointer
+
+
+def _write_pointer(pointer):
+    path = snapshot_storage.path(POINTER_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pointer, f)
+    os.replace(tmp_path, path)  # readers see the old or the new pointer, never half of one
+
+
+def _prune(keep):
+    try:
+        _, filenames = snapshot_storage.listdir(SNAPSHOT_ROOT)
+    except FileNotFoundError:
+        return
+    snapshots = [
+        posixpath.join(SNAPSHOT_ROOT, filename) for filename in filenames
+        if filename.startswith('catalog-') and filename.endswith('.json.gz')
+    ]
+    snapshots.sort(key=lambda name: snapshot_storage.get_modified_time(name), reverse=True)
+    for name in snapshots[KEEP_SNAPSHOTS:]:
+        if name != keep:
+            snapshot_storage.delete(name)
+
+
+class SnapshotScheduler:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timer = None
+        self.building = False
+
+    @property
+    def delay(self):
+        return getattr(settings, 'CATALOG_SNAPSHOT_DELAY', 60)
+
+    def schedule(self):
+        """
+        Rebuild the snapshot once the current transaction commits, coalescing
+        the changes of the next ``delay`` seconds into the same rebuild.
+        """
+        transaction.on_commit(self._start)
+
+    def _start(self):
+        if not getattr(settings, 'CATALOG_SNAPSHOT_ASYNC', True):
+            self._run()
+            return
+        with self.lock:
+            if self.timer is not None:
+                return
+            self.timer = threading.Timer(self.delay, self._run_pending)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def build_soon(self):
+        """
+        Start a rebuild now, in the background, unless one is already pending
+        or running.
+        """
+        if not getattr(settings, 'CATALOG_SNAPSHOT_ASYNC', True):
+            self._run()
+            return
+        with self.lock:
+            if self.timer is not None or self.building:
+                return
+            self.timer = threading.Timer(0, self._run_pending)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _run_pending(self):
+        with self.lock:
+            self.timer = None
+            self.building = True
+        try:
+            self._run()
+        finally:
+            with self.lock:
+                self.building = False
+            connection.close()  # the timer thread opened its own connection
+
+    def _run(self):
+        try:
+            build_snapshot()
+        except Exception:
+            logger.exception('Could not build the catalog snapshot')
+
+
+snapshot_scheduler = SnapshotScheduler()
+
+
+def schedule_snapshot():
+    snapshot_scheduler.schedule()
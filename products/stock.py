@@ -0,0 +1,101 @@
+"""
+Stock ledger helpers.
+
+Every change of ``Product.stock_quantity`` is written as ``StockMovement``
+rows (in bulk) and applied to the product counters with a single
+``UPDATE ... SET stock_quantity = stock_quantity + CASE ... END`` in the same
+transaction, so concurrent orders and batch receipts never overwrite each
+other's changes and the counter can always be rebuilt from the ledger
+(``manage.py rebuild_stock``).
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Product, StockMovement
+
+
+def apply_stock_deltas(deltas):
+    """
+    Add ``{product_id: delta}`` to the products' stock in one UPDATE.
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    change = Case(
+        *[When(pk=product_id, then=Value(delta)) for product_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return Product.objects.filter(pk__in=deltas).update(
+        stock_quantity=F('stock_quantity') + change,
+        updated_on=timezone.now(),  # update() skips auto_now; delta sync relies on it
+    )
+
+
+def record_movements(movements, apply=True):
+    """
+    Write the ``StockMovement`` instances in bulk and, unless ``apply`` is
+    False (the caller already wrote the new stock), add their quantities to
+    the product counters in the same transaction.
+    """
+    movements = [movement for movement in movements if movement.quantity]
+    if not movements:
+        return []
+    with transaction.atomic():
+        StockMovement.objects.bulk_create(movements)
+        if apply:
+            deltas = defaultdict(int)
+            for movement in movements:
+                deltas[movement.product_id] += movement.quantity
+            apply_stock_deltas(deltas)
+    return movements
+
+
+def set_stock(product, quantity, kind=StockMovement.ADJUSTMENT, reference='', created_by=None):
+    """
+    Set ``product``'s stock to ``quantity``, recording the difference as a
+    movement. The row is locked so the difference is computed against the
+    committed stock, not a stale in-memory value.
+    """
+    with transaction.atomic():
+        current = Product.objects.select_for_update().values_list('stock_quantity', flat=True).get(pk=product.pk)
+        record_movements([
+            StockMovement(
+                product_id=product.pk, kind=kind, quantity=quantity - current,
+                reference=reference, created_by=created_by,
+            )
+        ])
+        product.stock_quantity = quantity
+    return product
+
+
+def save_without_stock(product):
+    """
+    Save an existing ``product`` without writing ``stock_quantity``: a plain
+    ``save()`` would write back the value loaded with the row and undo the
+    movements committed since. The in-memory value is refreshed instead.
+    """
+    fields = [
+        field.name for field in product._meta.concrete_fields
+        if not field.primary_key and field.name != 'stock_quantity'
+    ]
+    product.save(update_fields=fields)
+    product.stock_quantity = Product.objects.values_list('stock_quantity', flat=True).get(pk=product.pk)
+    return product
+
+
+def stock_at(when=None, product_ids=None):
+    """
+    ``{product_id: stock}`` according to the ledger, at ``when`` (or now).
+    Products with no movements up to then are left out: their stock was 0.
+    """
+    movements = StockMovement.objects.all()
+    if when is not None:
+        movements = movements.filter(created_on__lte=when)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    totals = movements.order_by().values('product_id').annotate(stock=Sum('quantity'))
+    return {row['product_id']: row['stock'] for row in totals}
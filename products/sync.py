@@ -0,0 +1,102 @@
+"""
+Delta catalog sync for mobile clients.
+
+``catalog_changes(since)`` returns the products, categories, companies and
+generic names changed after ``since`` plus tombstones: ids of rows deleted
+(recorded in ``Tombstone`` by the post_delete signals) or deactivated since
+then. Clients keep the returned ``cursor`` and send it back as
+``updated_since`` on the next launch, so most launches download a few rows
+instead of the whole catalog.
+
+Products are also re-sent when their company, generic name or one of their
+categories changed, because the product payload embeds those names. The
+window is widened by ``CATALOG_SYNC_OVERLAP`` seconds (default 60) so rows
+committed by transactions that were still running at the previous sync are
+not missed; clients upsert, so re-sent rows are harmless.
+
+Tombstones are kept for ``CATALOG_TOMBSTONE_DAYS`` days (default 90) and
+removed by ``manage.py prune_tombstones``; a client whose cursor is older than
+that gets a full sync instead, since deletions before the cutoff may be gone.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .fastpath import product_rows
+from .models import Category, Company, GenericName, Product, Tombstone
+from .serializers import CategorySerializer, CompanySerializer, GenericNameSerializer, ProductSerializer
+
+
+# Tombstone.model value -> (model, serializer, response key)
+SYNCED_MODELS = {
+    Tombstone.PRODUCT: (Product, ProductSerializer, 'products'),
+    Tombstone.CATEGORY: (Category, CategorySerializer, 'categories'),
+    Tombstone.COMPANY: (Company, CompanySerializer, 'companies'),
+    Tombstone.GENERIC_NAME: (GenericName, GenericNameSerializer, 'generic_names'),
+}
+
+
+def sync_overlap():
+    return timedelta(seconds=getattr(settings, 'CATALOG_SYNC_OVERLAP', 60))
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'CATALOG_TOMBSTONE_DAYS', 90))
+
+
+def tombstones_kept_since():
+    """Tombstones older than this may have been pruned."""
+    return timezone.now() - tombstone_retention()
+
+
+def delta_available(since):
+    """Whether every deletion after ``since`` is still recorded."""
+    return since - sync_overlap() >= tombstones_kept_since()
+
+
+def changed_products(since):
+    return Product.objects.filter(
+        Q(updated_on__gte=since)
+        | Q(company_id__updated_on__gte=since)
+        | Q(generic_name__updated_on__gte=since)
+        | Q(pk__in=Product.category_id.through.objects.filter(
+            category__updated_on__gte=since
+        ).values('product_id'))
+    )
+
+
+def catalog_changes(since=None, context=None):
+    """
+    ``(cursor, data, deleted)`` for a sync from ``since``; a full catalog
+    (active rows only, no tombstones) when ``since`` is None.
+    """
+    cursor = timezone.now()
+    data = {}
+    deleted = {key: [] for _, _, key in SYNCED_MODELS.values()}
+
+    if since is not None:
+        since = since - sync_overlap()
+        tombstones = Tombstone.objects.filter(deleted_on__gte=since).values_list('model', 'object_id')
+        for model_name, object_id in tombstones:
+            deleted[SYNCED_MODELS[model_name][2]].append(object_id)
+
+    for model, serializer_class, key in SYNCED_MODELS.values():
+        rows = model.objects.order_by('pk')
+        if since is not None:
+            rows = changed_products(since) if model is Product else rows.filter(updated_on__gte=since)
+
+        if any(field.name == 'is_active' for field in model._meta.fields):
+            if since is not None:
+                # Deactivated rows are tombstones for the client.
+                deleted[key] += rows.filter(is_active=False).values_list('pk', flat=True)
+            rows = rows.filter(is_active=True)
+        if model is Product:
+            data[key] = list(product_rows(rows.order_by('pk'), context))
+        else:
+            data[key] = serializer_class(rows, many=True, context=context or {}).data
+
+    for key, ids in deleted.items():
+        deleted[key] = sorted(set(ids))
+    return cursor, data, deleted
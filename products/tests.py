@@ -1,3 +1,1033 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.utils.encoders import JSONEncoder
+from PIL import Image
+
+from accounts.models import UserAuth
+from .models import (
+    BannerImages, Category, Company, GenericName, Product, StockBatch, StockMovement, TempProduct, Tombstone,
+)
+from .fastpath import product_rows
+from .images import variant_urls
+from .importer import ProductImporter
+from .listing import CategoryListing, category_listing
+from .search import BKTree, CatalogSearchEngine, NgramIndex, edit_distance, search_engine
+from .serializers import ProductSerializer
+from .sequences import next_invoice_number, sequences
+from .snapshot import snapshot_scheduler
+from .stock import record_movements, set_stock, stock_at
+from .views import accepts_gzip
+
+
+class ProductQueryCountTests(TestCase):
+    """
+    Serializing N products must cost the same number of queries as
+    serializing a handful of them.
+    """
+
+    def setUp(self):
+        self.user = UserAuth.objects.create_user(
+            phone='01700000000', password='secret', full_name='Tester', email='tester@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.company = Company.objects.create(company_name='Square Pharma')
+        self.generic = GenericName.objects.create(name='Paracetamol')
+        self.categories = [Category.objects.create(name=name) for name in ('Tablet', 'Syrup')]
+        search_engine.rebuild()
+        category_listing.rebuild()
+
+    def add_products(self, count):
+        start = Product.objects.count()
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                product_name=f'Napa {i}', mrp=10, selling_price=9,
+                company_id=self.company, generic_name=self.generic,
+            )
+            product.category_id.set(self.categories)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.add_products(3)
+        few = self.count_queries(url)
+        self.add_products(20)
+        many = self.count_queries(url)
+        self.assertEqual(few, many, url)
+
+    def test_product_list(self):
+        self.assertConstantQueries('/products/products/?page_size=500')
+
+    def test_product_name_search(self):
+        self.assertConstantQueries('/products/products/?src=napa&page_size=500')
+
+    def test_all_product_list(self):
+        self.assertConstantQueries('/products/all_products/?page_size=500')
+
+    def test_cursor_pages_count_only_once(self):
+        self.add_products(5)
+        first = self.client.get('/products/products/', {'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual(first.data['results']['total_products'], Product.objects.filter(is_active=True).count())
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']['data']), 2)
+        self.assertNotIn('total_products', second.data['results'])
+        self.assertFalse(any('COUNT(' in query['sql'] for query in ctx.captured_queries))
+
+    def test_category_wise_products(self):
+        self.assertConstantQueries('/products/products/category/')
+        self.assertConstantQueries(f'/products/products/category/{self.categories[0].pk}/')
+        for preview in ('-1', 'abc'):
+            response = self.client.get('/products/products/category/', {'preview': preview})
+            self.assertEqual(response.status_code, 400, preview)
+
+    def test_search_views(self):
+        self.assertConstantQueries('/products/products/search/?q=napa')
+        self.assertConstantQueries('/products/search/by_companies/?company_names=square')
+        self.assertConstantQueries('/products/search/by_generic_name/?generic_names=para')
+
+    def test_sparse_fieldset_skips_joins(self):
+        self.add_products(3)
+        full = self.count_queries('/products/products/?page_size=500')
+        sparse = self.count_queries('/products/products/?page_size=500&fields=product_id,product_name,mrp')
+        self.assertLess(sparse, full)
+
+        response = self.client.get('/products/products/?fields=product_id,product_name,mrp')
+        self.assertEqual(set(response.data['results']['data'][0]), {'product_id', 'product_name', 'mrp'})
+        response = self.client.get('/products/products/?exclude=category_name,category_id,generic_name')
+        item = response.data['results']['data'][0]
+        self.assertNotIn('category_name', item)
+        self.assertNotIn('generic_name', item)
+        self.assertEqual(item['company_name'], 'Square Pharma')
+
+
+class ProductImportTests(TestCase):
+
+    def setUp(self):
+        # Query counts must not depend on whether an earlier test built the
+        # in-process indexes (the importer rebuilds built ones)
+        for index in (search_engine, category_listing):
+            self.enterContext(mock.patch.object(index, 'built_at', None))
+
+    def run_import(self, text, **kwargs):
+        return ProductImporter(**kwargs).run(io.StringIO(text))
+
+    def test_creates_products_and_lookups(self):
+        rows = ['product_name,company,generic_name,categories,mrp,selling_price,stock_quantity']
+        rows += [f'Napa {i},Beximco,Paracetamol,Tablet;Fever,10,8,{i}' for i in range(50)]
+        with CaptureQueriesContext(connection) as ctx:
+            importer = self.run_import('\n'.join(rows), chunk_size=20)
+        self.assertEqual(importer.created, 50)
+        self.assertLess(len(ctx.captured_queries), 50)
+
+        product = Product.objects.get(product_name='Napa 7')
+        self.assertEqual(product.discount_percent, 20)
+        self.assertEqual(product.stock_quantity, 7)
+        self.assertEqual(product.company_id.company_name, 'Beximco')
+        self.assertEqual(sorted(c.name for c in product.category_id.all()), ['Fever', 'Tablet'])
+        self.assertEqual(Product.objects.values('sku').distinct().count(), 50)
+
+    def test_backend_without_returned_ids(self):
+        # MySQL does not return the ids of bulk-inserted rows
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock, return_value=False,
+        ):
+            importer = self.run_import(
+                'product_name,categories,mrp,selling_price,stock_quantity\n'
+                'Napa,Tablet,10,8,5\n'
+                'Ace,Tablet;Fever,10,9,3\n'
+            )
+        self.assertEqual(importer.created, 2)
+        product = Product.objects.get(product_name='Ace')
+        self.assertEqual(sorted(c.name for c in product.category_id.all()), ['Fever', 'Tablet'])
+        self.assertEqual(list(product.stock_movements.values_list('quantity', flat=True)), [3])
+
+    def test_updates_existing_and_reports_bad_rows(self):
+        company = Company.objects.create(company_name='Square Pharma')
+        product = Product.objects.create(product_name='Ace', mrp=10, selling_price=10, company_id=company)
+        importer = self.run_import(
+            'product_name,company,mrp,selling_price\n'
+            'ACE,square pharma,20,15\n'
+            'Broken,,abc,1\n'
+            'Cheap,,5,6\n'
+        )
+        product.refresh_from_db()
+        self.assertEqual((importer.created, importer.updated), (0, 1))
+        self.assertEqual(product.mrp, 20)
+        self.assertEqual(product.discount_percent, 25)
+        self.assertEqual([line for line, _, _ in importer.errors], [3, 4])
+
+    def test_reports_names_too_long_for_their_field(self):
+        long_name = 'x' * 101
+        importer = self.run_import(
+            'product_name,company,generic_name,categories,mrp\n'
+            f'Napa,{"x" * 256},,,10\n'
+            f'Ace,Beximco,{long_name},,10\n'
+            f'Seclo,Beximco,,Capsule;{long_name},10\n'
+            'Fexo,Beximco,Fexofenadine,Tablet,10\n'
+        )
+        self.assertEqual(importer.created, 1)
+        self.assertEqual([line for line, _, _ in importer.errors], [2, 3, 4])
+        self.assertIn('too long', importer.errors[1][2])
+        self.assertFalse(Category.objects.filter(name='Capsule').exists())
+
+
+@override_settings(SEQUENCE_BLOCK_SIZE=10)
+class SequenceAllocatorTests(TestCase):
+
+    def setUp(self):
+        sequences.reset()
+
+    def test_values_come_from_reserved_blocks(self):
+        values = [sequences.next_value('test')]
+        with CaptureQueriesContext(connection) as ctx:
+            values += [sequences.next_value('test') for _ in range(9)]
+        # The rest of the first block is handed out from memory.
+        self.assertEqual(len(ctx.captured_queries), 0)
+        values += sequences.next_values('test', 15)
+        self.assertEqual(values, list(range(1, 26)))
+
+    def test_rolled_back_block_is_not_reused(self):
+        try:
+            with transaction.atomic():
+                self.assertEqual(sequences.next_values('test', 3), [1, 2, 3])
+                raise ValueError
+        except ValueError:
+            pass
+        # The reservation rolled back, so the numbers are handed out again, once.
+        self.assertEqual(sequences.next_values('test', 12), list(range(1, 13)))
+
+    def test_invoice_numbers_and_skus(self):
+        first = next_invoice_number()
+        second = next_invoice_number()
+        self.assertRegex(first, r'^INV-\d{8}-00001$')
+        self.assertTrue(second.endswith('-00002'))
+
+        products = [Product.objects.create(product_name=f'Napa {i}', mrp=10) for i in range(3)]
+        self.assertEqual(len({product.sku for product in products}), 3)
+        self.assertTrue(all(product.sku for product in products))
+
+
+class StockLedgerTests(TestCase):
+
+    def setUp(self):
+        self.products = [Product.objects.create(product_name=f'Napa {i}', mrp=10) for i in range(3)]
+
+    def test_movements_update_counters_in_one_statement(self):
+        movements = [
+            StockMovement(product=product, kind=StockMovement.RECEIPT, quantity=10 * (i + 1))
+            for i, product in enumerate(self.products)
+        ] + [StockMovement(product=self.products[0], kind=StockMovement.SALE, quantity=-4)]
+        with CaptureQueriesContext(connection) as ctx:
+            record_movements(movements)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in ctx.captured_queries), 1)
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('stock_quantity', flat=True)), [6, 20, 30])
+
+    def test_set_stock_and_point_in_time(self):
+        product = self.products[0]
+        record_movements([StockMovement(product=product, kind=StockMovement.RECEIPT, quantity=8)])
+        before = timezone.now()
+        set_stock(product, 5)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 5)
+        self.assertEqual(stock_at(before, [product.pk]), {product.pk: 8})
+        self.assertEqual(stock_at(product_ids=[product.pk]), {product.pk: 5})
+
+    def test_update_without_stock_keeps_concurrent_movements(self):
+        product = self.products[0]
+        set_stock(product, 10)
+        loaded = Product.objects.get(pk=product.pk)
+        # An order commits between the load and the save
+        record_movements([StockMovement(product=product, kind=StockMovement.SALE, quantity=-3)])
+
+        serializer = ProductSerializer(loaded, data={'product_name': 'Napa Extra'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        product.refresh_from_db()
+        self.assertEqual((product.product_name, product.stock_quantity), ('Napa Extra', 7))
+        self.assertEqual(stock_at(product_ids=[product.pk]), {product.pk: 7})
+        self.assertEqual(serializer.data['stock_quantity'], 7)
+
+    def test_opening_balances_and_rebuild(self):
+        Product.objects.filter(pk=self.products[0].pk).update(stock_quantity=7)
+        Product.objects.filter(pk=self.products[1].pk).update(stock_quantity=4)
+        record_movements([StockMovement(product=self.products[1], kind=StockMovement.RECEIPT, quantity=3)], apply=False)
+        import_module('products.migrations.0010_opening_stock').open_stock_ledger(apps, None)
+        self.assertEqual(stock_at(), {self.products[0].pk: 7, self.products[1].pk: 4})
+
+        # Verify-only unless --apply is given
+        Product.objects.filter(pk=self.products[2].pk).update(stock_quantity=9)
+        call_command('rebuild_stock', stdout=io.StringIO())
+        self.assertEqual(Product.objects.get(pk=self.products[2].pk).stock_quantity, 9)
+        call_command('rebuild_stock', '--apply', stdout=io.StringIO())
+        self.assertEqual(Product.objects.get(pk=self.products[2].pk).stock_quantity, 0)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 7)
+
+
+class StockBatchTests(TestCase):
+
+    def setUp(self):
+        self.user = UserAuth.objects.create_user(
+            phone='01700000000', password='secret', full_name='Tester', email='tester@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(product_name=f'Napa {i}', mrp=10, selling_price=9, stock_quantity=5)
+            for i in range(3)
+        ]
+
+    def stage(self, batch_id, product, quantity, cost_price=6, selling_price=8):
+        return TempProduct.objects.create(
+            batch_id=batch_id, user_id=self.user, product_id=product, new_stock_quantity=quantity,
+            new_cost_price=cost_price, new_selling_price=selling_price, mrp=product.mrp,
+        )
+
+    def confirm(self, batch_id):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/products/batch/{batch_id}/confirm/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_confirm_applies_lines_once(self):
+        batch_id = uuid.uuid4()
+        self.stage(batch_id, self.products[0], 10)
+        self.stage(batch_id, self.products[1], 4, cost_price=7, selling_price=7)
+        self.stage(batch_id, self.products[0], 2, selling_price=Decimal('7.50'))  # last price wins
+        self.confirm(batch_id)
+        self.confirm(batch_id)  # a retry applies nothing twice
+
+        first, second, third = (Product.objects.get(pk=product.pk) for product in self.products)
+        self.assertEqual((first.stock_quantity, first.selling_price, first.discount_percent), (17, Decimal('7.50'), 25))
+        self.assertEqual((second.stock_quantity, second.cost_price, second.discount_percent), (9, 7, 30))
+        self.assertEqual(third.stock_quantity, 5)
+        self.assertEqual(StockMovement.objects.filter(kind=StockMovement.RECEIPT).count(), 3)
+        self.assertFalse(TempProduct.objects.filter(is_confirmed=False).exists())
+
+    def test_confirm_query_count_does_not_grow_with_lines(self):
+        small, large = uuid.uuid4(), uuid.uuid4()
+        self.stage(small, self.products[0], 1)
+        for i in range(30):
+            self.stage(large, self.products[i % 3], 1)
+        self.assertEqual(self.confirm(small), self.confirm(large))
+
+    def test_unknown_batch(self):
+        response = self.client.post(f'/products/batch/{uuid.uuid4()}/confirm/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_summary_totals_and_pages(self):
+        batch_id = uuid.uuid4()
+        for i in range(5):
+            self.stage(batch_id, self.products[i % 3], i + 1)  # totals 6 + 12 + ... + 30
+        url = f'/products/batch/{batch_id}/summary/?page_size=2'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        summary = response.data['results']
+        self.assertEqual((summary['total_products'], summary['total_value']), (5, '90.00'))
+        self.assertEqual(len(summary['products']), 2)
+        self.assertEqual(summary['products'][0]['product'], 'Napa 0')
+        self.assertEqual(response.data['count'], 5)
+
+        for i in range(20):
+            self.stage(batch_id, self.products[0], 1)
+        with CaptureQueriesContext(connection) as larger:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), len(larger.captured_queries))
+
+        self.assertEqual(self.client.get(f'/products/batch/{batch_id}/get_summary/').status_code, 404)
+        self.confirm(batch_id)
+        response = self.client.get(f'/products/batch/{batch_id}/get_summary/')
+        self.assertEqual(response.data['results']['total_products'], 25)
+
+
+    def add(self, product, quantity, cost_price=6):
+        response = self.client.post('/products/batch/add/', {
+            'product_id': product.pk, 'new_stock_quantity': quantity, 'new_cost_price': cost_price,
+            'new_selling_price': 8, 'mrp': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return uuid.UUID(response.data['batch_id'])
+
+    def test_batch_header_follows_lines(self):
+        batch_id = self.add(self.products[0], 10)
+        self.assertEqual(self.add(self.products[1], 5), batch_id)
+        batch = StockBatch.objects.get()
+        self.assertEqual((batch.status, batch.line_count, batch.total_value), (StockBatch.OPEN, 2, 90))
+
+        self.confirm(batch_id)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, StockBatch.CONFIRMED)
+        self.assertIsNotNone(batch.confirmed_on)
+
+        next_batch = self.add(self.products[2], 1)
+        self.assertNotEqual(next_batch, batch_id)
+        self.client.post(f'/products/batch/{next_batch}/cancel/')
+        cancelled = StockBatch.objects.get(pk=next_batch)
+        self.assertEqual((cancelled.status, cancelled.line_count, cancelled.total_value), (StockBatch.CANCELLED, 0, 0))
+
+        response = self.client.get('/products/all_batch_id')
+        self.assertEqual(response.status_code, 200)
+        data = response.data['results']['data']
+        self.assertEqual([row['batch_id'] for row in data], [str(next_batch), str(batch_id)])
+        self.assertEqual(data[1]['owner_name'], 'Tester')
+        response = self.client.get('/products/all_batch_id', {'status': StockBatch.CONFIRMED})
+        self.assertEqual(len(response.data['results']['data']), 1)
+
+
+    def test_stage_many_lines(self):
+        lines = [
+            {'product_id': product.pk, 'new_stock_quantity': 4, 'new_cost_price': '6.50', 'new_selling_price': 8}
+            for product in self.products
+        ]
+        response = self.client.post('/products/batch/add/', {'lines': lines}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['temp_ids']), 3)
+        batch = StockBatch.objects.get()
+        self.assertEqual((str(batch.pk), batch.line_count, batch.total_value), (response.data['batch_id'], 3, 78))
+        self.assertEqual(sorted(TempProduct.objects.values_list('total_amount', flat=True)), [26, 26, 26])
+
+        # Adding to the now open batch costs the same for 3 or 30 lines
+        with CaptureQueriesContext(connection) as few:
+            self.client.post('/products/batch/add/', {'lines': lines}, format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post('/products/batch/add/', {'lines': lines * 10}, format='json')
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        self.assertEqual(StockBatch.objects.get().line_count, 36)
+
+    def test_staged_ids_without_returned_ids(self):
+        # MySQL does not return the ids of bulk-inserted rows
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock, return_value=False,
+        ):
+            first = self.client.post('/products/batch/add/', {'product_id': self.products[0].pk, 'new_stock_quantity': 1})
+            response = self.client.post('/products/batch/add/', {'lines': [
+                {'product_id': product.pk, 'new_stock_quantity': 2} for product in self.products
+            ]}, format='json')
+        self.assertIsNotNone(first.data['temp_id'])
+        staged = list(TempProduct.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual([first.data['temp_id']] + response.data['temp_ids'], staged)
+
+    def test_stage_many_lines_reports_errors_per_line(self):
+        response = self.client.post('/products/batch/add/', {'lines': [
+            {'product_id': self.products[0].pk, 'new_stock_quantity': 1},
+            {'product_id': 999999, 'new_stock_quantity': 1},
+            {'product_id': self.products[1].pk, 'new_stock_quantity': -1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('product_id', errors[1])
+        self.assertIn('new_stock_quantity', errors[2])
+        self.assertFalse(TempProduct.objects.exists())
+
+
+class ProductFastPathTests(TestCase):
+    """
+    ``product_rows`` must produce exactly what ``ProductSerializer`` does.
+    """
+
+    def setUp(self):
+        company = Company.objects.create(company_name='Square Pharma')
+        generic = GenericName.objects.create(name='Paracetamol')
+        syrup, tablet, gel = (Category.objects.create(name=name) for name in ('Syrup', 'Tablet', 'Gel'))
+        first = Product.objects.create(
+            product_name='Napa', mrp=10, selling_price=9, company_id=company, generic_name=generic,
+            product_image='product_images/napa.jpg', product_description='Fever',
+        )
+        first.category_id.set([tablet, syrup])
+        second = Product.objects.create(product_name='Ace', mrp=Decimal('10.50'), selling_price=Decimal('9.25'), is_active=False)
+        second.category_id.set([gel])
+        Product.objects.create(product_name='Bare', mrp=5)  # no company, generic name, image or category
+
+    def assertParity(self, context):
+        queryset = Product.objects.all()
+        expected = ProductSerializer(ProductSerializer.prepare_queryset(queryset), many=True, context=context).data
+        actual = list(product_rows(queryset, context, chunk_size=2))
+        self.assertEqual(json.dumps(expected, cls=JSONEncoder), json.dumps(actual, cls=JSONEncoder))
+
+    def test_parity(self):
+        self.assertParity({})
+
+    def test_parity_with_request(self):
+        self.assertParity({'request': RequestFactory().get('/')})
+
+    def test_parity_with_sparse_fields(self):
+        self.assertParity({'fields': {'product_id', 'category_name', 'company_name', 'mrp'}})
+
+
+@override_settings(CATALOG_SYNC_OVERLAP=0)
+class CatalogSyncTests(TestCase):
+
+    def setUp(self):
+        self.user = UserAuth.objects.create_user(
+            phone='01700000000', password='secret', full_name='Tester', email='tester@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.company = Company.objects.create(company_name='Square Pharma')
+        self.tablet = Category.objects.create(name='Tablet')
+        self.products = [
+            Product.objects.create(product_name=f'Napa {i}', mrp=10, selling_price=9, company_id=self.company)
+            for i in range(4)
+        ]
+
+    def sync(self, cursor=None):
+        params = {'updated_since': cursor} if cursor else {}
+        response = self.client.get('/products/sync/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_then_delta(self):
+        full = self.sync()
+        self.assertTrue(full['full'])
+        self.assertEqual(len(full['data']['products']), 4)
+
+        first, second, third, _ = self.products
+        first.selling_price = 8
+        first.save()
+        second.is_active = False
+        second.save()
+        third_id = third.pk
+        third.delete()
+        self.tablet.products.add(self.products[3])
+
+        delta = self.sync(full['cursor'])
+        self.assertFalse(delta['full'])
+        self.assertEqual(
+            sorted(p['product_id'] for p in delta['data']['products']), [first.pk, self.products[3].pk]
+        )
+        self.assertEqual(delta['deleted']['products'], sorted([second.pk, third_id]))
+        self.assertEqual(delta['data']['companies'], [])
+
+        self.assertEqual(self.sync(delta['cursor'])['data']['products'], [])
+
+    def test_renamed_company_resends_its_products(self):
+        cursor = self.sync()['cursor']
+        self.company.company_name = 'Square'
+        self.company.save()
+        delta = self.sync(cursor)
+        self.assertEqual(len(delta['data']['companies']), 1)
+        self.assertEqual({p['company_name'] for p in delta['data']['products']}, {'Square'})
+        self.assertEqual(len(delta['data']['products']), 4)
+
+    @override_settings(CATALOG_TOMBSTONE_DAYS=30)
+    def test_cursor_older_than_tombstones_gets_a_full_sync(self):
+        old_id = self.products[0].pk
+        self.products[0].delete()
+        recent_id = self.products[1].pk
+        self.products[1].delete()
+        Tombstone.objects.filter(object_id=old_id).update(deleted_on=timezone.now() - timedelta(days=31))
+
+        out = io.StringIO()
+        call_command('prune_tombstones', stdout=out)
+        self.assertIn('Deleted 1 tombstones', out.getvalue())
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [recent_id])
+
+        stale = (timezone.now() - timedelta(days=40)).isoformat()
+        response = self.sync(stale)
+        self.assertTrue(response['full'])
+        self.assertEqual(len(response['data']['products']), 2)
+        recent = (timezone.now() - timedelta(days=20)).isoformat()
+        response = self.sync(recent)
+        self.assertFalse(response['full'])
+        self.assertEqual(response['deleted']['products'], [recent_id])
+
+
+class CatalogSnapshotTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, CATALOG_SNAPSHOT_ASYNC=False))
+        self.user = UserAuth.objects.create_user(
+            phone='01700000000', password='secret', full_name='Tester', email='tester@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fetch(self, **headers):
+        return self.client.get('/products/catalog_snapshot/', HTTP_ACCEPT_ENCODING='gzip', **headers)
+
+    def test_snapshot_etag_and_rebuild_on_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(product_name='Napa', mrp=10, selling_price=9)
+
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        document = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual([p['product_name'] for p in document['data']['products']], ['Napa'])
+        self.assertEqual(self.fetch(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.selling_price = 8
+            product.save()
+        changed = self.fetch(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_stock_changes_keep_the_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(product_name='Napa', mrp=10, selling_price=9)
+        etag = self.fetch()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            record_movements([StockMovement(product=product, kind=StockMovement.SALE, quantity=-1)])
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            product.refresh_from_db()
+            product.save()  # a rebuild with only stock changed keeps the version
+        self.assertEqual(self.fetch(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get('/products/catalog_snapshot/')
+        self.assertNotIn('Content-Encoding', response)
+        document = json.loads(b''.join(response.streaming_content))
+        response.close()
+        self.assertEqual(f'"{document["version"]}"', etag)
+
+    def test_missing_snapshot_is_built_outside_the_request(self):
+        Product.objects.create(product_name='Napa', mrp=10, selling_price=9)
+        with override_settings(CATALOG_SNAPSHOT_ASYNC=True), mock.patch('products.snapshot.threading.Timer') as timer:
+            self.addCleanup(setattr, snapshot_scheduler, 'timer', None)
+            response = self.fetch()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '30')
+            self.assertEqual(self.fetch().status_code, 503)
+        # One background build, started at once rather than after the debounce delay
+        timer.assert_called_once_with(0, snapshot_scheduler._run_pending)
+
+        self.assertEqual(self.fetch().status_code, 503)  # built synchronously when not async
+        self.assertEqual(self.fetch().status_code, 200)
+
+    def test_accept_encoding_q_values(self):
+        for header in ('gzip', 'deflate, GZIP', 'br;q=1.0, gzip;q=0.8', 'x-gzip', '*', 'identity, *;q=0.5'):
+            self.assertTrue(accepts_gzip(header), header)
+        for header in ('', 'gzip;q=0', 'gzip; q=0.000, *', 'deflate', 'gzipped', '*;q=0', 'gzip;q=abc'):
+            self.assertFalse(accepts_gzip(header), header)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(product_name='Napa', mrp=10, selling_price=9)
+        response = self.client.get('/products/catalog_snapshot/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', response)
+        b''.join(response.streaming_content)
+        response.close()
+
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, IMAGE_VARIANTS_ASYNC=False))
+
+    def image(self, color='red'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), color).save(buffer, format='PNG')
+        return ContentFile(buffer.getvalue(), name=f'{color}.png')
+
+    def test_variants_follow_the_stored_file(self):
+        with mock.patch('products.images.generate_variants') as generate:
+            with self.captureOnCommitCallbacks(execute=True):
+                banner = BannerImages.objects.create(name='Sale', image=self.image())
+            self.assertEqual(generate.call_count, 1)
+            # Missing variants fall back to the original image
+            self.assertEqual(set(variant_urls(banner.image).values()), {banner.image.url})
+
+            with self.captureOnCommitCallbacks(execute=True):
+                BannerImages.objects.get(pk=banner.pk).save()  # image unchanged
+            self.assertEqual(generate.call_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            banner.image = self.image('blue')
+            banner.save()
+        urls = variant_urls(banner.image)
+        self.assertTrue(urls['thumb'].endswith('_thumb.webp'))
+
+        with mock.patch('products.images.generate_variants') as generate:
+            with self.captureOnCommitCallbacks(execute=True):
+                banner.image = self.image('blue')  # same content, variants already there
+                banner.save()
+            generate.assert_not_called()
+
+
+class SearchIndexTests(TestCase):
+
+    def test_ranking(self):
+        index = NgramIndex()
+        for doc_id, name in enumerate(['Ace Plus', 'Napa Extra', 'Napa', 'Extra Napa', 'Xnapa']):
+            index.add(doc_id, name)
+        self.assertEqual([index.names[d] for d in index.search('napa')], ['Napa', 'Napa Extra', 'Extra Napa', 'Xnapa'])
+        self.assertEqual([index.names[d] for d in index.search('NAPA', prefix_only=True)], ['Napa', 'Napa Extra'])
+
+    @staticmethod
+    def dp_edit_distance(a, b):
+        row = list(range(len(b) + 1))
+        for i, x in enumerate(a, 1):
+            previous, row[0] = row[0], i
+            for j, y in enumerate(b, 1):
+                previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (x != y))
+        return row[-1]
+
+    def test_edit_distance_matches_dynamic_programming(self):
+        rng = random.Random(7)
+        words = ['', 'a', 'napa', 'paracetamol', 'paracetmol', 'x' * 70, 'xy' * 40]
+        words += [''.join(rng.choice('abcd') for _ in range(rng.randint(0, 12))) for _ in range(60)]
+        for a in words:
+            for b in words:
+                self.assertEqual(edit_distance(a, b), self.dp_edit_distance(a, b), (a, b))
+
+    def test_bktree_finds_every_term_within_distance(self):
+        rng = random.Random(11)
+        terms = sorted({''.join(rng.choice('abcde') for _ in range(rng.randint(1, 8))) for _ in range(300)})
+        tree = BKTree()
+        for doc_id, term in enumerate(terms):
+            tree.add(term, doc_id)
+        for query in ['abc', 'eeee', 'a', 'bcdabcda', 'zz']:
+            for max_distance in range(4):
+                found = {doc_id: distance for distance, doc_ids in tree.search(query, max_distance) for doc_id in doc_ids}
+                expected = {
+                    doc_id: self.dp_edit_distance(query, term)
+                    for doc_id, term in enumerate(terms)
+                    if self.dp_edit_distance(query, term) <= max_distance
+                }
+                self.assertEqual(found, expected, (query, max_distance))
+
+    def test_short_queries_use_their_own_postings(self):
+        index = NgramIndex()
+        for doc_id, name in enumerate(['Napa', 'Ace', 'Maxpro']):
+            index.add(doc_id, name)
+        self.assertEqual(set(index.candidates('a')), {0, 1, 2})
+        self.assertEqual(set(index.candidates('ap')), {0})
+        self.assertEqual(index.search('x'), [2])
+        index.remove(0)
+        self.assertEqual(index.search('ap'), [])
+        self.assertNotIn('ap', index.short_postings)
+
+    def test_incremental_updates(self):
+        engine = CatalogSearchEngine()
+        engine.rebuild()
+        product = Product.objects.create(product_name='Seclo 20', mrp=10)
+        self.assertEqual(engine.search_products('seclo'), [])  # stale until patched
+        engine.index_product(product)
+        self.assertEqual(engine.search_products('seclo'), [product.pk])
+        self.assertEqual(engine.complete_products('se'), [(product.pk, 'Seclo 20')])
+
+        product.is_active = False
+        engine.index_product(product)
+        self.assertEqual(engine.search_products('seclo'), [])
+        self.assertEqual(engine.search_products('seclo', active_only=False), [product.pk])
+        engine.remove_product(product.pk)
+        self.assertEqual(engine.search_products('seclo', active_only=False), [])
+
+    def test_updates_during_a_rebuild_are_kept(self):
+        engine = CatalogSearchEngine()
+        engine.rebuild()
+        old = Product.objects.create(product_name='Napa', mrp=10)
+        engine.index_product(old)
+        load = CatalogSearchEngine._load
+
+        def load_then_write(staged):
+            load(staged)
+            # A product saved after the rebuild read the table
+            product = Product.objects.create(product_name='Seclo', mrp=10)
+            engine.index_product(product)
+            self.assertEqual(engine.search_products('napa'), [old.pk])  # the current index still answers
+
+        with mock.patch.object(CatalogSearchEngine, '_load', load_then_write):
+            engine.rebuild()
+        self.assertEqual(len(engine.search_products('seclo')), 1)
+        self.assertEqual(engine.search_products('napa'), [old.pk])
+        self.assertIsNone(engine.pending)
+
+
+class CatalogSearchViewTests(TestCase):
+
+    def setUp(self):
+        self.user = UserAuth.objects.create_user(
+            phone='01700000000', password='secret', full_name='Tester', email='tester@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.square = Company.objects.create(company_name='Square Pharma')
+        self.beximco = Company.objects.create(company_name='Beximco')
+        self.paracetamol = GenericName.objects.create(name='Paracetamol')
+        self.omeprazole = GenericName.objects.create(name='Omeprazole')
+        self.tablet = Category.objects.create(name='Tablet')
+        self.capsule = Category.objects.create(name='Capsule')
+        self.napa = self.product('Napa', self.beximco, self.paracetamol, [self.tablet], 9)
+        self.ace = self.product('Ace', self.square, self.paracetamol, [self.tablet], 12)
+        self.seclo = self.product('Seclo', self.square, self.omeprazole, [self.capsule, self.tablet], 50)
+        self.product('Old Ace', self.square, self.paracetamol, [self.tablet], 10, is_active=False)
+        search_engine.rebuild()
+
+    @staticmethod
+    def product(name, company, generic, categories, price, **fields):
+        product = Product.objects.create(
+            product_name=name, company_id=company, generic_name=generic, mrp=price + 1, selling_price=price,
+            stock_quantity=5, **fields
+        )
+        product.category_id.set(categories)
+        return product
+
+    def test_faceted_search_filters_and_counts(self):
+        response = self.client.get('/products/search/', {'company': self.square.pk})
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([p['product_name'] for p in results['data']], ['Ace', 'Seclo'])
+        facets = {
+            name: {facet['name']: facet['count'] for facet in values}
+            for name, values in results['facets'].items()
+        }
+        self.assertEqual(facets, {
+            'companies': {'Square Pharma': 2},
+            'categories': {'Tablet': 2, 'Capsule': 1},
+            'generics': {'Paracetamol': 1, 'Omeprazole': 1},
+        })
+
+        response = self.client.get('/products/search/', {'max_price': '20', 'category': self.tablet.pk})
+        self.assertEqual([p['product_name'] for p in response.data['results']['data']], ['Ace', 'Napa'])
+        response = self.client.get('/products/search/', {'q': 'sec', 'min_price': '10.5'})
+        self.assertEqual([p['product_name'] for p in response.data['results']['data']], ['Seclo'])
+
+    def test_faceted_search_rejects_bad_numbers(self):
+        for value in ('abc', 'nan', 'NaN', 'Infinity', '-inf', 'sNaN'):
+            response = self.client.get('/products/search/', {'min_price': value})
+            self.assertEqual(response.status_code, 400, value)
+        self.assertEqual(self.client.get('/products/search/', {'company': 'x'}).status_code, 400)
+
+    def test_typeahead_completes_products_and_generics(self):
+        self.product('Napadol', self.beximco, self.paracetamol, [self.tablet], 20)
+        self.product('Omidon', self.square, self.omeprazole, [self.tablet], 20)
+        search_engine.rebuild()
+
+        response = self.client.get('/products/typeahead/', {'q': 'NAP'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(d['name'], d['type']) for d in response.data['data']], [('Napa', 'product'), ('Napadol', 'product')]
+        )
+        self.assertEqual(response.data['data'][0]['id'], self.napa.pk)
+
+        response = self.client.get('/products/typeahead/', {'q': 'om'})
+        self.assertEqual(
+            [(d['name'], d['type']) for d in response.data['data']], [('Omeprazole', 'generic'), ('Omidon', 'product')]
+        )
+        response = self.client.get('/products/typeahead/', {'q': 'om', 'type': 'generic'})
+        self.assertEqual([d['name'] for d in response.data['data']], ['Omeprazole'])
+        # The inactive "Old Ace" is not offered
+        response = self.client.get('/products/typeahead/', {'q': 'old'})
+        self.assertEqual(response.data['data'], [])
+
+    def test_typeahead_limit(self):
+        response = self.client.get('/products/typeahead/', {'q': 'napa', 'limit': '1'})
+        self.assertEqual(len(response.data['data']), 1)
+        # Limits above the maximum are capped, not rejected
+        response = self.client.get('/products/typeahead/', {'q': 'n', 'limit': '1000'})
+        self.assertEqual([d['name'] for d in response.data['data']], ['Napa'])
+        for value in ('0', '-3', 'ten'):
+            response = self.client.get('/products/typeahead/', {'q': 'napa', 'limit': value})
+            self.assertEqual(response.status_code, 400, value)
+        self.assertEqual(self.client.get('/products/typeahead/', {'q': 'napa', 'type': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/products/typeahead/', {'q': ' '}).status_code, 400)
+
+    def test_products_by_ids(self):
+        missing = self.seclo.pk + 1000
+        ids = f'{self.seclo.pk},{self.napa.pk}, {self.seclo.pk},{missing}'
+        response = self.client.get('/products/products/', {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['product_name'] for p in response.data['data']], ['Seclo', 'Napa'])
+        self.assertEqual(response.data['missing_ids'], [missing])
+
+        response = self.client.post(
+            '/products/products/batch/', {'ids': [self.ace.pk, self.napa.pk, missing]}, format='json'
+        )
+        self.assertEqual([p['product_name'] for p in response.data['data']], ['Ace', 'Napa'])
+        self.assertEqual(response.data['missing_ids'], [missing])
+
+        too_many = ','.join(str(pk) for pk in range(1, 502))
+        for value in ('1,abc', '1.5', '', ' , ', too_many):
+            response = self.client.get('/products/products/', {'ids': value})
+            self.assertEqual(response.status_code, 400, value)
+        response = self.client.post('/products/products/batch/', {'ids': {'a': 1}}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def export_price_list(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/products/price_list/', params)
+            content = b''.join(response.streaming_content).decode()
+        return response, list(csv.reader(io.StringIO(content))), len(ctx.captured_queries)
+
+    def test_price_list_export(self):
+        response, rows, queries = self.export_price_list()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertEqual(rows[0], [
+            'SKU', 'Product', 'Generic Name', 'Company', 'Categories', 'MRP', 'Selling Price',
+            'Discount %', 'Stock', 'Quantity Per Box', 'Active',
+        ])
+        self.seclo.refresh_from_db()
+        # Grouped by company, inactive products left out
+        self.assertEqual([row[1] for row in rows[1:]], ['Napa', 'Ace', 'Seclo'])
+        self.assertEqual(rows[3], [
+            self.seclo.sku, 'Seclo', 'Omeprazole', 'Square Pharma', 'Capsule; Tablet', '51.00', '50.00',
+            str(self.seclo.discount_percent), '5', str(self.seclo.quantity_per_box), 'yes',
+        ])
+
+        for i in range(20):
+            self.product(f'Fexo {i}', self.beximco, None, [self.tablet, self.capsule], 30)
+        response, rows, more_queries = self.export_price_list()
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(more_queries, queries)
+
+        _, rows, _ = self.export_price_list(company=self.square.pk)
+        self.assertEqual([row[1] for row in rows[1:]], ['Ace', 'Seclo'])
+
+    def test_product_search_falls_back_to_fuzzy_matches(self):
+        response = self.client.get('/products/products/search/', {'q': 'sec'})
+        self.assertFalse(response.data['fuzzy'])
+        self.assertEqual([p['product_name'] for p in response.data['data']], ['Seclo'])
+
+        response = self.client.get('/products/products/search/', {'q': 'paracetmol'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['fuzzy'])
+        # Matched through their generic name; the inactive product is left out
+        self.assertEqual(sorted(p['product_name'] for p in response.data['data']), ['Ace', 'Napa'])
+
+        response = self.client.get('/products/products/search/', {'q': 'secol', 'max_distance': '0'})
+        self.assertEqual(response.data['data'], [])
+        response = self.client.get('/products/products/search/', {'q': 'secol', 'max_distance': '2'})
+        self.assertEqual([p['product_name'] for p in response.data['data']], ['Seclo'])
+
+    def test_product_search_rejects_bad_max_distance(self):
+        for value in ('-1', 'abc', '1.5'):
+            response = self.client.get('/products/products/search/', {'q': 'napa', 'max_distance': value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+class CategoryListingTests(TestCase):
+
+    def setUp(self):
+        self.tablet = Category.objects.create(name='Tablet')
+        self.syrup = Category.objects.create(name='Syrup')
+        category_listing.rebuild()
+
+    def add(self, name, *categories):
+        product = Product.objects.create(product_name=name, mrp=10)
+        product.category_id.set(categories)
+        return product
+
+    def test_signals_keep_the_listing_current(self):
+        napa = self.add('Napa', self.tablet)
+        ace = self.add('Ace', self.tablet, self.syrup)
+        self.assertEqual(category_listing.product_ids(self.tablet.pk), [ace.pk, napa.pk])
+
+        napa.product_name = 'Aa'  # renames move the product within its categories
+        napa.save()
+        self.assertEqual(category_listing.product_ids(self.tablet.pk), [napa.pk, ace.pk])
+
+        ace.category_id.remove(self.tablet)
+        self.assertEqual(category_listing.product_ids(self.tablet.pk), [napa.pk])
+        self.syrup.products.add(napa)
+        self.assertEqual(category_listing.product_ids(self.syrup.pk), [napa.pk, ace.pk])
+
+        ace.is_active = False
+        ace.save()
+        self.assertEqual(category_listing.product_ids(self.syrup.pk), [napa.pk])
+        napa.delete()
+        self.assertEqual(category_listing.previews(5), [])
+
+        cough = Category.objects.create(name='Cough')
+        self.assertEqual(category_listing.category_name(cough.pk), 'Cough')
+        self.syrup.delete()
+        self.assertFalse(category_listing.has_category(self.syrup.pk))
+
+    def test_updates_during_a_rebuild_are_kept(self):
+        listing = CategoryListing()
+        listing.rebuild()
+        load = CategoryListing._load
+
+        def load_then_write(staged):
+            load(staged)
+            product = Product.objects.create(product_name='Napa', mrp=10)
+            listing.index_product(product)
+            listing.link(product.pk, {self.tablet.pk})
+
+        with mock.patch.object(CategoryListing, '_load', load_then_write):
+            listing.rebuild()
+        self.assertEqual(len(listing.product_ids(self.tablet.pk)), 1)
+        self.assertIsNone(listing.pending)
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def test_identical_uploads_share_a_blob(self):
+        first = default_storage.save('banner_images/a.PNG', ContentFile(b'same bytes'))
+        second = default_storage.save('product_images/b.png', ContentFile(b'same bytes'))
+        other = default_storage.save('product_images/a.png', ContentFile(b'other bytes'))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertNotEqual(first, other)
+        with default_storage.open(first) as f:
+            self.assertEqual(f.read(), b'same bytes')
+
+    def test_delete_keeps_blobs(self):
+        blob = default_storage.save('a.png', ContentFile(b'shared'))
+        default_storage.delete(blob)
+        self.assertTrue(default_storage.exists(blob))
+
+        legacy = os.path.join(settings.MEDIA_ROOT, 'product_images', 'legacy.png')
+        os.makedirs(os.path.dirname(legacy))
+        with open(legacy, 'wb') as f:
+            f.write(b'legacy')
+        default_storage.delete('product_images/legacy.png')
+        self.assertFalse(os.path.exists(legacy))
+
+    def test_garbage_collection_age_and_references(self):
+        def old(name):
+            past = time.time() - 7200
+            os.utime(default_storage.path(name), (past, past))
+            return name
+
+        referenced = old(default_storage.save('a.png', ContentFile(b'in use')))
+        BannerImages.objects.filter(pk=BannerImages.objects.create(name='Sale').pk).update(image=referenced)
+        orphan = old(default_storage.save('b.png', ContentFile(b'orphan')))
+        reused = old(default_storage.save('c.png', ContentFile(b'reused')))
+        recent = default_storage.save('d.png', ContentFile(b'recent'))
+        # A new upload of an old orphan's content makes it recent again
+        self.assertEqual(default_storage.save('e.png', ContentFile(b'reused')), reused)
+
+        call_command('dedupe_media', '--min-age', '3600', stdout=io.StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        for name in (referenced, reused, recent):
+            self.assertTrue(default_storage.exists(name), name)
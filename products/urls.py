@@ -4,20 +4,28 @@ from .views import *
 urlpatterns = [
     path('products/', ProductView.as_view(), name='product_list'),
     path('products/<int:pk>/', ProductView.as_view(), name='product_detail'),
+    path('products/batch/', ProductBatchView.as_view(), name='product_batch'),
+    path('products/<int:pk>/stock/', ProductStockView.as_view(), name='product_stock'),
 
     path('all_products/', AllProductView.as_view(), name='all_product_list'),
     path('all_products/<int:pk>/', AllProductView.as_view(), name='all_product_detail'),
 
     path('product_names/', ProductNameListView.as_view(), name='product_names'),
+    path('typeahead/', TypeaheadView.as_view(), name='typeahead'),
 
 
     path('products/category/', CategoryWiseProductView.as_view(), name='product_detail_category'),
     path('products/category/<int:pk>/', CategoryWiseProductView.as_view(), name='product_detail_category'),
 
     path('products/search/', ProductSearchView.as_view(), name='product_search'),
+    path('search/', FacetedProductSearchView.as_view(), name='faceted_product_search'),
     path('search/by_companies/', CompanyProductSearchView.as_view(), name='company_product_search'),
     path('search/by_generic_name/', GenericNameProductSearchView.as_view(), name='generic_name_wise_product_search'),
 
+    path('price_list/', PriceListExportView.as_view(), name='price_list_export'),
+    path('sync/', CatalogSyncView.as_view(), name='catalog_sync'),
+    path('catalog_snapshot/', CatalogSnapshotView.as_view(), name='catalog_snapshot'),
+
     path('companies/', CompanyView.as_view(), name='company_list'),
     path('companies/<int:pk>/', CompanyView.as_view(), name='company_detail'),
 
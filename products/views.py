@@ -1,17 +1,32 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Product,Company,Category
+from .models import Product,Company,Category,StockBatch
 from .serializers import ProductSerializer,CompanySerializer,CategorySerializer
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Prefetch
-from django.db.models import Q
 from rest_framework.pagination import PageNumberPagination
+from django.db.models import Prefetch
+from django.db.models import Q, F, Value, Count, CharField, Sum
+from decimal import Decimal, InvalidOperation
+from script.pagination import KeysetPageNumberPagination
 from functools import reduce
 from operator import or_
-
-
-class ProductPagination(PageNumberPagination):
+from .listing import category_listing
+from .search import search_engine, products_in_order
+from script.streaming import streaming_csv_response, streaming_json_response, streaming_json_rows_response
+from .fastpath import product_rows
+from .batches import cancel_batch, confirm_batch, stage_line, stage_lines
+from .stock import stock_at
+from .sync import catalog_changes, delta_available
+from .snapshot import current_snapshot, snapshot_scheduler, snapshot_storage
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
+import gzip
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+
+class ProductPagination(KeysetPageNumberPagination):
     page_size = 10  # default page size
     page_size_query_param = 'page_size'  # let client override page size using ?page_size=
     max_page_size = 500
@@ -19,12 +34,14 @@ class ProductPagination(PageNumberPagination):
 class AllProductView(APIView):
     permission_classes = [IsAuthenticated]
     pagination_class = ProductPagination()
+    export_chunk_size = 500
 
     def get(self, request, pk=None):
+        fields = ProductSerializer.selected_fields(request)
         if pk:
             try:
-                product = Product.objects.get(pk=pk)
-                serializer = ProductSerializer(product)
+                product = ProductSerializer.prepare_queryset(Product.objects.all(), fields).get(pk=pk)
+                serializer = ProductSerializer(product, context={'fields': fields})
                 return Response({"status": "success", "data": serializer.data}, status=status.HTTP_200_OK)
             except Product.DoesNotExist:
                 return Response({"status": "error", "message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -32,47 +49,94 @@ class AllProductView(APIView):
         user = request.user
         if user.is_superuser:
             products = Product.objects.all().order_by('-created_on')
-            total_products = Product.objects.all().count()
         else:
             products = Product.objects.filter(is_active=True).order_by('product_name')
-            total_products = Product.objects.filter(is_active=True).count()
-            
-        
+        products = ProductSerializer.prepare_queryset(products, fields)
+
+        # Full-catalog export: stream the whole queryset in chunks instead of paginating
+        if request.query_params.get('export') == 'all':
+            return streaming_json_rows_response(
+                product_rows(products, {'fields': fields}, chunk_size=self.export_chunk_size),
+                envelope={"status": "success", "total_products": products.count()},
+                chunk_size=self.export_chunk_size,
+            )
+
         # Apply pagination
         paginator = self.pagination_class
         paginated_products = paginator.paginate_queryset(products, request)
 
-        serializer = ProductSerializer(products, many=True)
+        serializer = ProductSerializer(paginated_products, many=True, context={'fields': fields})
+        response = {"status": "success"}
+        total_products = paginator.get_total_count(products)
+        if total_products is not None:  # cursor pages after the first skip the COUNT(*)
+            response["total_products"] = total_products
+        response["data"] = serializer.data
         # Return paginated response
-        return paginator.get_paginated_response({
-            "status": "success",
-            "total_products": total_products,
-            "data": serializer.data
-        })
+        return paginator.get_paginated_response(response)
+
+MAX_BATCH_IDS = 500
+
+
+def product_batch_response(raw_ids):
+    """
+    Serialize many products by id in one query plan, keeping the requested
+    order and reporting ids that do not exist.
+    """
+    if isinstance(raw_ids, str):
+        raw_ids = raw_ids.split(',')
+    try:
+        ids = list(dict.fromkeys(int(str(v).strip()) for v in raw_ids if str(v).strip()))
+    except (TypeError, ValueError):
+        return Response(
+            {"status": "error", "message": "'ids' must be a list of integer product ids."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not ids:
+        return Response({"status": "error", "message": "'ids' is required."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) > MAX_BATCH_IDS:
+        return Response(
+            {"status": "error", "message": f"At most {MAX_BATCH_IDS} ids can be requested at once."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    products = products_in_order(ids)
+    found = {product.pk for product in products}
+    serializer = ProductSerializer(products, many=True)
+    return Response({
+        "status": "success",
+        "data": serializer.data,
+        "missing_ids": [pid for pid in ids if pid not in found],
+    }, status=status.HTTP_200_OK)
+
 
 class ProductView(APIView):
     permission_classes = [IsAuthenticated]
     pagination_class = ProductPagination()
 
     def get(self, request, pk=None):
+        ids = request.query_params.get('ids')
+        if ids is not None and not pk:
+            return product_batch_response(ids)
         src = request.query_params.get('src')
         if src:
-            # Filter product by name
-            product = Product.objects.filter(product_name__istartswith=src)
-            if not product:
-                product = Product.objects.filter(product_name__icontains=src)
-            # Apply pagination
+            # Filter product by name: prefix matches first, substring as fallback
+            product_ids = search_engine.search_products(src, active_only=False, prefix_only=True)
+            if not product_ids:
+                product_ids = search_engine.search_products(src, active_only=False)
+            # Apply pagination on the ids, then load only the current page
             paginator = self.pagination_class
-            paginated_product = paginator.paginate_queryset(product, request)
+            paginated_ids = paginator.paginate_queryset(product_ids, request)
+            paginated_product = products_in_order(paginated_ids)
             serializer = ProductSerializer(paginated_product, many=True)
             return paginator.get_paginated_response({
                 "status": "success",
                 "data": serializer.data
             })
+        fields = ProductSerializer.selected_fields(request)
         if pk:
             try:
-                product = Product.objects.get(pk=pk)
-                serializer = ProductSerializer(product)
+                product = ProductSerializer.prepare_queryset(Product.objects.all(), fields).get(pk=pk)
+                serializer = ProductSerializer(product, context={'fields': fields})
                 return Response({"status": "success", "data": serializer.data}, status=status.HTTP_200_OK)
             except Product.DoesNotExist:
                 return Response({"status": "error", "message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -80,23 +144,23 @@ class ProductView(APIView):
         user = request.user
         if user.is_superuser:
             products = Product.objects.all().order_by('-created_on')
-            total_products = Product.objects.all().count()
         else:
             products = Product.objects.filter(is_active=True).order_by('product_name')
-            total_products = Product.objects.filter(is_active=True).count()
+        products = ProductSerializer.prepare_queryset(products, fields)
             
         
         # Apply pagination
         paginator = self.pagination_class
         paginated_products = paginator.paginate_queryset(products, request)
 
-        serializer = ProductSerializer(paginated_products, many=True)
+        serializer = ProductSerializer(paginated_products, many=True, context={'fields': fields})
+        response = {"status": "success"}
+        total_products = paginator.get_total_count(products)
+        if total_products is not None:  # cursor pages after the first skip the COUNT(*)
+            response["total_products"] = total_products
+        response["data"] = serializer.data
         # Return paginated response
-        return paginator.get_paginated_response({
-            "status": "success",
-            "total_products": total_products,
-            "data": serializer.data
-        })
+        return paginator.get_paginated_response(response)
 
     def post(self, request):
         serializer = ProductSerializer(data=request.data)
@@ -124,6 +188,21 @@ class ProductView(APIView):
         except Product.DoesNotExist:
             return Response({"status": "error", "message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
+class ProductBatchView(APIView):
+    """
+    POST variant of ``products/?ids=`` for id lists too long for a query string.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ids = request.data.get('ids', [])
+        if not isinstance(ids, (list, str)):
+            return Response(
+                {"status": "error", "message": "'ids' must be a list of integer product ids."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return product_batch_response(ids)
+
 class ProductNameListView(APIView):
     def get(self, request):
         # Get all product names as a list
@@ -140,54 +219,111 @@ class GenericNameListView(APIView):
         )
         return Response({"status": "success", "data": generic_names}, status=status.HTTP_200_OK)
 
+class TypeaheadView(APIView):
+    """
+    Top-k name completions for a prefix, served from the in-memory prefix
+    index instead of shipping the whole name list to the client.
+    """
+    max_limit = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        if not query.strip():
+            return Response(
+                {"status": "error", "message": "Query parameter 'q' is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.max_limit)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"status": "error", "message": "Query parameter 'limit' must be a positive integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        kind = request.query_params.get('type', 'all')
+        if kind not in ('all', 'product', 'generic'):
+            return Response(
+                {"status": "error", "message": "Query parameter 'type' must be one of: all, product, generic."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = []
+        if kind in ('all', 'product'):
+            data += [
+                {"id": pid, "name": name, "type": "product"}
+                for pid, name in search_engine.complete_products(query, limit)
+            ]
+        if kind in ('all', 'generic'):
+            data += [
+                {"id": gid, "name": name, "type": "generic"}
+                for gid, name in search_engine.complete_generics(query, limit)
+            ]
+        if kind == 'all':
+            data = sorted(data, key=lambda d: d["name"].casefold())[:limit]
+
+        return Response({"status": "success", "query": query, "data": data}, status=status.HTTP_200_OK)
+
 class CategoryWiseProductView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = ProductPagination()
+    preview_size = 7  # products shown per category on the grouped listing
+    max_preview_size = 50
 
     def get(self, request, pk=None):
         """
-        Fetch products by category or group products by all categories.
+        Page through the products of one category, or list every category
+        with a capped preview of its products.
         """
         try:
             if pk:
-                # Fetch products for a specific category using `category_id`
-                category = Category.objects.get(category_id=pk)  # Use category_id explicitly
-                products = category.products.filter(is_active=True).order_by('product_name')
-                serializer = ProductSerializer(products, many=True)
-                return Response({
+                # Products of a specific category, paginated from the materialized listing
+                if not category_listing.has_category(pk):
+                    raise Category.DoesNotExist
+                product_ids = category_listing.product_ids(pk)
+                paginator = self.pagination_class
+                paginated_ids = paginator.paginate_queryset(product_ids, request)
+                serializer = ProductSerializer(products_in_order(paginated_ids), many=True)
+                return paginator.get_paginated_response({
                     "status": "success",
                     "category": {
-                        "category_id": category.category_id,
-                        "name": category.name
+                        "category_id": pk,
+                        "name": category_listing.category_name(pk)
                     },
+                    "total_products": len(product_ids),
                     "data": serializer.data
-                }, status=status.HTTP_200_OK)
-
-            # Fetch products grouped by category
-            categories = Category.objects.prefetch_related(
-                Prefetch(
-                    'products',
-                    queryset=Product.objects.filter(is_active=True).order_by('product_name'),
-                    to_attr='active_products'
-                )
-            )
-            
-            preferred_order = ["Tablet", "Capsule"]
+                })
 
-            # First, categories that match preferred order
-            ordered_categories = sorted(
-                categories,
-                key=lambda c: (preferred_order.index(c.name) if c.name in preferred_order else len(preferred_order), c.name)
-            )
+            try:
+                preview_size = int(request.query_params.get('preview', self.preview_size))
+            except ValueError:
+                preview_size = -1
+            if preview_size < 0:
+                return Response(
+                    {"status": "error", "message": "Query parameter 'preview' must be a non-negative integer."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            preview_size = min(preview_size, self.max_preview_size)
+
+            # Capped preview per category, hydrated in a single query
+            previews = category_listing.previews(preview_size)
+            product_ids = list(dict.fromkeys(pid for *_, ids in previews for pid in ids))
+            products = {p.pk: p for p in products_in_order(product_ids)}
+            data = {
+                item["product_id"]: item
+                for item in ProductSerializer(list(products.values()), many=True).data
+            }
 
             result = []
-            for category in ordered_categories:
-                if hasattr(category, 'active_products') and category.active_products:
-                    result.append({
-                        "category_id": category.category_id,  # Use category_id explicitly
-                        "category_name": category.name,
-                        "products": ProductSerializer(category.active_products, many=True).data
-                        # "products": ProductSerializer(category.active_products[:7], many=True).data
-                    })
+            for category_id, name, total, ids in previews:
+                result.append({
+                    "category_id": category_id,
+                    "category_name": name,
+                    "total_products": total,
+                    "products": [data[pid] for pid in ids if pid in data]
+                })
 
             return Response({"status": "success", "data": result}, status=status.HTTP_200_OK)
 
@@ -199,10 +335,14 @@ class CategoryWiseProductView(APIView):
 
 class ProductSearchView(APIView):
     permission_classes = [IsAuthenticated]
+    fuzzy_limit = 50  # nearest matches returned by the typo-tolerant fallback
+    max_fuzzy_distance = 3
 
     def get(self, request):
         """
-        Search for products by product name or company name.
+        Search for products by product name. When nothing contains the query
+        (or ``fuzzy=true`` is sent) fall back to typo-tolerant matching on
+        product and generic names, nearest first.
         """
         query = request.query_params.get('q', '')  # Get the search query from request
         if not query:
@@ -210,17 +350,30 @@ class ProductSearchView(APIView):
                 {"status": "error", "message": "Query parameter 'q' is required."},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        force_fuzzy = request.query_params.get('fuzzy', '').lower() in ('1', 'true', 'yes')
+        max_distance = request.query_params.get('max_distance')
+        try:
+            max_distance = None if max_distance is None else min(int(max_distance), self.max_fuzzy_distance)
+            if max_distance is not None and max_distance < 0:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"status": "error", "message": "Query parameter 'max_distance' must be a non-negative integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         try:
-            # Search for products by product name or company name
-            products = Product.objects.filter(
-                Q(product_name__icontains=query)
-            ).filter(is_active=True).distinct()
+            # Search for products by product name, best matches first
+            product_ids = [] if force_fuzzy else search_engine.search_products(query)
+            fuzzy = not product_ids
+            if fuzzy:
+                product_ids = search_engine.fuzzy_search_products(query, max_distance)[:self.fuzzy_limit]
+            products = products_in_order(product_ids, Product.objects.filter(is_active=True))
 
             # Serialize the results
             serializer = ProductSerializer(products, many=True)
             return Response(
-                {"status": "success", "query": query, "data": serializer.data},
+                {"status": "success", "query": query, "fuzzy": fuzzy, "data": serializer.data},
                 status=status.HTTP_200_OK
             )
 
@@ -254,28 +407,23 @@ class CompanyProductSearchView(APIView):
 
         try:
             # Partial match (case-insensitive) for multiple names
-            from functools import reduce
-            from operator import or_
-            filters = reduce(or_, [Q(company_name__icontains=name) for name in company_names])
-            companies = Company.objects.filter(filters)
+            company_ids = search_engine.search_companies(company_names)
 
-            if not companies.exists():
+            if not company_ids:
                 return Response(
                     {"status": "success", "message": "No companies found.", "data": []},
                     status=status.HTTP_200_OK
                 )
 
-            products = Product.objects.filter(
-                company_id__in=companies,
-                is_active=True
-            ).distinct()
+            product_ids = search_engine.products_for_companies(company_ids)
+            products = products_in_order(product_ids, Product.objects.filter(is_active=True))
 
             serializer = ProductSerializer(products, many=True)
             return Response(
                 {
                     "status": "success",
                     "selected_companies": company_names,
-                    "total_products": products.count(),
+                    "total_products": len(products),
                     "data": serializer.data
                 },
                 status=status.HTTP_200_OK
@@ -312,26 +460,23 @@ class GenericNameProductSearchView(APIView):
 
         try:
             # Partial match (case-insensitive) for multiple generic names
-            filters = reduce(or_, [Q(name__icontains=name) for name in generic_names])
-            generics = GenericName.objects.filter(filters)
+            generic_ids = search_engine.search_generics(generic_names)
 
-            if not generics.exists():
+            if not generic_ids:
                 return Response(
                     {"status": "success", "message": "No generic names found.", "data": []},
                     status=status.HTTP_200_OK
                 )
 
-            products = Product.objects.filter(
-                generic_name__in=generics,
-                is_active=True
-            ).distinct()
+            product_ids = search_engine.products_for_generics(generic_ids)
+            products = products_in_order(product_ids, Product.objects.filter(is_active=True))
 
             serializer = ProductSerializer(products, many=True)
             return Response(
                 {
                     "status": "success",
                     "selected_generic_names": generic_names,
-                    "total_products": products.count(),
+                    "total_products": len(products),
                     "data": serializer.data
                 },
                 status=status.HTTP_200_OK
@@ -343,6 +488,317 @@ class GenericNameProductSearchView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class FacetedProductSearchView(APIView):
+    """
+    One catalog search endpoint: free text plus company, generic, category,
+    price, discount and stock filters, returning a page of products and the
+    company/category/generic facet counts for the whole result set.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = ProductPagination()
+
+    def get(self, request):
+        try:
+            filters = self.parse_filters(request.query_params)
+        except ValueError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = self.apply_filters(Product.objects.filter(is_active=True), filters)
+
+        paginator = self.pagination_class
+        paginated_products = paginator.paginate_queryset(
+            ProductSerializer.prepare_queryset(products.order_by('product_name')), request
+        )
+        serializer = ProductSerializer(paginated_products, many=True)
+        return paginator.get_paginated_response({
+            "status": "success",
+            "facets": self.facet_counts(products),
+            "data": serializer.data
+        })
+
+    @staticmethod
+    def apply_filters(products, filters):
+        if filters['q']:
+            products = products.filter(pk__in=search_engine.search_products(filters['q']))
+        if filters['company']:
+            products = products.filter(company_id__in=filters['company'])
+        if filters['generic']:
+            products = products.filter(generic_name__in=filters['generic'])
+        if filters['category']:
+            products = products.filter(
+                pk__in=Product.category_id.through.objects.filter(
+                    category_id__in=filters['category']
+                ).values('product_id')
+            )
+        if filters['min_price'] is not None:
+            products = products.filter(selling_price__gte=filters['min_price'])
+        if filters['max_price'] is not None:
+            products = products.filter(selling_price__lte=filters['max_price'])
+        if filters['min_discount'] is not None:
+            products = products.filter(discount_percent__gte=filters['min_discount'])
+        if filters['in_stock']:
+            products = products.filter(stock_quantity__gt=0, out_of_stock=False)
+        return products
+
+    @staticmethod
+    def parse_filters(params):
+        def id_list(name):
+            raw = params.get(name, '')
+            try:
+                return [int(v) for v in raw.split(',') if v.strip()]
+            except ValueError:
+                raise ValueError(f"Query parameter '{name}' must be a comma-separated list of ids.")
+
+        def number(name):
+            raw = params.get(name)
+            if raw in (None, ''):
+                return None
+            try:
+                value = Decimal(raw)
+            except InvalidOperation:
+                value = None
+            if value is None or not value.is_finite():
+                raise ValueError(f"Query parameter '{name}' must be a number.")
+            return value
+
+        return {
+            'q': params.get('q', '').strip(),
+            'company': id_list('company'),
+            'generic': id_list('generic'),
+            'category': id_list('category'),
+            'min_price': number('min_price'),
+            'max_price': number('max_price'),
+            'min_discount': number('min_discount'),
+            'in_stock': params.get('in_stock', '').lower() in ('1', 'true', 'yes'),
+        }
+
+    @staticmethod
+    def facet_counts(products):
+        """
+        Count matching products per company, category and generic name with a
+        single UNION ALL of three GROUP BY queries.
+        """
+        matched = Product.objects.filter(pk__in=products.values('pk')).order_by()
+
+        def facet(name, key, label):
+            return matched.filter(**{f'{key}__isnull': False}).values(
+                facet=Value(name, output_field=CharField()),
+                key=F(key),
+                label=F(label),
+            ).annotate(count=Count('pk', distinct=True)).values_list('facet', 'key', 'label', 'count')
+
+        rows = facet('companies', 'company_id', 'company_id__company_name').union(
+            facet('categories', 'category_id', 'category_id__name'),
+            facet('generics', 'generic_name', 'generic_name__name'),
+            all=True,
+        )
+
+        facets = {'companies': [], 'categories': [], 'generics': []}
+        for name, key, label, count in rows:
+            facets[name].append({"id": key, "name": label, "count": count})
+        for values in facets.values():
+            values.sort(key=lambda f: (-f["count"], f["name"]))
+        return facets
+
+
+class PriceListExportView(APIView):
+    """
+    Price list as a streamed CSV, grouped by company. Accepts the filters of
+    ``FacetedProductSearchView`` plus ``active`` (true, false or all; staff only).
+    """
+    permission_classes = [IsAuthenticated]
+    chunk_size = 2000
+    header = [
+        "SKU", "Product", "Generic Name", "Company", "Categories", "MRP", "Selling Price",
+        "Discount %", "Stock", "Quantity Per Box", "Active",
+    ]
+
+    def get(self, request):
+        try:
+            filters = FacetedProductSearchView.parse_filters(request.query_params)
+        except ValueError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        active = request.query_params.get('active', 'true').lower()
+        if active not in ('true', 'false', 'all'):
+            return Response(
+                {"status": "error", "message": "Query parameter 'active' must be true, false or all."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        products = Product.objects.all()
+        if active == 'true' or not request.user.is_superuser:
+            products = products.filter(is_active=True)
+        elif active == 'false':
+            products = products.filter(is_active=False)
+        products = FacetedProductSearchView.apply_filters(products, filters)
+
+        rows = products.order_by('company_id__company_name', 'product_name', 'pk').values_list(
+            'pk', 'sku', 'product_name', 'generic_name__name', 'company_id__company_name',
+            'mrp', 'selling_price', 'discount_percent', 'stock_quantity', 'quantity_per_box', 'is_active',
+        )
+        filename = f"price_list_{timezone.localdate():%Y%m%d}.csv"
+        return streaming_csv_response(self.header, self.price_list_rows(rows), filename)
+
+    def price_list_rows(self, rows):
+        # Categories are many-to-many: look them up once per chunk of rows
+        # instead of joining them in (which would repeat every product).
+        Link = Product.category_id.through
+        chunk = []
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield from self.with_categories(Link, chunk)
+                chunk = []
+        if chunk:
+            yield from self.with_categories(Link, chunk)
+
+    @staticmethod
+    def with_categories(Link, chunk):
+        categories = {}
+        links = Link.objects.filter(product_id__in=[row[0] for row in chunk]).order_by('category__name')
+        for product_id, name in links.values_list('product_id', 'category__name'):
+            categories.setdefault(product_id, []).append(name)
+        for pk, sku, name, generic, company, mrp, selling_price, discount, stock, per_box, is_active in chunk:
+            yield [
+                sku, name, generic or "", company or "", "; ".join(categories.get(pk, [])),
+                mrp, selling_price, discount, stock, per_box, "yes" if is_active else "no",
+            ]
+
+
+class ProductStockView(APIView):
+    """
+    A product's stock at ``?at=<ISO datetime>`` (default: now), computed from
+    the stock ledger, next to the current stock counter.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            product = Product.objects.only('pk', 'stock_quantity').get(pk=pk)
+        except Product.DoesNotExist:
+            return Response({"status": "error", "message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        at = timezone.now()
+        raw_at = request.query_params.get('at')
+        if raw_at:
+            at = parse_datetime(raw_at)
+            if at is None:
+                return Response(
+                    {"status": "error", "message": "Query parameter 'at' must be an ISO 8601 datetime."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+
+        return Response({"status": "success", "data": {
+            "product_id": product.pk,
+            "at": at,
+            "stock": stock_at(at, [product.pk]).get(product.pk, 0),
+            "current_stock": product.stock_quantity,
+        }}, status=status.HTTP_200_OK)
+
+
+class CatalogSyncView(APIView):
+    """
+    Delta sync for mobile clients: rows changed since ``?updated_since=``
+    (the ``cursor`` returned by the previous sync) plus tombstones for rows
+    deleted or deactivated since then. Without ``updated_since``, or when it
+    is older than the tombstones kept, the whole active catalog is returned.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        since = None
+        raw_since = request.query_params.get('updated_since')
+        if raw_since:
+            since = parse_datetime(raw_since)
+            if since is None:
+                return Response(
+                    {"status": "error", "message": "Query parameter 'updated_since' must be an ISO 8601 datetime."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            if not delta_available(since):
+                since = None  # Tombstones that old are pruned: start over
+
+        cursor, data, deleted = catalog_changes(since)
+        return Response({
+            "status": "success",
+            "cursor": cursor,
+            "full": since is None,
+            "data": data,
+            "deleted": deleted,
+        }, status=status.HTTP_200_OK)
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an Accept-Encoding header allows gzip: listed with a q-value
+    above 0, or covered by ``*`` when gzip itself is not listed.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+class CatalogSnapshotView(APIView):
+    """
+    The prebuilt gzip catalog snapshot (see ``products/snapshot.py``), with
+    its version as a strong ETag: clients send it back in If-None-Match and
+    get a 304 while the catalog is unchanged, then switch to the delta sync
+    with the ``cursor`` inside the snapshot. While no snapshot exists yet a
+    build is started and clients get a 503 with Retry-After.
+    """
+    permission_classes = [IsAuthenticated]
+    chunk_size = 64 * 1024
+    retry_after = 30  # seconds
+
+    def get(self, request):
+        pointer = current_snapshot()
+        if pointer is None:
+            snapshot_scheduler.build_soon()
+            response = Response(
+                {"status": "error", "message": "The catalog snapshot is being built, try again later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response['Retry-After'] = str(self.retry_after)
+            return response
+        etag = f'"{pointer["version"]}"'
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        elif accepts_gzip(request.headers.get('Accept-Encoding', '')):
+            response = FileResponse(snapshot_storage.open(pointer['name'], 'rb'), content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = StreamingHttpResponse(self.decompressed(pointer['name']), content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    def decompressed(self, name):
+        with gzip.open(snapshot_storage.path(name), 'rb') as snapshot:
+            yield from iter(lambda: snapshot.read(self.chunk_size), b'')
+
+
 class CompanyView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -402,8 +858,9 @@ class CategoryView(APIView):
 
         categories = Category.objects.all().order_by('-created_on')
         total_categories = Category.objects.count()
-        serializer = CategorySerializer(categories, many=True)
-        return Response({"status": "success", "total_categories": total_categories, "data": serializer.data}, status=status.HTTP_200_OK)
+        return streaming_json_response(
+            categories, CategorySerializer, envelope={"status": "success", "total_categories": total_categories}
+        )
 
     def post(self, request):
         serializer = CategorySerializer(data=request.data)
@@ -445,8 +902,9 @@ class GenericView(APIView):
 
         generic_name = GenericName.objects.all().order_by('name')
         total_name = GenericName.objects.count()
-        serializer = GenericNameSerializer(generic_name, many=True)
-        return Response({"status": "success", "total_name": total_name, "data": serializer.data}, status=status.HTTP_200_OK)
+        return streaming_json_response(
+            generic_name, GenericNameSerializer, envelope={"status": "success", "total_name": total_name}
+        )
 
     def post(self, request):
         serializer = GenericNameSerializer(data=request.data)
@@ -516,29 +974,68 @@ class BannerImagesDetailView(APIView):
         return Response({'status':'success','message':'successfully delete'},status=status.HTTP_200_OK)
 
 
+MAX_STAGED_LINES = 1000
+
+
+def stage_lines_response(user, lines):
+    """
+    Validate and stage many lines at once: every product id is checked in one
+    query and nothing is staged unless every line is valid. Errors are
+    reported per line, in request order.
+    """
+    if not isinstance(lines, list) or not lines:
+        return Response({"status": "error", "message": "'lines' must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(lines) > MAX_STAGED_LINES:
+        return Response(
+            {"status": "error", "message": f"At most {MAX_STAGED_LINES} lines can be staged at once."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    validated, errors = [], []
+    for line in lines:
+        serializer = StagedLineSerializer(data=line)
+        valid = serializer.is_valid()
+        validated.append(serializer.validated_data if valid else None)
+        errors.append({} if valid else dict(serializer.errors))
+
+    product_ids = {values['product_id'] for values in validated if values}
+    existing = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+    for values, line_errors in zip(validated, errors):
+        if values and values['product_id'] not in existing:
+            line_errors['product_id'] = ["Product not found."]
+    if any(errors):
+        return Response({"status": "error", "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    temps = stage_lines(user, validated)
+    return Response(
+        {
+            "message": f"{len(temps)} products staged successfully",
+            "batch_id": str(temps[0].batch_id),
+            "temp_ids": [temp.id for temp in temps],
+        },
+        status=status.HTTP_201_CREATED,
+    )
+
+
 class AddProductToBatch(APIView):
     def post(self, request):
+        if "lines" in request.data:
+            # Multi-line staging: {"lines": [{"product_id": ..., ...}, ...]}
+            return stage_lines_response(request.user, request.data["lines"])
+
         product_id = request.data.get("product_id")
         new_stock_quantity = request.data.get("new_stock_quantity", 0)
         new_cost_price = request.data.get("new_cost_price", 0)
         mrp = request.data.get("mrp", 0)
         new_selling_price = request.data.get("new_selling_price", 0)
-        batch_id = request.data.get("batch_id")  # If frontend sends it
         user = request.user  # assuming request.user is from UserAuth
 
-        # If no batch id sent, create a new one
-        check_batch = TempProduct.objects.filter(is_confirmed=False, user_id=user).first()
-        if check_batch:
-            batch_id = check_batch.batch_id
-        else:
-            batch_id = uuid.uuid4()
-
         product = get_object_or_404(Product, pk=product_id)
 
-        temp = TempProduct.objects.create(
-            batch_id=batch_id,
-            user_id=user,
-            product_id=product,
+        # Lines go into the user's open batch, which is created on the first add
+        temp = stage_line(
+            user,
+            product,
             new_stock_quantity=new_stock_quantity,
             new_cost_price=new_cost_price,
             new_selling_price=new_selling_price,
@@ -559,84 +1056,65 @@ class AddProductToBatch(APIView):
 
 
 
-class BatchSummary(APIView):
-    def get(self, request, batch_id):
-        updates = TempProduct.objects.filter(batch_id=batch_id, user_id=request.user, is_confirmed=False)
-
-        if not updates.exists():
-            return Response({"message": "No products in this batch"}, status=status.HTTP_404_NOT_FOUND)
-
-        total_value = sum([u.total_amount for u in updates])
-        data = [
-            {
-                "id": u.id,
-                "product": u.product_id.product_name,
-                "stock": u.new_stock_quantity,
-                "cost_price": str(u.new_cost_price),
-                "mrp": str(u.mrp),
-                "selling_price": str(u.new_selling_price),
-                "total": str(u.total_amount),
-            }
-            for u in updates
-        ]
-        return Response(
-            {
-                "batch_id": batch_id,
-                "products": data,
-                "total_products": updates.count(),
-                "total_value": str(total_value),
-            }
-        )
+class BatchLinePagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
 
 
+class BatchSummary(APIView):
+    pagination_class = BatchLinePagination()
+    confirmed = False
 
-class GetBatchSummary(APIView):
     def get(self, request, batch_id):
-        updates = TempProduct.objects.filter(batch_id=batch_id, user_id=request.user, is_confirmed=True)
+        updates = TempProduct.objects.filter(batch_id=batch_id, user_id=request.user, is_confirmed=self.confirmed)
 
-        if not updates.exists():
+        # Count and total in one query; the lines are paginated below
+        totals = updates.aggregate(total_products=Count('id'), total_value=Sum('total_amount'))
+        if not totals['total_products']:
             return Response({"message": "No products in this batch"}, status=status.HTTP_404_NOT_FOUND)
 
-        total_value = sum([u.total_amount for u in updates])
+        lines = updates.order_by('product_id__product_name', 'id').values_list(
+            'id', 'product_id__product_name', 'new_stock_quantity', 'new_cost_price', 'mrp',
+            'new_selling_price', 'total_amount',
+        )
+        paginator = self.pagination_class
+        page = paginator.paginate_queryset(lines, request)
         data = [
             {
-                "id": u.id,
-                "product": u.product_id.product_name,
-                "stock": u.new_stock_quantity,
-                "cost_price": str(u.new_cost_price),
-                "mrp": str(u.mrp),
-                "selling_price": str(u.new_selling_price),
-                "total": str(u.total_amount),
+                "id": line_id,
+                "product": product_name,
+                "stock": stock,
+                "cost_price": str(cost_price),
+                "mrp": str(mrp),
+                "selling_price": str(selling_price),
+                "total": str(total),
             }
-            for u in updates
+            for line_id, product_name, stock, cost_price, mrp, selling_price, total in page
         ]
-        return Response(
+        return paginator.get_paginated_response(
             {
                 "batch_id": batch_id,
                 "products": data,
-                "total_products": updates.count(),
-                "total_value": str(total_value),
+                "total_products": totals['total_products'],
+                "total_value": str(totals['total_value'].quantize(Decimal('0.01'))),
             }
         )
 
 
 
-class ConfirmBatch(APIView):
-    def post(self, request, batch_id):
-        updates = TempProduct.objects.filter(batch_id=batch_id, user_id=request.user, is_confirmed=False)
+class GetBatchSummary(BatchSummary):
+    confirmed = True
 
-        if not updates.exists():
-            return Response({"message": "No pending updates for this batch"}, status=status.HTTP_404_NOT_FOUND)
 
-        for update in updates:
-            product = update.product_id
-            product.stock_quantity += update.new_stock_quantity
-            product.cost_price = update.new_cost_price
-            product.selling_price = update.new_selling_price
-            product.save()
 
-            update.is_confirmed = True
-            update.save()
+class ConfirmBatch(APIView):
+    def post(self, request, batch_id):
+        if not confirm_batch(batch_id, request.user):
+            # Nothing pending: a retry of a confirm that already went through succeeds again
+            applied = TempProduct.objects.filter(batch_id=batch_id, user_id=request.user, is_confirmed=True)
+            if not applied.exists():
+                return Response({"message": "No pending updates for this batch"}, status=status.HTTP_404_NOT_FOUND)
 
         return Response({"message": f"Batch {batch_id} applied successfully"})
 
@@ -644,25 +1122,35 @@ class ConfirmBatch(APIView):
 
 class CancelBatch(APIView):
     def post(self, request, batch_id):
-        deleted_count, _ = TempProduct.objects.filter(batch_id=batch_id, user_id=request.user, is_confirmed=False).delete()
+        deleted_count = cancel_batch(batch_id, request.user)
         return Response({"message": f"Batch {batch_id} cancelled. {deleted_count} items removed."})
 
 
 
 
 
+class StockBatchPagination(KeysetPageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
 class UniqueBatchListAPIView(APIView):
-    def get(self, request):
-        # Get only distinct batch_id values
-        unique_batches = (
-            TempProduct.objects.values_list("batch_id", flat=True)
-            .distinct()
-        )
+    pagination_class = StockBatchPagination()
 
-        # Remove duplicates and keep them as list of dicts
-        unique_batches = [{"batch_id": bid} for bid in set(unique_batches)]
+    def get(self, request):
+        # Newest batches first, straight from the indexed header table
+        batches = StockBatch.objects.select_related('user_id').order_by('-created_on')
+        batch_status = request.query_params.get('status')
+        if batch_status:
+            batches = batches.filter(status=batch_status)
+        if request.query_params.get('mine') == 'true':
+            batches = batches.filter(user_id=request.user)
 
-        return Response(
-            {"status": "success", "data": unique_batches},
-            status=status.HTTP_200_OK,
-        )
+        paginator = self.pagination_class
+        paginated_batches = paginator.paginate_queryset(batches, request)
+        serializer = StockBatchSerializer(paginated_batches, many=True)
+        return paginator.get_paginated_response({
+            "status": "success",
+            "data": serializer.data
+        })
@@ -0,0 +1,139 @@
+"""
+Shared pagination classes.
+
+``KeysetPageNumberPagination`` behaves exactly like DRF's
+``PageNumberPagination`` unless the client opts in with
+``?pagination=cursor`` (or follows a ``cursor`` link). In that mode the page
+is fetched with a keyset ``WHERE (field, pk) > (value, last_pk)`` filter on
+the queryset's own ordering instead of ``COUNT(*)`` + ``OFFSET``, so a deep
+page costs the same as the first one. Views that report a total use
+``get_total_count``, which counts only on the first keyset page.
+"""
+import base64
+import json
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPageNumberPagination(PageNumberPagination):
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    cursor_page_size = 10  # used when page_size is None and none is requested
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = isinstance(queryset, QuerySet) and (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_keyset(queryset, request)
+
+    def get_total_count(self, queryset):
+        """
+        Row count of ``queryset`` for a response envelope, after
+        ``paginate_queryset``: the page paginator's own count in page mode; in
+        keyset mode it is counted on the first page only and later pages get
+        None.
+        """
+        if not self.keyset:
+            page = getattr(self, 'page', None)
+            return page.paginator.count if page is not None else queryset.count()
+        return queryset.count() if self.first_keyset_page else None
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.next_cursor_link,
+            'previous': self.previous_cursor_link,
+            'results': data,
+        })
+
+    # ------------------------------------------------------------------
+    # Keyset mode
+    # ------------------------------------------------------------------
+    def get_keyset_fields(self, queryset):
+        """
+        Return ``(field, pk_field, descending)`` for the queryset's leading
+        ordering; the primary key is always appended as a tie-breaker.
+        """
+        opts = queryset.model._meta
+        ordering = list(queryset.query.order_by) or list(opts.ordering)
+        leading = ordering[0] if ordering and isinstance(ordering[0], str) else '-pk'
+        descending = leading.startswith('-')
+        name = leading.lstrip('-')
+        field = opts.pk if name == 'pk' else opts.get_field(name)
+        return field, opts.pk, descending
+
+    def paginate_keyset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request) or self.cursor_page_size
+        field, pk_field, descending = self.get_keyset_fields(queryset)
+        position = self.decode_cursor(request, field, pk_field)
+        self.first_keyset_page = position is None
+        reverse = bool(position and position['previous'])
+
+        # Walking backwards is a forward walk with the ordering flipped.
+        walk_descending = descending != reverse
+        prefix = '-' if walk_descending else ''
+        order = [prefix + field.name] if field is not pk_field else []
+        queryset = queryset.order_by(*order, prefix + pk_field.name)
+
+        if position is not None:
+            lookup = 'lt' if walk_descending else 'gt'
+            value, pk = position['value'], position['pk']
+            if field is pk_field:
+                queryset = queryset.filter(**{f'{pk_field.name}__{lookup}': pk})
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{field.name}__{lookup}': value})
+                    | Q(**{field.name: value, f'{pk_field.name}__{lookup}': pk})
+                )
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        page = rows[:page_size]
+        if reverse:
+            page.reverse()
+
+        self.next_cursor_link = None
+        self.previous_cursor_link = None
+        if page:
+            if has_more or reverse:
+                self.next_cursor_link = self.encode_cursor(page[-1], field, pk_field, previous=False)
+            if (has_more and reverse) or (position is not None and not reverse):
+                self.previous_cursor_link = self.encode_cursor(page[0], field, pk_field, previous=True)
+        return page
+
+    def encode_cursor(self, obj, field, pk_field, previous):
+        payload = {
+            'v': field.value_to_string(obj),
+            'k': pk_field.value_to_string(obj),
+            'p': previous,
+        }
+        token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, field, pk_field):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(parse.unquote(token).encode()))
+            return {
+                'value': field.to_python(payload['v']),
+                'pk': pk_field.to_python(payload['k']),
+                'previous': bool(payload.get('p')),
+            }
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,67 @@
+"""
+Sparse fieldsets for list screens that only need a few fields.
+
+Clients pick fields with ``?fields=a,b`` or drop them with ``?exclude=a,b``.
+Views read the selection with ``selected_fields(request)``, hand it to the
+serializer as ``context['fields']`` and to ``prepare_queryset(queryset,
+fields)``, so unrequested ``SerializerMethodField``s and nested serializers
+never run and the joins/prefetches they need are skipped.
+
+``represent`` and ``file_value`` let the ``values()`` fast paths format raw
+columns with the serializers' own fields.
+"""
+from django.db.models.fields.files import FieldFile
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _split(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def requested(fields, *names):
+    """True if any of ``names`` is in the ``fields`` selection (None = all)."""
+    return fields is None or any(name in fields for name in names)
+
+
+class SparseFieldsetMixin:
+
+    @classmethod
+    def selected_fields(cls, request):
+        """
+        The set of field names selected by ``request``'s query string, or
+        None when every field is wanted. Unknown names are ignored.
+        """
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        only = _split(request.query_params.get('fields'))
+        exclude = _split(request.query_params.get('exclude'))
+        if not only and not exclude:
+            return None
+        return {name for name in cls.Meta.fields if (not only or name in only) and name not in exclude}
+
+    def _is_top_level(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('fields')
+        if selected is None or not self._is_top_level():
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+
+def represent(field, value):
+    """
+    ``field.to_representation(value)`` for a raw ``values()`` column, with
+    ``None`` passed through the way ``Serializer.to_representation`` does.
+    """
+    return None if value is None else field.to_representation(value)
+
+
+def file_value(model_field, name):
+    """The ``FieldFile`` a model instance would hold for a file column."""
+    return FieldFile(None, model_field, name)
@@ -172,12 +172,21 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
-# WhiteNoise settings
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files (User-uploaded content)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploaded images are stored by content hash (see script/storage.py)
+STORAGES = {
+    "default": {
+        "BACKEND": "script.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        # WhiteNoise serves the compressed, hashed files
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
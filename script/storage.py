@@ -0,0 +1,83 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored under ``blobs/<aa>/<sha256><ext>`` where the digest is
+taken over the file contents, so identical uploads (the same product photo
+attached to two products, a banner uploaded twice) share one file on disk
+and every URL is immutable: a changed image always gets a new URL, which
+lets the web server serve ``/media/blobs/`` with far-future cache headers.
+
+Blobs can be shared by several rows, so ``delete()`` never removes them;
+``manage.py dedupe_media`` moves legacy files into the blob store and
+garbage-collects blobs no row references any more that are older than its
+``--min-age``. Uploading content that is already stored touches the blob,
+so an upload reusing an orphaned blob is not collected under it.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+BLOB_ROOT = 'blobs'
+
+
+def blob_name(digest, extension):
+    return posixpath.join(BLOB_ROOT, digest[:2], f'{digest}{extension.lower()}')
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_ROOT + '/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save().
+        return name
+
+    def _save(self, name, content):
+        extension = posixpath.splitext(name)[1]
+        directory = self.path(BLOB_ROOT)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+
+        # Hash while copying to a temp file in the same filesystem, then
+        # move it into place; identical content is simply dropped.
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            name = blob_name(digest.hexdigest(), extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(tmp_path)
+                # Fresh again for the garbage collector's --min-age
+                os.utime(full_path)
+                return name
+
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+            return name
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, name):
+        # Blobs may be referenced by other rows; unreferenced ones are
+        # removed by the dedupe_media command.
+        if is_blob_name(name):
+            return
+        super().delete(name)
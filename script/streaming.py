@@ -0,0 +1,105 @@
+"""
+Streaming JSON and CSV responses for large list endpoints.
+
+Rows are pulled from ``QuerySet.iterator(chunk_size=...)`` and serialized a
+chunk at a time, so memory stays flat no matter how many rows the queryset
+returns and the first bytes go out before the last row is read.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _dumps(value):
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+
+
+def chunks(iterable, size):
+    """Yield lists of up to ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_json_rows(rows, envelope=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the JSON document ``{**envelope, "data": [...]}`` for an iterable
+    of already serialized ``rows``, piece by piece.
+    """
+    envelope = dict(envelope or {"status": "success"})
+    head = _dumps(envelope)[:-1]
+    yield (head + ", " if envelope else "{") + '"data": ['
+
+    first = True
+    for chunk in chunks(rows, chunk_size):
+        body = ", ".join(_dumps(item) for item in chunk)
+        yield body if first else ", " + body
+        first = False
+
+    yield "]}"
+
+
+def stream_json_list(queryset, serializer_class, envelope=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     serializer_context=None):
+    """
+    Yield the JSON document ``{**envelope, "data": [...]}`` piece by piece.
+    """
+    rows = (
+        item
+        for chunk in chunks(queryset.iterator(chunk_size=chunk_size), chunk_size)
+        for item in serializer_class(chunk, many=True, context=serializer_context or {}).data
+    )
+    return stream_json_rows(rows, envelope, chunk_size)
+
+
+def streaming_json_response(queryset, serializer_class, envelope=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                            serializer_context=None):
+    """
+    Wrap :func:`stream_json_list` in a ``StreamingHttpResponse``.
+    """
+    return StreamingHttpResponse(
+        stream_json_list(queryset, serializer_class, envelope, chunk_size, serializer_context),
+        content_type="application/json",
+    )
+
+
+def streaming_json_rows_response(rows, envelope=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Wrap :func:`stream_json_rows` in a ``StreamingHttpResponse``.
+    """
+    return StreamingHttpResponse(stream_json_rows(rows, envelope, chunk_size), content_type="application/json")
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    """
+    Yield ``header`` and then every row of ``rows`` as CSV lines.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def streaming_csv_response(header, rows, filename):
+    """
+    Stream ``rows`` as a CSV attachment named ``filename``.
+    """
+    response = StreamingHttpResponse(stream_csv(header, rows), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response